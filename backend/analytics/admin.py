@@ -0,0 +1,6 @@
+from django.contrib import admin
+from .models import DailyRollup, RollupCheckpoint, RollupSeries
+
+admin.site.register(RollupSeries)
+admin.site.register(DailyRollup)
+admin.site.register(RollupCheckpoint)
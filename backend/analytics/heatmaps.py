@@ -0,0 +1,110 @@
+"""
+Occupancy analytics for a manager's restaurants.
+
+Bookings in the range are counted by weekday, hour, party size and
+status in one grouped values_list query, so what crosses the wire does
+not grow with the range. The counts become NumPy columns aggregated
+with bincount rather than Python loops.
+"""
+import logging
+from django.db.models import BooleanField, Case, Count, When
+from django.db.models.functions import ExtractHour, ExtractIsoWeekDay
+from bookings.availability import slot_times
+from bookings.models import Booking
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+    logger.warning("NumPy not installed. Occupancy analytics will be disabled.")
+
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+HOURS = 24
+# A Monday, so (day - MONDAY) % 7 is 0 for Mondays
+MONDAY = '1970-01-05'
+
+
+def weekday_counts(start, end):
+    """How many of each weekday, Monday first, fall between start and end inclusive."""
+    days = np.arange(np.datetime64(start), np.datetime64(end) + 1)
+    return np.bincount((days - np.datetime64(MONDAY)).astype(int) % 7, minlength=7)
+
+
+def slots_per_hour():
+    """Bookable slots starting in each hour of the day."""
+    return np.bincount([slot.hour for slot in slot_times()], minlength=HOURS)
+
+
+def rate(part, whole):
+    return round(float(part) / float(whole), 4) if whole else None
+
+
+def occupancy_report(bookings, start, end, today, capacity):
+    """
+    Hour-of-week occupancy, cancellation and no-show rates, and party
+    sizes for bookings between start and end.
+
+    capacity is the restaurants' combined seats per slot. Occupancy is
+    seats in bookings that were not cancelled over the seats offered in
+    that weekday and hour. A no-show is a booking before today that was
+    never completed or cancelled, out of all such bookings that were not
+    cancelled.
+    """
+    # Grouped in the database, so rows stay at most weekdays x hours x
+    # party sizes x statuses x past/upcoming however long the range is
+    rows = list(
+        bookings.filter(date__range=(start, end))
+        .annotate(
+            weekday=ExtractIsoWeekDay('date'),
+            hour=ExtractHour('time'),
+            past=Case(When(date__lt=today, then=True), default=False, output_field=BooleanField()),
+        )
+        .values_list('weekday', 'hour', 'party_size', 'status', 'past')
+        .annotate(bookings=Count('pk'))
+        .order_by()
+    )
+    columns = list(zip(*rows)) or [()] * 6
+    weekdays = np.array(columns[0], dtype=np.int64) - 1
+    hours = np.array(columns[1], dtype=np.int64)
+    party_sizes = np.array(columns[2], dtype=np.int64)
+    statuses = np.array(columns[3], dtype=str)
+    past = np.array(columns[4], dtype=bool)
+    counts = np.array(columns[5], dtype=np.int64)
+
+    cells = weekdays * HOURS + hours
+    cancelled = statuses == 'cancelled'
+    seated = ~cancelled
+    past &= seated
+    no_shows = past & (statuses != 'completed')
+    total = counts.sum()
+
+    seats = np.bincount(
+        cells[seated], weights=(party_sizes * counts)[seated], minlength=7 * HOURS
+    ).reshape(7, HOURS)
+    offered = capacity * np.outer(weekday_counts(start, end), slots_per_hour())
+    with np.errstate(divide='ignore', invalid='ignore'):
+        occupancy = np.where(offered > 0, np.round(seats / offered, 4), np.nan)
+
+    sizes = np.bincount(party_sizes, weights=counts, minlength=Booking.MAX_PARTY_SIZE + 1)[1:]
+    return {
+        'start_date': start,
+        'end_date': end,
+        'bookings': int(total),
+        'heatmap': {
+            'weekdays': WEEKDAYS,
+            'hours': list(range(HOURS)),
+            'seats': seats.astype(int).tolist(),
+            'occupancy': [
+                [None if np.isnan(value) else value for value in row]
+                for row in occupancy.tolist()
+            ],
+        },
+        'cancel_rate': rate(counts[cancelled].sum(), total),
+        'no_show_rate': rate(counts[no_shows].sum(), counts[past].sum()),
+        'party_sizes': [
+            {'party_size': size, 'bookings': int(count)}
+            for size, count in enumerate(sizes.tolist(), start=1)
+        ],
+    }
@@ -0,0 +1,33 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from analytics.rollups import update_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Brings the daily dashboard rollups up to date, recounting only the '
+        'days whose bookings, reviews or signups changed since the previous run'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Recount every day, e.g. after deleting bookings, reviews or users')
+        parser.add_argument('--overlap', type=int, default=300,
+                            help='Seconds of changes before the last run to read again')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep updating instead of exiting after one run')
+        parser.add_argument('--interval', type=float, default=300,
+                            help='Seconds to sleep between runs when --loop is set')
+
+    def handle(self, *args, **options):
+        full = options['full']
+        while True:
+            written = update_rollups(full=full, overlap=timedelta(seconds=options['overlap']))
+            self.stdout.write(self.style.SUCCESS(
+                'Rollups updated: ' + ', '.join(f'{source} {rows} rows' for source, rows in written.items())
+            ))
+            if not options['loop']:
+                break
+            full = False
+            time.sleep(options['interval'])
@@ -0,0 +1,53 @@
+# Generated by Django 5.0.2 on 2026-10-18 12:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('count', models.IntegerField()),
+                ('cumulative', models.BigIntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=30, unique=True)),
+                ('processed_until', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='RollupSeries',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric', models.CharField(choices=[('signups', 'Signups by role'), ('last_login', 'Users by role and day of last login'), ('booking_status', 'Bookings made, by status'), ('booking_restaurant', 'Bookings made, by restaurant'), ('review_rating', 'Reviews written, by rating')], max_length=30)),
+                ('key', models.CharField(max_length=64)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='rollupseries',
+            constraint=models.UniqueConstraint(fields=('metric', 'key'), name='unique_rollup_series'),
+        ),
+        migrations.AddField(
+            model_name='dailyrollup',
+            name='series',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='days', to='analytics.rollupseries'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailyrollup',
+            constraint=models.UniqueConstraint(fields=('series', 'day'), name='unique_daily_rollup'),
+        ),
+    ]
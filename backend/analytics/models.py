@@ -0,0 +1,57 @@
+from django.db import models
+
+
+class RollupSeries(models.Model):
+    """One counted quantity, e.g. bookings with status 'confirmed'."""
+
+    METRIC_CHOICES = [
+        ('signups', 'Signups by role'),
+        ('last_login', 'Users by role and day of last login'),
+        ('booking_status', 'Bookings made, by status'),
+        ('booking_restaurant', 'Bookings made, by restaurant'),
+        ('review_rating', 'Reviews written, by rating'),
+    ]
+
+    metric = models.CharField(max_length=30, choices=METRIC_CHOICES)
+    key = models.CharField(max_length=64)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['metric', 'key'], name='unique_rollup_series')
+        ]
+
+    def __str__(self):
+        return f'{self.metric}:{self.key}'
+
+
+class DailyRollup(models.Model):
+    """
+    A series' count for one day, plus its running total up to that day.
+
+    Days with nothing to count have no row. Any range of days is the
+    difference of two running totals, so the dashboard reads two rows
+    per series however long the range is.
+    """
+
+    series = models.ForeignKey(RollupSeries, on_delete=models.CASCADE, related_name='days')
+    day = models.DateField()
+    count = models.IntegerField()
+    cumulative = models.BigIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['series', 'day'], name='unique_daily_rollup')
+        ]
+
+    def __str__(self):
+        return f'{self.series_id} on {self.day}: {self.count}'
+
+
+class RollupCheckpoint(models.Model):
+    """How far the update_rollups command has read a source table."""
+
+    source = models.CharField(max_length=30, unique=True)
+    processed_until = models.DateTimeField()
+
+    def __str__(self):
+        return f'{self.source} through {self.processed_until}'
@@ -0,0 +1,227 @@
+"""
+Daily rollups behind the admin dashboard.
+
+update_rollups() keeps one DailyRollup row per series and day, with the
+day's count and the series' running total. Bookings and reviews are
+recounted only for the days (by created_at) of rows whose updated_at
+moved since the previous run, and signups only for the days of users
+who joined since then; last logins are recounted in full. series_totals()
+answers any range of days from two running totals per series, without
+touching the source tables.
+"""
+import datetime
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from bookings.models import Booking
+from reviews.models import Review
+from users.models import User
+from .models import DailyRollup, RollupCheckpoint, RollupSeries
+
+# Rows saved by transactions that were still open when a run started can
+# carry an updated_at from before it, so each run re-reads a little of
+# the previous one
+DEFAULT_OVERLAP = datetime.timedelta(minutes=5)
+# Bound on the parameters of one day__in / pk__in lookup
+BATCH_SIZE = 500
+
+# source: (model, field that moves when a row changes, field rows are
+# counted by the day of, {metric: field the metric is keyed by})
+INCREMENTAL_SOURCES = {
+    'bookings': (
+        Booking, 'updated_at', 'created_at',
+        {'booking_status': 'status', 'booking_restaurant': 'restaurant_id'},
+    ),
+    'reviews': (Review, 'updated_at', 'created_at', {'review_rating': 'rating'}),
+    # date_joined is set once, so only new users change a day's signups
+    'signups': (User, 'date_joined', 'date_joined', {'signups': 'role'}),
+}
+
+
+def batched(values, size=BATCH_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def start_of_day(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
+def within_days(field, days):
+    """Q matching field on any of days, one range per run of consecutive days."""
+    condition = Q()
+    days = sorted(days)
+    first = previous = days[0]
+    for day in days[1:] + [None]:
+        if day is not None and day == previous + datetime.timedelta(days=1):
+            previous = day
+            continue
+        condition |= Q(**{
+            f'{field}__gte': start_of_day(first),
+            f'{field}__lt': start_of_day(previous + datetime.timedelta(days=1)),
+        })
+        first = previous = day
+    return condition
+
+
+def count_by_day(queryset, field, key):
+    """{(key value as str, day of field): rows} in one GROUP BY."""
+    rows = (
+        queryset.annotate(day=TruncDate(field))
+        .values_list('day', key)
+        .annotate(rows=Count('pk'))
+        .order_by()
+    )
+    return {(str(value), day): count for day, value, count in rows}
+
+
+def apply_counts(metric, counts, days=None):
+    """
+    Make metric's rows for days match counts, then repair the running
+    totals of the series that changed. days=None replaces every day.
+    Returns the number of rows written or deleted.
+    """
+    series = dict(RollupSeries.objects.filter(metric=metric).values_list('key', 'pk'))
+    missing = {key for key, _ in counts} - series.keys()
+    if missing:
+        RollupSeries.objects.bulk_create(
+            [RollupSeries(metric=metric, key=key) for key in missing], ignore_conflicts=True
+        )
+        series = dict(RollupSeries.objects.filter(metric=metric).values_list('key', 'pk'))
+
+    rows = DailyRollup.objects.filter(series__metric=metric).only('series_id', 'day', 'count')
+    if days is None:
+        existing = {(row.series_id, row.day): row for row in rows}
+    else:
+        existing = {
+            (row.series_id, row.day): row
+            for chunk in batched(sorted(days))
+            for row in rows.filter(day__in=chunk)
+        }
+    wanted = {(series[key], day): count for (key, day), count in counts.items()}
+
+    created, updated, deleted = [], [], []
+    changed = {}
+    for (series_id, day), count in wanted.items():
+        row = existing.get((series_id, day))
+        if row is None:
+            created.append(DailyRollup(series_id=series_id, day=day, count=count, cumulative=0))
+        elif row.count != count:
+            row.count = count
+            updated.append(row)
+        else:
+            continue
+        changed[series_id] = min(day, changed.get(series_id, day))
+    for (series_id, day), row in existing.items():
+        if (series_id, day) not in wanted:
+            deleted.append(row.pk)
+            changed[series_id] = min(day, changed.get(series_id, day))
+
+    DailyRollup.objects.bulk_create(created, batch_size=BATCH_SIZE)
+    DailyRollup.objects.bulk_update(updated, ['count'], batch_size=BATCH_SIZE)
+    for chunk in batched(deleted):
+        DailyRollup.objects.filter(pk__in=chunk).delete()
+    recumulate(changed)
+    return len(created) + len(updated) + len(deleted)
+
+
+def recumulate(changed):
+    """Recompute running totals of {series_id: earliest changed day}."""
+    if not changed:
+        return
+    since = min(changed.values())
+    for ids in batched(changed):
+        running = dict(
+            RollupSeries.objects.filter(pk__in=ids)
+            .annotate(base=Coalesce(Subquery(
+                DailyRollup.objects.filter(series=OuterRef('pk'), day__lt=since)
+                .order_by('-day').values('cumulative')[:1]
+            ), Value(0)))
+            .values_list('pk', 'base')
+        )
+        stale = []
+        rows = (
+            DailyRollup.objects.filter(series_id__in=ids, day__gte=since)
+            .only('series_id', 'count', 'cumulative')
+            .order_by('series_id', 'day')
+        )
+        for row in rows.iterator(chunk_size=2000):
+            running[row.series_id] += row.count
+            if row.cumulative != running[row.series_id]:
+                row.cumulative = running[row.series_id]
+                stale.append(row)
+        DailyRollup.objects.bulk_update(stale, ['cumulative'], batch_size=BATCH_SIZE)
+
+
+def update_login_rollups():
+    # A login moves a user to a later day, and the day they left is not
+    # recorded anywhere, so last logins are recounted in full each run
+    with transaction.atomic():
+        return apply_counts('last_login', count_by_day(
+            User.objects.filter(last_login__isnull=False), 'last_login', 'role'
+        ))
+
+
+def update_source(source, started, full=False, overlap=DEFAULT_OVERLAP):
+    """
+    Recount the days of source rows changed since its checkpoint, or all
+    of them when full or on the first run. Returns the rows written.
+
+    Deleting a row does not move any updated_at, so days that only lost
+    rows catch up on the next change to that day or on a full run. So do
+    users whose role changed, as date_joined stays put.
+    """
+    model, changed_field, day_field, metrics = INCREMENTAL_SOURCES[source]
+    with transaction.atomic():
+        checkpoint = RollupCheckpoint.objects.select_for_update().filter(source=source).first()
+        if full or checkpoint is None:
+            days, queryset = None, model.objects.all()
+        else:
+            days = set(
+                model.objects.filter(**{f'{changed_field}__gte': checkpoint.processed_until - overlap})
+                .annotate(day=TruncDate(day_field))
+                .values_list('day', flat=True)
+                .order_by()
+                .distinct()
+            )
+            queryset = model.objects.filter(within_days(day_field, days)) if days else None
+
+        written = 0
+        if queryset is not None:
+            for metric, key in metrics.items():
+                written += apply_counts(metric, count_by_day(queryset, day_field, key), days)
+        RollupCheckpoint.objects.update_or_create(
+            source=source, defaults={'processed_until': started}
+        )
+    return written
+
+
+def update_rollups(full=False, overlap=DEFAULT_OVERLAP):
+    """Bring every rollup up to date. Returns {source: rows written}."""
+    started = timezone.now()
+    written = {'last_login': update_login_rollups()}
+    for source in INCREMENTAL_SOURCES:
+        written[source] = update_source(source, started, full, overlap)
+    return written
+
+
+def cumulative_through(day):
+    """Each series' running total at the end of day."""
+    return Coalesce(Subquery(
+        DailyRollup.objects.filter(series=OuterRef('pk'), day__lte=day)
+        .order_by('-day').values('cumulative')[:1]
+    ), Value(0))
+
+
+def series_totals(metrics, start, end):
+    """
+    RollupSeries of metrics annotated with total (start..end inclusive)
+    and all_time (through end). Each is two index lookups per series,
+    whatever the length of the range.
+    """
+    return RollupSeries.objects.filter(metric__in=metrics).annotate(
+        all_time=cumulative_through(end),
+        total=cumulative_through(end) - cumulative_through(start - datetime.timedelta(days=1)),
+    )
@@ -0,0 +1,188 @@
+from datetime import date, time, timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from bookings.models import Booking
+from restaurants.tests import create_restaurant
+from reviews.models import Review
+from users.models import User
+from .models import RollupCheckpoint
+
+
+class DashboardRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='x', role='admin')
+        cls.manager = User.objects.create_user(username='manager', password='x', role='manager')
+        cls.customer = User.objects.create_user(username='customer', password='x')
+        cls.restaurant = create_restaurant(cls.manager, 'Rollup Bistro')
+        cls.other = create_restaurant(cls.manager, 'Rollup Diner')
+        tomorrow = date.today() + timedelta(days=1)
+        cls.bookings = [
+            Booking.objects.create(
+                customer=cls.customer,
+                restaurant=cls.restaurant if i < 3 else cls.other,
+                date=tomorrow,
+                time=time(hour=11 + i),
+                party_size=2,
+            )
+            for i in range(4)
+        ]
+        # One booking and review made long ago
+        Booking.objects.filter(pk=cls.bookings[3].pk).update(
+            created_at=timezone.now() - timedelta(days=60), status='completed'
+        )
+        Review.objects.create(customer=cls.customer, restaurant=cls.restaurant, rating=5, comment='-')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        call_command('update_rollups', stdout=StringIO())
+
+    def dashboard(self, days):
+        response = self.client.get('/api/users/dashboard/', {'days': days})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_ranges(self):
+        recent, year = self.dashboard(7), self.dashboard(365)
+        self.assertEqual(recent['total_users'], 3)
+        self.assertEqual(recent['new_users'], 3)
+        self.assertEqual(recent['total_bookings'], 3)
+        self.assertEqual(year['total_bookings'], 4)
+        self.assertEqual(
+            {row['status']: row['count'] for row in year['bookings_by_status']},
+            {'pending': 3, 'confirmed': 0, 'cancelled': 0, 'completed': 1},
+        )
+        self.assertEqual(
+            recent['top_restaurants'], [{'restaurant_id': self.restaurant.id, 'bookings': 3}]
+        )
+        self.assertEqual(recent['reviews_by_rating'][4], {'rating': 5, 'count': 1})
+
+    def test_constant_queries_for_any_range(self):
+        # series totals, top restaurants, bookings per day, checkpoint
+        for days in (1, 30, 3650):
+            with self.assertNumQueries(4):
+                self.dashboard(days)
+
+    def test_incremental_update(self):
+        booking = self.bookings[0]
+        booking.status = 'cancelled'
+        booking.save()
+        Booking.objects.create(
+            customer=self.customer, restaurant=self.other,
+            date=booking.date, time=time(hour=20), party_size=2,
+        )
+        call_command('update_rollups', stdout=StringIO())
+
+        data = self.dashboard(7)
+        self.assertEqual(data['total_bookings'], 4)
+        self.assertEqual(
+            {row['status']: row['count'] for row in data['bookings_by_status']},
+            {'pending': 3, 'confirmed': 0, 'cancelled': 1, 'completed': 0},
+        )
+        self.assertEqual(self.dashboard(365)['total_bookings'], 5)
+
+    def test_only_changed_days_are_recounted(self):
+        # update() leaves updated_at alone, so only a full run sees this
+        Booking.objects.filter(pk=self.bookings[1].pk).update(status='confirmed')
+        call_command('update_rollups', '--overlap=0', stdout=StringIO())
+        statuses = {row['status']: row['count'] for row in self.dashboard(7)['bookings_by_status']}
+        self.assertEqual(statuses['confirmed'], 0)
+
+        call_command('update_rollups', '--full', stdout=StringIO())
+        statuses = {row['status']: row['count'] for row in self.dashboard(7)['bookings_by_status']}
+        self.assertEqual(statuses['confirmed'], 1)
+        self.assertTrue(RollupCheckpoint.objects.filter(source='bookings').exists())
+
+    def test_signups_are_incremental(self):
+        User.objects.filter(pk=self.manager.pk).update(date_joined=timezone.now() - timedelta(days=60))
+        call_command('update_rollups', '--full', stdout=StringIO())
+
+        User.objects.create_user(username='newcomer', password='x')
+        # update() on a day with no new users, so only a full run sees it
+        User.objects.filter(pk=self.manager.pk).update(role='customer')
+        call_command('update_rollups', '--overlap=0', stdout=StringIO())
+        data = self.dashboard(7)
+        self.assertEqual((data['new_users'], data['total_users']), (3, 4))
+        self.assertEqual(
+            {row['role']: row['count'] for row in data['users_by_role']},
+            {'customer': 2, 'manager': 1, 'admin': 1},
+        )
+        self.assertTrue(RollupCheckpoint.objects.filter(source='signups').exists())
+
+        call_command('update_rollups', '--full', stdout=StringIO())
+        self.assertEqual(
+            {row['role']: row['count'] for row in self.dashboard(7)['users_by_role']},
+            {'customer': 3, 'manager': 0, 'admin': 1},
+        )
+
+    def test_admin_only(self):
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get('/api/users/dashboard/').status_code, 403)
+
+
+class OccupancyAnalyticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user(username='manager', password='x', role='manager')
+        cls.customer = User.objects.create_user(username='customer', password='x')
+        cls.restaurant = create_restaurant(cls.manager, 'Heatmap Bistro', capacity=10)
+        cls.elsewhere = create_restaurant(
+            User.objects.create_user(username='other', password='x', role='manager'), 'Elsewhere'
+        )
+        monday = date(2026, 1, 5)
+        # Past dates, so bypass Booking.save() and its validation
+        Booking.objects.bulk_create([
+            Booking(customer=cls.customer, restaurant=cls.restaurant, date=monday,
+                    time=time(12, 0), party_size=4, status='completed'),
+            Booking(customer=cls.customer, restaurant=cls.restaurant, date=monday,
+                    time=time(12, 30), party_size=2, status='confirmed'),
+            Booking(customer=cls.customer, restaurant=cls.restaurant, date=monday + timedelta(days=1),
+                    time=time(19, 0), party_size=3, status='cancelled'),
+            Booking(customer=cls.customer, restaurant=cls.elsewhere, date=monday,
+                    time=time(12, 0), party_size=8, status='completed'),
+        ])
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def test_report(self):
+        # restaurants, bookings
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                '/api/analytics/occupancy/', {'start': '2026-01-05', 'end': '2026-01-11'}
+            )
+        data = response.data
+        self.assertEqual(data['bookings'], 3)
+        self.assertEqual(data['restaurants'], [self.restaurant.id])
+        # 6 seats of 10 seats x 2 slots on the one Monday
+        self.assertEqual(data['heatmap']['seats'][0][12], 6)
+        self.assertEqual(data['heatmap']['occupancy'][0][12], 0.3)
+        self.assertEqual(data['heatmap']['occupancy'][1][19], 0.0)
+        self.assertIsNone(data['heatmap']['occupancy'][0][23])
+        self.assertEqual(data['cancel_rate'], 0.3333)
+        self.assertEqual(data['no_show_rate'], 0.5)
+        self.assertEqual(data['party_sizes'][1], {'party_size': 2, 'bookings': 1})
+
+    def test_empty_range(self):
+        response = self.client.get(
+            '/api/analytics/occupancy/', {'start': '2025-01-01', 'end': '2025-01-31'}
+        )
+        self.assertEqual(response.data['bookings'], 0)
+        self.assertIsNone(response.data['cancel_rate'])
+
+    def test_scope(self):
+        response = self.client.get('/api/analytics/occupancy/', {'restaurant': self.elsewhere.id})
+        self.assertEqual(response.status_code, 404)
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get('/api/analytics/occupancy/').status_code, 403)
+
+    def test_invalid_range(self):
+        response = self.client.get(
+            '/api/analytics/occupancy/', {'start': '2026-02-01', 'end': '2026-01-01'}
+        )
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,6 @@
+from django.urls import path
+from .views import OccupancyAnalyticsView
+
+urlpatterns = [
+    path('analytics/occupancy/', OccupancyAnalyticsView.as_view(), name='occupancy-analytics'),
+]
@@ -0,0 +1,73 @@
+from datetime import timedelta
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import status
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from bookings.models import Booking
+from restaurants.models import Restaurant
+from . import heatmaps
+
+
+class OccupancyAnalyticsView(APIView):
+    """
+    Hour-of-week occupancy heatmap, cancellation and no-show rates and
+    party-size distribution for the manager's restaurants (any
+    restaurant for admins), between start and end (default: the last
+    90 days). restaurant narrows it to one of them.
+    """
+    permission_classes = [IsAuthenticated]
+    default_days = 90
+    max_days = 3660
+
+    def get_restaurants(self, request):
+        if request.user.role == 'admin':
+            restaurants = Restaurant.objects.all()
+        elif request.user.role == 'manager':
+            restaurants = Restaurant.objects.filter(owner=request.user)
+        else:
+            raise PermissionDenied("Only restaurant managers can view occupancy analytics.")
+        restaurant_id = request.query_params.get('restaurant')
+        if restaurant_id:
+            if not restaurant_id.isdigit():
+                raise ValidationError({'detail': 'restaurant must be an id'})
+            restaurants = restaurants.filter(pk=restaurant_id)
+        return restaurants
+
+    def get_range(self, request):
+        today = timezone.localdate()
+        try:
+            end = parse_date(request.query_params.get('end') or str(today))
+            start = parse_date(
+                request.query_params.get('start') or str(end - timedelta(days=self.default_days - 1))
+            )
+        except (TypeError, ValueError):
+            start = end = None
+        if start is None or end is None:
+            raise ValidationError({'detail': 'start and end must be dates (YYYY-MM-DD)'})
+        if end < start or (end - start).days >= self.max_days:
+            raise ValidationError(
+                {'detail': f'end must be on or after start, spanning at most {self.max_days} days'}
+            )
+        return start, end, today
+
+    def get(self, request):
+        restaurants = self.get_restaurants(request)
+        start, end, today = self.get_range(request)
+        if heatmaps.np is None:
+            return Response(
+                {'detail': 'Occupancy analytics are unavailable.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+
+        seats = dict(restaurants.values_list('pk', 'capacity'))
+        if request.query_params.get('restaurant') and not seats:
+            raise NotFound()
+        report = heatmaps.occupancy_report(
+            Booking.objects.filter(restaurant__in=restaurants),
+            start, end, today, sum(seats.values()),
+        )
+        report['restaurants'] = list(seats)
+        return Response(report)
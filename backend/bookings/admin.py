@@ -1,4 +1,13 @@
 from django.contrib import admin
-from .models import Booking
+from .models import Booking, BookingSlot, Notification, SlotHold
 
-admin.site.register(Booking)
+
+@admin.register(Booking)
+class BookingAdmin(admin.ModelAdmin):
+    # Booking.__str__ reads the customer and restaurant
+    list_select_related = ["customer", "restaurant"]
+
+
+admin.site.register(BookingSlot)
+admin.site.register(Notification)
+admin.site.register(SlotHold)
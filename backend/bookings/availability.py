@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.db.models import F, Q
+from .models import Booking, BookingSlot
+from .occupancy import get_engine
+
+# Widest date range a single availability grid may cover
+MAX_GRID_DAYS = 31
+
+
+def slot_times():
+    """Every bookable time of day, from opening to closing time inclusive."""
+    opening = datetime.strptime(settings.BOOKING_OPENING_TIME, "%H:%M")
+    closing = datetime.strptime(settings.BOOKING_CLOSING_TIME, "%H:%M")
+    step = timedelta(minutes=settings.BOOKING_SLOT_MINUTES)
+    times = []
+    current = opening
+    while current <= closing:
+        times.append(current.time())
+        current += step
+    return times
+
+
+def availability_grid(restaurant, start, end, party_size=None):
+    """
+    Remaining seats for every slot of every day between start and end.
+
+    Reads the slot ledger once for the whole range, or the occupancy
+    engine when enabled; slots with no ledger row have the restaurant's
+    full capacity left.
+    """
+    times = slot_times()
+    engine = get_engine()
+    if engine:
+        booked = engine.booked_range(restaurant.id, start, end)
+        remaining = (restaurant.capacity - booked).clip(min=0).tolist()
+    else:
+        column = {slot_time: index for index, slot_time in enumerate(times)}
+        days = (end - start).days + 1
+        remaining = [[restaurant.capacity] * len(times) for _ in range(days)]
+
+        booked_slots = BookingSlot.objects.filter(
+            restaurant=restaurant, date__range=(start, end)
+        ).values_list("date", "time", "booked")
+        for slot_date, slot_time, booked in booked_slots:
+            if slot_time in column:
+                row = remaining[(slot_date - start).days]
+                row[column[slot_time]] = max(restaurant.capacity - booked, 0)
+
+    grid = []
+    for offset, row in enumerate(remaining):
+        day = {
+            "date": start + timedelta(days=offset),
+            "remaining": row,
+            "max_party_size": [min(seats, Booking.MAX_PARTY_SIZE) for seats in row],
+        }
+        if party_size is not None:
+            day["available"] = [seats >= party_size for seats in row]
+        grid.append(day)
+
+    return {
+        "restaurant": restaurant.id,
+        "capacity": restaurant.capacity,
+        "party_size": party_size,
+        "times": [slot_time.strftime("%H:%M") for slot_time in times],
+        "days": grid,
+    }
+
+
+def parse_time(value):
+    """Parse an HH:MM time, returning None when malformed."""
+    try:
+        return datetime.strptime(value, "%H:%M").time()
+    except (TypeError, ValueError):
+        return None
+
+
+def times_around(center, window_minutes):
+    """Slot times within window_minutes either side of center."""
+    anchor = datetime.combine(datetime.min, center)
+    window = timedelta(minutes=window_minutes)
+    return [
+        slot_time
+        for slot_time in slot_times()
+        if abs(datetime.combine(datetime.min, slot_time) - anchor) <= window
+    ]
+
+
+def full_slot_filter(date, times, party_size, prefix=""):
+    """
+    Q object matching ledger rows, reached through prefix, that are too
+    full for party_size. Lets callers annotate restaurants with a count
+    of full slots in the same query that selects them.
+    """
+    return Q(
+        **{
+            f"{prefix}date": date,
+            f"{prefix}time__in": times,
+            f"{prefix}booked__gt": F("capacity") - party_size,
+        }
+    )
+
+
+def nearest_open_slots(restaurants, date, times, party_size, center, limit=3):
+    """
+    Map each restaurant id to its open slot times closest to center.
+
+    Fetches the full slots of every given restaurant in one query.
+    """
+    full = set(
+        BookingSlot.objects.filter(
+            restaurant__in=restaurants,
+            date=date,
+            time__in=times,
+            booked__gt=F("restaurant__capacity") - party_size,
+        ).values_list("restaurant_id", "time")
+    )
+    anchor = datetime.combine(datetime.min, center)
+    by_distance = sorted(
+        times, key=lambda slot_time: abs(datetime.combine(datetime.min, slot_time) - anchor)
+    )
+    return {
+        restaurant.id: [
+            slot_time.strftime("%H:%M")
+            for slot_time in by_distance
+            if (restaurant.id, slot_time) not in full
+            and restaurant.capacity >= party_size
+        ][:limit]
+        for restaurant in restaurants
+    }
@@ -0,0 +1,127 @@
+"""
+Local stand-ins for the SMTP server and the Twilio Messages API, used to
+measure notification throughput without a real provider. Point
+EMAIL_HOST/EMAIL_PORT and TWILIO_API_BASE_URL at them, or start both
+with the run_fake_notification_servers command.
+"""
+import json
+import socketserver
+import threading
+import uuid
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class FakeSmtpHandler(socketserver.StreamRequestHandler):
+    disable_nagle_algorithm = True
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.reply("220 fake-smtp ready")
+        in_data = False
+        for raw in self.rfile:
+            line = raw.decode("utf-8", "replace").rstrip("\r\n")
+            if in_data:
+                if line == ".":
+                    in_data = False
+                    self.server.count_message()
+                    self.reply("250 OK queued")
+                continue
+
+            command = line[:4].upper()
+            if command in ("EHLO", "HELO"):
+                self.reply("250 fake-smtp")
+            elif command in ("MAIL", "RCPT", "RSET", "NOOP"):
+                self.reply("250 OK")
+            elif command == "DATA":
+                in_data = True
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+class FakeSmtpServer(socketserver.ThreadingTCPServer):
+    """Accepts and discards mail, counting messages and connections."""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 1025)):
+        super().__init__(address, FakeSmtpHandler)
+        self.messages = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    def count_message(self):
+        with self._lock:
+            self.messages += 1
+
+    def process_request(self, request, client_address):
+        with self._lock:
+            self.connections += 1
+        super().process_request(request, client_address)
+
+
+class FakeTwilioHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        form = parse_qs(self.rfile.read(length).decode())
+        if not self.path.endswith("/Messages.json"):
+            self.send_json(404, {"code": 20404, "message": "Not found"})
+            return
+
+        self.server.count_message()
+        now = formatdate(usegmt=True)
+        self.send_json(
+            201,
+            {
+                "sid": "SM" + uuid.uuid4().hex,
+                "status": "queued",
+                "to": form.get("To", [""])[0],
+                "from": form.get("From", [""])[0],
+                "body": form.get("Body", [""])[0],
+                "date_created": now,
+                "date_updated": now,
+            },
+        )
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeTwilioServer(ThreadingHTTPServer):
+    """Answers Twilio Messages API calls with a canned queued message."""
+
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 8025)):
+        super().__init__(address, FakeTwilioHandler)
+        self.messages = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    def count_message(self):
+        with self._lock:
+            self.messages += 1
+
+    def process_request(self, request, client_address):
+        with self._lock:
+            self.connections += 1
+        super().process_request(request, client_address)
@@ -1,15 +1,12 @@
 import django_filters
+from booktable.search import TrigramFilter
 from .models import Booking
 from django.utils import timezone
 
 
 class BookingFilter(django_filters.FilterSet):
-    restaurant_name = django_filters.CharFilter(
-        field_name="restaurant__name", lookup_expr="icontains"
-    )
-    customer_name = django_filters.CharFilter(
-        field_name="customer__username", lookup_expr="icontains"
-    )
+    restaurant_name = TrigramFilter(field_name="restaurant__name")
+    customer_name = TrigramFilter(field_name="customer__username")
     min_date = django_filters.DateFilter(field_name="date", lookup_expr="gte")
     max_date = django_filters.DateFilter(field_name="date", lookup_expr="lte")
     min_party_size = django_filters.NumberFilter(
@@ -0,0 +1,82 @@
+import time
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+from bookings.availability import slot_times
+from bookings.models import Booking, BookingSlot
+from bookings.occupancy import engine, np
+from restaurants.models import Restaurant
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Times availability checks through the booking row scan, the slot '
+        'ledger and the occupancy engine. Runs in a transaction that is '
+        'rolled back, so it leaves no data behind.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bookings', type=int, default=500,
+                            help='Active bookings in the benchmarked slot')
+        parser.add_argument('--iterations', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if np is None:
+            raise CommandError('NumPy is required for the occupancy engine benchmark')
+
+        with transaction.atomic():
+            restaurant, slot_date, slot_time = self.create_fixture(options['bookings'])
+            iterations = options['iterations']
+
+            def row_scan():
+                # The availability query used before the slot ledger existed
+                bookings = Booking.objects.filter(
+                    restaurant=restaurant, date=slot_date, time=slot_time,
+                    status__in=Booking.ACTIVE_STATUSES,
+                )
+                return sum(booking.party_size for booking in bookings) + 2 <= restaurant.capacity
+
+            def check():
+                return Booking.check_availability(restaurant, slot_date, slot_time, 2)
+
+            engine.clear()
+            results = [('row scan', self.measure(row_scan, max(iterations // 10, 1)))]
+            with override_settings(BOOKING_OCCUPANCY_ENGINE=False):
+                results.append(('slot ledger', self.measure(check, iterations)))
+            with override_settings(BOOKING_OCCUPANCY_ENGINE=True):
+                results.append(('occupancy engine', self.measure(check, iterations)))
+            transaction.set_rollback(True)
+
+        engine.clear()
+        for name, seconds in results:
+            self.stdout.write(f'{name:>18}: {seconds * 1e6:10.1f} us per check')
+
+    def create_fixture(self, count):
+        owner = User.objects.create(username='benchmark-owner', role='manager')
+        customer = User.objects.create(username='benchmark-customer')
+        restaurant = Restaurant.objects.create(
+            owner=owner, name='Benchmark', address='-', city='-', state='-',
+            zip_code='-', cuisine='-', cost_rating=1, description='-',
+            capacity=count * 2 + 2, is_approved=True,
+        )
+        slot_date = date.today() + timedelta(days=1)
+        slot_time = slot_times()[0]
+        Booking.objects.bulk_create(
+            Booking(customer=customer, restaurant=restaurant, date=slot_date,
+                    time=slot_time, party_size=2, status='confirmed')
+            for _ in range(count)
+        )
+        # bulk_create bypasses Booking.save(), so seed the ledger directly
+        BookingSlot.objects.create(
+            restaurant=restaurant, date=slot_date, time=slot_time, booked=count * 2
+        )
+        return restaurant, slot_date, slot_time
+
+    def measure(self, check, iterations):
+        check()  # warm up caches and the connection
+        started = time.perf_counter()
+        for _ in range(iterations):
+            check()
+        return (time.perf_counter() - started) / iterations
@@ -0,0 +1,101 @@
+import threading
+import time
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection, connections
+from django.db.models import Sum
+from bookings.availability import slot_times
+from bookings.models import Booking, SlotUnavailable
+from restaurants.models import Restaurant
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Fires parallel bookings at one slot and reports throughput and how '
+        'far the slot was overbooked. Uses the configured database, so pass '
+        '--settings to compare SQLite and Postgres. Fixture rows are deleted '
+        'afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Bookings attempted in total')
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--capacity', type=int, default=50)
+        parser.add_argument('--party-size', type=int, default=2)
+
+    def handle(self, *args, **options):
+        owner = User.objects.create(username='contention-owner', role='manager')
+        customer = User.objects.create(username='contention-customer')
+        restaurant = Restaurant.objects.create(
+            owner=owner, name='Contention', address='-', city='-', state='-',
+            zip_code='-', cuisine='-', cost_rating=1, description='-',
+            capacity=options['capacity'], is_approved=True,
+        )
+        slot_date = date.today() + timedelta(days=1)
+        slot_time = slot_times()[0]
+
+        counts = {'booked': 0, 'rejected': 0, 'errors': 0}
+        counts_lock = threading.Lock()
+        remaining = iter(range(options['requests']))
+        remaining_lock = threading.Lock()
+
+        def worker():
+            try:
+                while True:
+                    with remaining_lock:
+                        if next(remaining, None) is None:
+                            return
+                    try:
+                        # Same check-then-save sequence as a booking POST
+                        if not Booking.check_availability(
+                            restaurant, slot_date, slot_time, options['party_size']
+                        ):
+                            outcome = 'rejected'
+                        else:
+                            Booking.objects.create(
+                                customer=customer, restaurant=restaurant,
+                                date=slot_date, time=slot_time,
+                                party_size=options['party_size'],
+                            )
+                            outcome = 'booked'
+                    except SlotUnavailable:
+                        outcome = 'rejected'
+                    except DatabaseError:
+                        outcome = 'errors'
+                    with counts_lock:
+                        counts[outcome] += 1
+            finally:
+                connections.close_all()
+
+        try:
+            threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+            seated = Booking.objects.filter(
+                restaurant=restaurant, status__in=Booking.ACTIVE_STATUSES
+            ).aggregate(total=Sum('party_size'))['total'] or 0
+        finally:
+            owner.delete()
+            customer.delete()
+
+        self.stdout.write(f'database: {connection.vendor}')
+        self.stdout.write(
+            f'{options["requests"]} requests on {options["threads"]} threads in '
+            f'{elapsed:.2f}s ({options["requests"] / elapsed:.1f} req/s)'
+        )
+        self.stdout.write(
+            f'booked {counts["booked"]}, rejected {counts["rejected"]}, '
+            f'errors {counts["errors"]}'
+        )
+        overbooked = max(seated - restaurant.capacity, 0)
+        style = self.style.ERROR if overbooked else self.style.SUCCESS
+        self.stdout.write(style(
+            f'seats taken {seated} of {restaurant.capacity}, overbooked by {overbooked}'
+        ))
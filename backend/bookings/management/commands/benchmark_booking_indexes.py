@@ -0,0 +1,144 @@
+import random
+import time
+from datetime import date, time as slot_time, timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Sum
+from bookings.models import Booking
+from restaurants.models import Restaurant
+from reviews.models import Review
+from users.models import User
+
+KEYSET_ORDER = ("-date", "-time", "-id")
+
+
+class Command(BaseCommand):
+    help = (
+        "Shows the query plan and latency of the hot booking and review "
+        "queries without and with the composite and partial indexes. Runs "
+        "in a transaction that is rolled back, so it leaves no data behind."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--restaurants", type=int, default=200)
+        parser.add_argument("--customers", type=int, default=5_000)
+        parser.add_argument("--bookings", type=int, default=500_000)
+        parser.add_argument("--reviews", type=int, default=100_000)
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--no-plans", action="store_true", help="Only print latencies")
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        indexes = [
+            (model, index)
+            for model in (Booking, Review)
+            for index in model._meta.indexes
+        ]
+        with transaction.atomic():
+            restaurant, customer = self.create_fixture(options)
+            queries = self.queries(restaurant, customer)
+
+            self.set_indexes(indexes, present=False)
+            before = self.run(queries, options)
+            self.set_indexes(indexes, present=True)
+            after = self.run(queries, options)
+            transaction.set_rollback(True)
+
+        for name, _ in queries:
+            (before_ms, before_plan), (after_ms, after_plan) = before[name], after[name]
+            self.stdout.write(self.style.MIGRATE_HEADING(name))
+            self.stdout.write(f"  without indexes: {before_ms:8.3f} ms")
+            self.stdout.write(f"  with indexes:    {after_ms:8.3f} ms")
+            if not options["no_plans"]:
+                self.stdout.write("  plan before:\n" + self.indent(before_plan))
+                self.stdout.write("  plan after:\n" + self.indent(after_plan))
+
+    def queries(self, restaurant, customer):
+        today = date.today()
+        slot = Booking.objects.filter(restaurant=restaurant).values_list("date", "time").first()
+        return [
+            ("seats held in a slot (row scan / ledger rebuild)", Booking.objects.filter(
+                restaurant=restaurant, date=slot[0], time=slot[1],
+                status__in=Booking.ACTIVE_STATUSES,
+            ).values("restaurant").annotate(seats=Sum("party_size"))),
+            ("customer bookings page", Booking.objects.filter(
+                customer=customer,
+            ).order_by(*KEYSET_ORDER)[:11]),
+            ("customer upcoming bookings page", Booking.objects.filter(
+                customer=customer, date__gte=today,
+            ).order_by(*KEYSET_ORDER)[:11]),
+            ("restaurant bookings page", Booking.objects.filter(
+                restaurant=restaurant,
+            ).order_by(*KEYSET_ORDER)[:11]),
+            ("active bookings today", Booking.objects.filter(
+                date=today, status__in=Booking.ACTIVE_STATUSES,
+            ).order_by("time")[:100]),
+            ("restaurant reviews page", Review.objects.filter(
+                restaurant=restaurant,
+            ).order_by("-created_at", "-id")[:11]),
+        ]
+
+    def run(self, queries, options):
+        results = {}
+        for name, queryset in queries:
+            list(queryset)  # warm up
+            started = time.perf_counter()
+            for _ in range(options["iterations"]):
+                list(queryset.all())
+            elapsed = (time.perf_counter() - started) / options["iterations"] * 1000
+            results[name] = (elapsed, queryset.explain())
+        return results
+
+    def set_indexes(self, indexes, present):
+        # Statements only; the schema editor context is not entered, so
+        # this runs inside the benchmark's transaction on SQLite too
+        editor = connection.schema_editor()
+        with connection.cursor() as cursor:
+            for model, index in indexes:
+                if present:
+                    cursor.execute(str(index.create_sql(model, editor)))
+                else:
+                    cursor.execute(str(index.remove_sql(model, editor)))
+            cursor.execute("ANALYZE")
+
+    def create_fixture(self, options):
+        owner = User.objects.create(username="benchmark-owner", role="manager")
+        customers = User.objects.bulk_create(
+            User(username=f"benchmark-customer-{i}") for i in range(options["customers"])
+        )
+        restaurants = Restaurant.objects.bulk_create(
+            Restaurant(
+                owner=owner, name=f"Benchmark {i}", address="-", city="-", state="-",
+                zip_code="-", cuisine="-", cost_rating=1, description="-", is_approved=True,
+            )
+            for i in range(options["restaurants"])
+        )
+        start = date.today() - timedelta(days=365)
+        statuses = ["pending", "confirmed", "confirmed", "completed", "completed", "cancelled"]
+
+        # bulk_create bypasses Booking.save(), so the slot ledger is not touched
+        chunk = []
+        for _ in range(options["bookings"]):
+            chunk.append(Booking(
+                customer=random.choice(customers),
+                restaurant=random.choice(restaurants),
+                date=start + timedelta(days=random.randint(0, 400)),
+                time=slot_time(random.randint(11, 21), random.choice((0, 30))),
+                party_size=random.randint(1, 8),
+                status=random.choice(statuses),
+            ))
+            if len(chunk) == 10_000:
+                Booking.objects.bulk_create(chunk)
+                chunk = []
+        Booking.objects.bulk_create(chunk)
+        Review.objects.bulk_create(
+            Review(
+                customer=random.choice(customers), restaurant=random.choice(restaurants),
+                rating=random.randint(1, 5), comment="-",
+            )
+            for _ in range(options["reviews"])
+        )
+        return restaurants[0], customers[0]
+
+    def indent(self, text):
+        return "\n".join(f"    {line}" for line in text.splitlines())
@@ -0,0 +1,26 @@
+import time
+from django.core.management.base import BaseCommand
+from bookings.models import SlotHold
+
+
+class Command(BaseCommand):
+    help = 'Releases the seats of expired slot holds in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep sweeping instead of exiting once no expired holds are left')
+        parser.add_argument('--interval', type=float, default=15,
+                            help='Seconds to sleep between sweeps when --loop is set')
+
+    def handle(self, *args, **options):
+        released = 0
+        while True:
+            batch = SlotHold.release_expired(limit=options['batch_size'])
+            released += batch
+            if batch < options['batch_size']:
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'Slot holds released: {released}'))
@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+from bookings.models import Booking, BookingSlot, SlotHold
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the booking slot ledger from Booking and SlotHold rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--restaurant',
+            type=int,
+            help='Only rebuild the slots of this restaurant id',
+        )
+
+    def handle(self, *args, **options):
+        bookings = Booking.objects.filter(status__in=Booking.ACTIVE_STATUSES)
+        # Expired holds keep their seats until a sweep deletes them
+        holds = SlotHold.objects.all()
+        slots = BookingSlot.objects.all()
+        if options['restaurant']:
+            bookings = bookings.filter(restaurant_id=options['restaurant'])
+            holds = holds.filter(restaurant_id=options['restaurant'])
+            slots = slots.filter(restaurant_id=options['restaurant'])
+
+        with transaction.atomic():
+            existing = {
+                (slot.restaurant_id, slot.date, slot.time): slot
+                for slot in slots.select_for_update()
+            }
+            totals = {}
+            for rows in (bookings, holds):
+                rows = rows.values_list('restaurant_id', 'date', 'time').annotate(
+                    booked=Sum('party_size')
+                ).order_by()
+                for restaurant_id, date, time, booked in rows.iterator():
+                    key = (restaurant_id, date, time)
+                    totals[key] = totals.get(key, 0) + booked
+
+            to_create = []
+            to_update = []
+            for key, booked in totals.items():
+                slot = existing.pop(key, None)
+                if slot is None:
+                    to_create.append(BookingSlot(
+                        restaurant_id=key[0], date=key[1], time=key[2], booked=booked
+                    ))
+                elif slot.booked != booked:
+                    slot.booked = booked
+                    to_update.append(slot)
+
+            BookingSlot.objects.bulk_create(to_create, batch_size=1000)
+            BookingSlot.objects.bulk_update(to_update, ['booked'], batch_size=1000)
+            # Whatever is left has no active bookings or holds behind it
+            BookingSlot.objects.filter(pk__in=[slot.pk for slot in existing.values()]).delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Booking slots rebuilt: {len(to_create)} created, '
+            f'{len(to_update)} corrected, {len(existing)} removed'
+        ))
@@ -0,0 +1,38 @@
+import threading
+import time
+from django.core.management.base import BaseCommand
+from bookings.fakes import FakeSmtpServer, FakeTwilioServer
+
+
+class Command(BaseCommand):
+    help = 'Runs a fake SMTP server and a fake Twilio endpoint for local notification load tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--smtp-port', type=int, default=1025)
+        parser.add_argument('--sms-port', type=int, default=8025)
+
+    def handle(self, *args, **options):
+        smtp = FakeSmtpServer((options['host'], options['smtp_port']))
+        sms = FakeTwilioServer((options['host'], options['sms_port']))
+        for server in (smtp, sms):
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        self.stdout.write(
+            f'Fake SMTP on {options["host"]}:{options["smtp_port"]} '
+            f'(EMAIL_HOST/EMAIL_PORT), fake Twilio on '
+            f'http://{options["host"]}:{options["sms_port"]} (TWILIO_API_BASE_URL)'
+        )
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            smtp.shutdown()
+            sms.shutdown()
+
+        for name, server in (('SMTP', smtp), ('Twilio', sms)):
+            self.stdout.write(
+                f'{name}: {server.messages} messages over {server.connections} connections'
+            )
@@ -0,0 +1,44 @@
+# Generated by Django 5.0.2 on 2026-10-18 11:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def populate_slots(apps, schema_editor):
+    Booking = apps.get_model('bookings', 'Booking')
+    BookingSlot = apps.get_model('bookings', 'BookingSlot')
+    totals = (
+        Booking.objects.filter(status__in=['pending', 'confirmed'])
+        .values('restaurant_id', 'date', 'time')
+        .annotate(booked=Sum('party_size'))
+    )
+    BookingSlot.objects.bulk_create(
+        [BookingSlot(**row) for row in totals.iterator()], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0004_booking_email_booking_phone_number'),
+        ('restaurants', '0003_restaurant_capacity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('time', models.TimeField()),
+                ('booked', models.IntegerField(default=0)),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='restaurants.restaurant')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='bookingslot',
+            constraint=models.UniqueConstraint(fields=('restaurant', 'date', 'time'), name='unique_booking_slot'),
+        ),
+        migrations.RunPython(populate_slots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.0.2 on 2026-10-18 12:01
+
+from django.conf import settings
+from django.db import migrations, models
+from booktable.indexes import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('bookings', '0006_notification'),
+        ('restaurants', '0007_restaurant_location'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='booking',
+            index=models.Index(fields=['customer', '-date', '-time', '-id'], name='booking_customer_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='booking',
+            index=models.Index(fields=['restaurant', '-date', '-time', '-id'], name='booking_restaurant_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('status__in', ['pending', 'confirmed'])), fields=['restaurant', 'date', 'time'], name='booking_active_slot_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('status__in', ['pending', 'confirmed'])), fields=['date', 'time'], name='booking_active_date_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.2 on 2026-10-18 12:11
+
+from django.conf import settings
+from django.db import migrations, models
+from booktable.indexes import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('bookings', '0007_booking_access_indexes'),
+        ('restaurants', '0008_restaurant_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='booking',
+            index=models.Index(fields=['updated_at'], name='booking_updated_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='booking',
+            index=models.Index(fields=['created_at'], name='booking_created_idx'),
+        ),
+    ]
@@ -1,8 +1,71 @@
-from django.db import models
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.utils import timezone
 from users.models import User
 from restaurants.models import Restaurant
-from datetime import datetime
+from datetime import datetime, timedelta
 from django.core.exceptions import ValidationError
+from .occupancy import bump_version, get_engine
+
+
+class SlotUnavailable(ValidationError):
+    """Raised when a booking would take a slot past the restaurant's capacity."""
+
+
+class BookingSlot(models.Model):
+    """
+    Running total of seats booked per (restaurant, date, time).
+
+    Kept in step with Booking writes so availability checks read one row
+    instead of summing every booking in the slot. Use the
+    rebuild_booking_slots command to repair it if it ever drifts.
+    """
+
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE)
+    date = models.DateField()
+    time = models.TimeField()
+    booked = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["restaurant", "date", "time"], name="unique_booking_slot"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.restaurant_id} on {self.date} {self.time}: {self.booked} booked"
+
+    @classmethod
+    def adjust(cls, restaurant_id, date, time, delta):
+        """
+        Add delta seats to a slot, creating the ledger row if needed.
+
+        The UPDATE holds the slot's row lock until the surrounding
+        transaction ends, so concurrent writers to the same slot queue up
+        behind each other while other slots stay unaffected. Returns the
+        new total when seats were added.
+        """
+        if not delta:
+            return None
+        bump_version(restaurant_id)
+        slot = cls.objects.filter(restaurant_id=restaurant_id, date=date, time=time)
+        if not slot.update(booked=F("booked") + delta):
+            if delta < 0:
+                return None
+            try:
+                with transaction.atomic():
+                    cls.objects.create(
+                        restaurant_id=restaurant_id, date=date, time=time, booked=delta
+                    )
+                return delta
+            except IntegrityError:
+                # Another writer created the row first
+                slot.update(booked=F("booked") + delta)
+        if delta < 0:
+            return None
+        return slot.values_list("booked", flat=True).get()
 
 
 class Booking(models.Model):
@@ -12,6 +75,15 @@ class Booking(models.Model):
         ("cancelled", "Cancelled"),
         ("completed", "Completed"),
     ]
+    # Statuses that hold seats in the slot ledger
+    ACTIVE_STATUSES = ["pending", "confirmed"]
+    # Statuses bulk_transition may move a booking from, by target status
+    TRANSITIONS = {
+        "confirmed": ["pending"],
+        "cancelled": ["pending", "confirmed"],
+        "completed": ["confirmed"],
+    }
+    MAX_PARTY_SIZE = 20
 
     customer = models.ForeignKey(
         User, on_delete=models.CASCADE, limit_choices_to={"role": "customer"}
@@ -26,43 +98,304 @@ class Booking(models.Model):
     email = models.EmailField(blank=True, null=True)
     phone_number = models.CharField(max_length=32, blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # A customer's bookings in BookingViewSet order, which also
+            # serves ?upcoming= as a range on date
+            models.Index(
+                fields=["customer", "-date", "-time", "-id"],
+                name="booking_customer_date_idx",
+            ),
+            # A restaurant's bookings in the same order, for managers
+            models.Index(
+                fields=["restaurant", "-date", "-time", "-id"],
+                name="booking_restaurant_date_idx",
+            ),
+            # Seats held in a slot; only ACTIVE_STATUSES rows take part
+            models.Index(
+                fields=["restaurant", "date", "time"],
+                condition=models.Q(status__in=["pending", "confirmed"]),
+                name="booking_active_slot_idx",
+            ),
+            # Active bookings by day across restaurants
+            models.Index(
+                fields=["date", "time"],
+                condition=models.Q(status__in=["pending", "confirmed"]),
+                name="booking_active_date_idx",
+            ),
+            # Rows changed since the last update_rollups run, and the
+            # days it recounts
+            models.Index(fields=["updated_at"], name="booking_updated_idx"),
+            models.Index(fields=["created_at"], name="booking_created_idx"),
+        ]
+
     def clean(self):
         # Validate party size
         if self.party_size < 1:
             raise ValidationError("Party size must be at least 1")
-        if self.party_size > 20:  # Assuming max party size is 20
-            raise ValidationError("Party size cannot exceed 20")
+        if self.party_size > self.MAX_PARTY_SIZE:
+            raise ValidationError(f"Party size cannot exceed {self.MAX_PARTY_SIZE}")
 
         # Validate date is not in the past
         if self.date < datetime.now().date():
             raise ValidationError("Cannot book for a past date")
 
+    def slot_claim(self):
+        """
+        The (restaurant_id, date, time, party_size) this booking holds in
+        the slot ledger, or None if its status does not take up seats.
+        """
+        if self.status not in self.ACTIVE_STATUSES:
+            return None
+        return (self.restaurant_id, self.date, self.time, self.party_size)
+
+    def stored_slot_claim(self):
+        """
+        slot_claim() of the row as stored, locked until the surrounding
+        transaction ends. Another copy of this booking may have moved or
+        released its seats since this instance was loaded, so the copy in
+        memory cannot be trusted for what the ledger holds.
+        """
+        if self._state.adding or self.pk is None:
+            return None
+        stored = (
+            Booking.objects.select_for_update()
+            .filter(pk=self.pk)
+            .values_list("restaurant_id", "date", "time", "party_size", "status")
+            .first()
+        )
+        if stored is None or stored[4] not in self.ACTIVE_STATUSES:
+            return None
+        return stored[:4]
+
     def save(self, *args, **kwargs):
+        # Callers such as reschedule may assign date and time as strings
+        self.date = self._meta.get_field("date").to_python(self.date)
+        self.time = self._meta.get_field("time").to_python(self.time)
         self.clean()
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            # Locking the row makes concurrent saves of the same booking
+            # take turns, each moving the seats the one before left
+            previous = self.stored_slot_claim()
+            super().save(*args, **kwargs)
+            current = self.slot_claim()
+            if previous != current:
+                self._move_slot_claim(previous, current)
+
+    def _move_slot_claim(self, previous, current):
+        changes = []
+        if previous:
+            changes.append((previous[:3], -previous[3]))
+        if current:
+            changes.append((current[:3], current[3]))
+
+        # Fixed lock order keeps two opposite reschedules from deadlocking
+        booked = None
+        for slot, delta in sorted(changes):
+            total = BookingSlot.adjust(*slot, delta)
+            if delta > 0:
+                booked = total
+
+        # Seats are taken before the capacity check, so two concurrent
+        # bookings for the same slot can never both pass it
+        if current and booked > self.restaurant.capacity:
+            raise SlotUnavailable(
+                "Restaurant is not available for the selected time and party size"
+            )
 
     def __str__(self):
         return f"{self.customer.username} @ {self.restaurant.name} on {self.date} {self.time}"
 
+    @classmethod
+    def bulk_transition(cls, queryset, status):
+        """
+        Move the bookings in queryset that may go to status (see
+        TRANSITIONS) there with one conditional UPDATE, and release the
+        seats they held in the slot ledger with one adjustment per slot.
+
+        Skips save() and clean(), so past bookings can be completed.
+        Returns {id: status before} for every booking in queryset.
+        """
+        allowed = cls.TRANSITIONS[status]
+        with transaction.atomic():
+            # Locked, so the rows updated are the rows read here
+            rows = list(
+                queryset.select_for_update(of=("self",))
+                .values_list("pk", "restaurant_id", "date", "time", "party_size", "status")
+            )
+            eligible = [row for row in rows if row[5] in allowed]
+            if eligible:
+                cls.objects.filter(
+                    pk__in=[row[0] for row in eligible], status__in=allowed
+                ).update(status=status, updated_at=timezone.now())
+
+            releases = {}
+            if status not in cls.ACTIVE_STATUSES:
+                for _, restaurant_id, date, time, party_size, previous in eligible:
+                    if previous in cls.ACTIVE_STATUSES:
+                        slot = (restaurant_id, date, time)
+                        releases[slot] = releases.get(slot, 0) - party_size
+            # Same lock order as single bookings use
+            for slot, delta in sorted(releases.items()):
+                BookingSlot.adjust(*slot, delta)
+        return {row[0]: row[5] for row in rows}
+
     @classmethod
     def check_availability(cls, restaurant, date, time, party_size):
         """
         Check if a restaurant is available for the given date, time, and party size.
         Returns True if available, False otherwise.
         """
-        # Get all bookings for the restaurant on the given date and time
-        conflicting_bookings = cls.objects.filter(
-            restaurant=restaurant,
-            date=date,
-            time=time,
-            status__in=["pending", "confirmed"],
+        # Seats already taken come from the in-process occupancy arrays
+        # when enabled, otherwise from the slot ledger
+        engine = get_engine()
+        total_booked = engine.booked(restaurant.id, date, time) if engine else None
+        if total_booked is None:
+            total_booked = (
+                BookingSlot.objects.filter(restaurant=restaurant, date=date, time=time)
+                .values_list("booked", flat=True)
+                .first()
+            ) or 0
+
+        # Check if there's enough capacity
+        return (total_booked + party_size) <= restaurant.capacity
+
+
+class SlotHold(models.Model):
+    """
+    Seats set aside for a customer for a few minutes while they fill in
+    the booking form.
+
+    A hold takes its seats in the slot ledger like an active booking, so
+    availability checks count it without reading this table. Booking
+    with the hold gives the seats to the booking; otherwise
+    release_expired() hands them back after expires_at. Deleting a hold
+    by any route, cascades included, gives its seats back through the
+    receivers in signals.py.
+    """
+
+    customer = models.ForeignKey(User, on_delete=models.CASCADE)
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE)
+    date = models.DateField()
+    time = models.TimeField()
+    party_size = models.IntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        # Expiry sweeps read the oldest entries of this index only
+        indexes = [models.Index(fields=["expires_at"], name="slothold_expires_idx")]
+
+    def __str__(self):
+        return f"{self.party_size} seats at {self.restaurant_id} on {self.date} {self.time} until {self.expires_at}"
+
+    @property
+    def expired(self):
+        return self.expires_at <= timezone.now()
+
+    @classmethod
+    def place(cls, customer, restaurant, date, time, party_size):
+        """
+        Hold party_size seats for settings.BOOKING_HOLD_SECONDS, or raise
+        SlotUnavailable if the slot cannot fit them.
+        """
+        # Free what lapsed first, so stale holds don't block this one
+        cls.release_expired()
+        with transaction.atomic():
+            hold = cls.objects.create(
+                customer=customer,
+                restaurant=restaurant,
+                date=date,
+                time=time,
+                party_size=party_size,
+                expires_at=timezone.now() + timedelta(seconds=settings.BOOKING_HOLD_SECONDS),
+            )
+            booked = BookingSlot.adjust(restaurant.id, date, time, party_size)
+            if booked > restaurant.capacity:
+                raise SlotUnavailable(
+                    "Restaurant is not available for the selected time and party size"
+                )
+        return hold
+
+    def stored_slot_claim(self):
+        """
+        The (restaurant_id, date, time, party_size) the hold's row still
+        claims, locked until the surrounding transaction ends, or None
+        once another request has deleted it.
+        """
+        if self._state.adding or self.pk is None:
+            return None
+        return (
+            SlotHold.objects.select_for_update()
+            .filter(pk=self.pk)
+            .values_list("restaurant_id", "date", "time", "party_size")
+            .first()
         )
 
-        # Calculate total party size of existing bookings
-        total_booked = sum(booking.party_size for booking in conflicting_bookings)
+    def release(self):
+        """Give the seats back, unless a sweep already has. Returns whether it did."""
+        # The delete receivers hand the seats back
+        deleted, _ = SlotHold.objects.filter(pk=self.pk).delete()
+        return bool(deleted)
 
-        # Assuming restaurant capacity is 100 (you might want to add this to Restaurant model)
-        restaurant_capacity = 100
+    @classmethod
+    def release_expired(cls, limit=500):
+        """
+        Delete up to limit expired holds, which gives back their seats.
+        Reads a range of the expires_at index, so it costs nothing when no
+        hold has lapsed. Returns the number of holds released.
+        """
+        with transaction.atomic():
+            holds = list(
+                cls.objects.select_for_update(skip_locked=True)
+                .filter(expires_at__lte=timezone.now())
+                .order_by("expires_at")[:limit]
+            )
+            # In slot order, like every other writer of several ledger
+            # rows, so concurrent writers cannot deadlock
+            for hold in sorted(holds, key=lambda hold: (hold.restaurant_id, hold.date, hold.time)):
+                hold.delete()
+        return len(holds)
 
-        # Check if there's enough capacity
-        return (total_booked + party_size) <= restaurant_capacity
+
+class Notification(models.Model):
+    """
+    Outbox row for a booking notification.
+
+    Written in the same transaction as the booking and delivered later
+    by the send_notifications command, so providers never slow down a
+    booking request.
+    """
+
+    CHANNEL_CHOICES = [
+        ("email", "Email"),
+        ("sms", "SMS"),
+    ]
+    # "sending" rows are claimed by a worker until next_attempt_at, after
+    # which another worker may take them over
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("sending", "Sending"),
+        ("sent", "Sent"),
+        ("failed", "Failed"),
+    ]
+
+    booking = models.ForeignKey(
+        Booking, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    channel = models.CharField(max_length=10, choices=CHANNEL_CHOICES)
+    recipient = models.CharField(max_length=254)
+    subject = models.CharField(max_length=200, blank=True)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
+
+    def __str__(self):
+        return f"{self.channel} to {self.recipient} ({self.status})"
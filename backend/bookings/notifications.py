@@ -0,0 +1,188 @@
+import logging
+import threading
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.utils.module_loading import import_string
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+try:
+    from twilio.rest import Client as TwilioClient
+    from twilio.http.http_client import TwilioHttpClient
+except ImportError:
+    TwilioClient = None
+    TwilioHttpClient = object
+    logger.warning("Twilio package not installed. SMS notifications will be disabled.")
+
+
+TWILIO_API_URL = "https://api.twilio.com"
+
+
+class PooledTwilioHttpClient(TwilioHttpClient):
+    """
+    Twilio HTTP client on one keep-alive session, optionally pointed at
+    TWILIO_API_BASE_URL (e.g. the fake endpoint) instead of api.twilio.com.
+    """
+
+    def request(self, method, url, *args, **kwargs):
+        base_url = getattr(settings, "TWILIO_API_BASE_URL", "")
+        if base_url and url.startswith(TWILIO_API_URL):
+            url = base_url.rstrip("/") + url[len(TWILIO_API_URL):]
+        return super().request(method, url, *args, **kwargs)
+
+
+_twilio_client = None
+_twilio_client_lock = threading.Lock()
+
+
+def get_twilio_client():
+    """The process-wide Twilio client, created on first use."""
+    global _twilio_client
+    with _twilio_client_lock:
+        if _twilio_client is None:
+            _twilio_client = TwilioClient(
+                settings.TWILIO_ACCOUNT_SID,
+                settings.TWILIO_AUTH_TOKEN,
+                http_client=PooledTwilioHttpClient(pool_connections=True, timeout=10),
+            )
+        return _twilio_client
+
+
+class TwilioSmsSender:
+    def __init__(self):
+        self.client = get_twilio_client()
+
+    def send(self, to, body):
+        message = self.client.messages.create(
+            body=body, from_=settings.TWILIO_PHONE_NUMBER, to=to
+        )
+        return message.sid
+
+
+class FakeSmsSender:
+    """Keeps messages in memory, like Django's locmem email backend."""
+
+    outbox = []
+
+    def send(self, to, body):
+        FakeSmsSender.outbox.append({"to": to, "body": body})
+        return f"fake-{len(FakeSmsSender.outbox)}"
+
+
+def sms_enabled():
+    sender_class = import_string(settings.BOOKING_SMS_SENDER)
+    return not (sender_class is TwilioSmsSender and TwilioClient is None)
+
+
+def get_sms_sender():
+    """An instance of the BOOKING_SMS_SENDER class, or None if SMS is unavailable."""
+    if not sms_enabled():
+        return None
+    return import_string(settings.BOOKING_SMS_SENDER)()
+
+
+class EmailChannel:
+    def send_batch(self, notifications):
+        """
+        Send every notification over a single SMTP connection. Returns
+        (notification, error) pairs, with error None on success.
+        """
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+        except Exception as e:
+            return [(notification, e) for notification in notifications]
+
+        results = []
+        try:
+            for notification in notifications:
+                message = EmailMessage(
+                    subject=notification.subject,
+                    body=notification.body,
+                    from_email=getattr(
+                        settings, "DEFAULT_FROM_EMAIL", "noreply@example.com"
+                    ),
+                    to=[notification.recipient],
+                    connection=connection,
+                )
+                try:
+                    connection.send_messages([message])
+                    results.append((notification, None))
+                except Exception as e:
+                    results.append((notification, e))
+        finally:
+            connection.close()
+        return results
+
+
+class SmsChannel:
+    def __init__(self, sender=None):
+        self.sender = sender
+
+    def send_batch(self, notifications):
+        """Send through the shared sender. Returns (notification, error) pairs."""
+        results = []
+        for notification in notifications:
+            try:
+                if self.sender is None:
+                    raise RuntimeError("No SMS sender is available")
+                self.sender.send(notification.recipient, notification.body)
+                results.append((notification, None))
+            except Exception as e:
+                results.append((notification, e))
+        return results
+
+
+def get_channels():
+    """One adapter per channel, meant to be reused across batches."""
+    return {"email": EmailChannel(), "sms": SmsChannel(get_sms_sender())}
+
+
+def deliver_batch(notifications, channels):
+    """Send a batch through its channels. Returns (notification, error) pairs."""
+    by_channel = {}
+    for notification in notifications:
+        by_channel.setdefault(notification.channel, []).append(notification)
+
+    results = []
+    for channel, pending in by_channel.items():
+        if channel not in channels:
+            error = ValueError(f"Unknown notification channel: {channel}")
+            results.extend((notification, error) for notification in pending)
+        else:
+            results.extend(channels[channel].send_batch(pending))
+    return results
+
+
+def enqueue_booking_confirmation(booking):
+    """
+    Queue the confirmation email and SMS for a booking. Call inside the
+    transaction that saves the booking so both commit or neither does.
+    """
+    details = f"{booking.restaurant.name} on {booking.date} at {booking.time}"
+    notifications = []
+    if booking.email:
+        notifications.append(
+            Notification(
+                booking=booking,
+                channel="email",
+                recipient=booking.email,
+                subject="Your Table Booking Confirmation",
+                body=f"Thank you for booking at {details}.",
+            )
+        )
+    if booking.phone_number and sms_enabled():
+        # Ensure phone number is in E.164 format
+        phone_number = booking.phone_number
+        if not phone_number.startswith("+"):
+            phone_number = "+" + phone_number
+        notifications.append(
+            Notification(
+                booking=booking,
+                channel="sms",
+                recipient=phone_number,
+                body=f"Your booking at {details} is confirmed.",
+            )
+        )
+    return Notification.objects.bulk_create(notifications)
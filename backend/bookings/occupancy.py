@@ -0,0 +1,149 @@
+"""
+In-process occupancy arrays for availability lookups.
+
+Each worker keeps one NumPy array of booked seats per (restaurant, day),
+indexed by the slot grid from availability.slot_times(). Arrays are
+loaded lazily from the slot ledger and thrown away when the restaurant's
+version counter in the cache moves, which happens after every committed
+ledger change, or once they are BOOKING_OCCUPANCY_TTL seconds old.
+Enabled with the BOOKING_OCCUPANCY_ENGINE setting, which needs a cache
+shared by all workers for the version counters to reach them.
+"""
+import logging
+import threading
+import time as time_module
+from collections import OrderedDict
+from datetime import timedelta
+from django.conf import settings
+from django.core import checks
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.dateparse import parse_date, parse_time
+from booktable.caching import cache_is_shared
+
+logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+    logger.warning("NumPy not installed. The occupancy engine will be disabled.")
+
+
+VERSION_KEY = "booking-occupancy-version:{}"
+
+
+def current_version(restaurant_id):
+    version = cache.get(VERSION_KEY.format(restaurant_id))
+    if version is None:
+        # First reader after a cache flush picks the version everyone shares
+        cache.add(VERSION_KEY.format(restaurant_id), time_module.time_ns(), None)
+        version = cache.get(VERSION_KEY.format(restaurant_id))
+    return version
+
+
+def bump_version(restaurant_id):
+    """Invalidate every worker's arrays for a restaurant once the change commits."""
+
+    def bump():
+        cache.set(VERSION_KEY.format(restaurant_id), time_module.time_ns(), None)
+
+    transaction.on_commit(bump)
+
+
+class OccupancyEngine:
+    def __init__(self, max_days=4096):
+        self.max_days = max_days
+        self._days = OrderedDict()
+        self._lock = threading.Lock()
+        self._columns = None
+
+    @property
+    def columns(self):
+        if self._columns is None:
+            from .availability import slot_times
+
+            self._columns = {
+                slot_time: index for index, slot_time in enumerate(slot_times())
+            }
+        return self._columns
+
+    def clear(self):
+        with self._lock:
+            self._days.clear()
+            self._columns = None
+
+    def booked(self, restaurant_id, date, time):
+        """Seats booked in one slot, or None if it is not on the slot grid."""
+        if isinstance(date, str):
+            date = parse_date(date)
+        if isinstance(time, str):
+            time = parse_time(time)
+        column = self.columns.get(time)
+        if column is None or date is None:
+            return None
+        return int(self.booked_range(restaurant_id, date, date)[0, column])
+
+    def booked_range(self, restaurant_id, start, end):
+        """Array of booked seats with one row per day and one column per slot."""
+        version = current_version(restaurant_id)
+        # Bounds staleness should a version bump be lost, e.g. to eviction
+        fresh_after = time_module.monotonic() - settings.BOOKING_OCCUPANCY_TTL
+        days = [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+        rows = {}
+        with self._lock:
+            for day in days:
+                entry = self._days.get((restaurant_id, day))
+                if entry is not None and entry[0] == version and entry[1] > fresh_after:
+                    self._days.move_to_end((restaurant_id, day))
+                    rows[day] = entry[2]
+
+        missing = [day for day in days if day not in rows]
+        if missing:
+            loaded_at = time_module.monotonic()
+            loaded = self._load(restaurant_id, missing)
+            with self._lock:
+                for day, row in loaded.items():
+                    self._days[(restaurant_id, day)] = (version, loaded_at, row)
+                    self._days.move_to_end((restaurant_id, day))
+                while len(self._days) > self.max_days:
+                    self._days.popitem(last=False)
+            rows.update(loaded)
+
+        return np.stack([rows[day] for day in days])
+
+    def _load(self, restaurant_id, days):
+        from .models import BookingSlot
+
+        columns = self.columns
+        rows = {day: np.zeros(len(columns), dtype=np.int32) for day in days}
+        ledger = BookingSlot.objects.filter(
+            restaurant_id=restaurant_id, date__range=(min(days), max(days))
+        ).values_list("date", "time", "booked")
+        for slot_date, slot_time, booked in ledger:
+            if slot_date in rows and slot_time in columns:
+                rows[slot_date][columns[slot_time]] = booked
+        return rows
+
+
+engine = OccupancyEngine()
+
+
+def get_engine():
+    """The shared engine if it is enabled and NumPy is available, else None."""
+    if np is None or not getattr(settings, "BOOKING_OCCUPANCY_ENGINE", False):
+        return None
+    return engine
+
+
+@checks.register(checks.Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    if not getattr(settings, "BOOKING_OCCUPANCY_ENGINE", False) or cache_is_shared():
+        return []
+    return [
+        checks.Error(
+            "BOOKING_OCCUPANCY_ENGINE needs a cache shared by all workers.",
+            hint="Point CACHE_URL at Redis, Memcached or the database, or turn the engine off.",
+            id="bookings.E001",
+        )
+    ]
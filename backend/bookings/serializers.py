@@ -1,16 +1,24 @@
 from rest_framework import serializers
-from .models import Booking
+from .models import Booking, SlotHold, SlotUnavailable
 from restaurants.models import Restaurant
 from datetime import datetime, date
+from django.conf import settings
+from django.db import transaction
 from django.utils import timezone
 import logging
 
+logger = logging.getLogger(__name__)
+
 
 class BookingSerializer(serializers.ModelSerializer):
     email = serializers.EmailField(required=False, allow_blank=True, allow_null=True)
     phone_number = serializers.CharField(
         required=False, allow_blank=True, allow_null=True
     )
+    # A SlotHold of the customer's whose seats the new booking takes over
+    hold = serializers.PrimaryKeyRelatedField(
+        queryset=SlotHold.objects.all(), required=False, write_only=True
+    )
 
     class Meta:
         model = Booking
@@ -26,13 +34,12 @@ class BookingSerializer(serializers.ModelSerializer):
             "updated_at",
             "email",
             "phone_number",
+            "hold",
         ]
         read_only_fields = ["customer", "status", "created_at", "updated_at"]
 
     def validate(self, data):
-        logger = logging.getLogger(__name__)
-        logger.info(f"BookingSerializer.validate called with data: {data}")
-        print(f"BookingSerializer.validate called with data: {data}")
+        logger.debug("BookingSerializer.validate called with data: %s", data)
         # Get the instance if this is an update
         instance = getattr(self, "instance", None)
 
@@ -51,8 +58,23 @@ class BookingSerializer(serializers.ModelSerializer):
         if "party_size" in data:
             if data["party_size"] < 1:
                 raise serializers.ValidationError("Party size must be at least 1")
-            if data["party_size"] > 20:
-                raise serializers.ValidationError("Party size cannot exceed 20")
+            if data["party_size"] > Booking.MAX_PARTY_SIZE:
+                raise serializers.ValidationError(
+                    f"Party size cannot exceed {Booking.MAX_PARTY_SIZE}"
+                )
+
+        hold = data.get("hold")
+        if hold is not None:
+            if instance is not None:
+                raise serializers.ValidationError("Holds can only be used for new bookings")
+            if hold.customer_id != self.context["request"].user.pk or hold.expired:
+                raise serializers.ValidationError("Hold not found or expired")
+            if (hold.restaurant_id, hold.date, hold.time) != (
+                data["restaurant"].id,
+                data["date"],
+                data["time"],
+            ):
+                raise serializers.ValidationError("Hold is for a different time slot")
 
         # Check restaurant availability only if relevant fields are being updated
         if any(field in data for field in ["restaurant", "date", "time", "party_size"]):
@@ -66,6 +88,17 @@ class BookingSerializer(serializers.ModelSerializer):
             )
 
             if all([restaurant, date, time, party_size]):
+                # Seats this booking already holds in the same slot are reused
+                if instance and instance.slot_claim() == (
+                    restaurant.id,
+                    date,
+                    time,
+                    instance.party_size,
+                ):
+                    party_size -= instance.party_size
+                # and so are the seats of the hold it converts
+                if hold is not None:
+                    party_size -= hold.party_size
                 if not Booking.check_availability(restaurant, date, time, party_size):
                     raise serializers.ValidationError(
                         "Restaurant is not available for the selected time and party size"
@@ -76,4 +109,57 @@ class BookingSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         # Set the customer to the current user
         validated_data["customer"] = self.context["request"].user
-        return super().create(validated_data)
+        hold = validated_data.pop("hold", None)
+        try:
+            with transaction.atomic():
+                # The booking claims the seats as the hold gives them back.
+                # A hold swept since validate() freed them already, and
+                # save() still checks capacity either way
+                if hold is not None:
+                    hold.release()
+                return super().create(validated_data)
+        except SlotUnavailable as e:
+            # Lost the slot to a concurrent booking after validate() passed
+            raise serializers.ValidationError(e.messages)
+
+    def update(self, instance, validated_data):
+        try:
+            return super().update(instance, validated_data)
+        except SlotUnavailable as e:
+            raise serializers.ValidationError(e.messages)
+
+
+class SlotHoldSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SlotHold
+        fields = [
+            "id",
+            "restaurant",
+            "date",
+            "time",
+            "party_size",
+            "created_at",
+            "expires_at",
+        ]
+        read_only_fields = ["created_at", "expires_at"]
+
+    def validate(self, data):
+        if data["date"] < timezone.localtime().date():
+            raise serializers.ValidationError("Cannot hold a past date")
+        if not 1 <= data["party_size"] <= Booking.MAX_PARTY_SIZE:
+            raise serializers.ValidationError(
+                f"Party size must be between 1 and {Booking.MAX_PARTY_SIZE}"
+            )
+        user = self.context["request"].user
+        held = SlotHold.objects.filter(customer=user, expires_at__gt=timezone.now()).count()
+        if held >= settings.BOOKING_MAX_HOLDS:
+            raise serializers.ValidationError(
+                f"At most {settings.BOOKING_MAX_HOLDS} holds can be kept at once"
+            )
+        return data
+
+    def create(self, validated_data):
+        try:
+            return SlotHold.place(customer=self.context["request"].user, **validated_data)
+        except SlotUnavailable as e:
+            raise serializers.ValidationError(e.messages)
@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+from .models import Booking, BookingSlot, SlotHold
+
+
+@receiver(pre_delete, sender=SlotHold)
+@receiver(pre_delete, sender=Booking)
+def lock_slot_claim(sender, instance, **kwargs):
+    # Runs in the delete's transaction. What the row holds, not what a
+    # possibly stale instance says, is what the delete releases; a row
+    # already deleted by another request releases nothing
+    instance._stored_slot_claim = instance.stored_slot_claim()
+
+
+@receiver(post_delete, sender=SlotHold)
+@receiver(post_delete, sender=Booking)
+def release_slot_on_delete(sender, instance, **kwargs):
+    # Runs for cascaded and queryset deletes too, which never call the
+    # instance's delete()
+    claim = getattr(instance, "_stored_slot_claim", None)
+    if claim:
+        BookingSlot.adjust(*claim[:3], -claim[3])
@@ -1,3 +1,781 @@
-from django.test import TestCase
+import json
+import socket
+import threading
+from datetime import date, time, timedelta
+from io import StringIO
+from unittest import mock, skipIf
+from django.core import mail
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from restaurants.tests import create_restaurant
+from users.models import User
+from . import notifications
+from .fakes import FakeSmtpServer, FakeTwilioServer
+from .models import Booking, BookingSlot, Notification, SlotHold
+from .notifications import FakeSmsSender
+from .occupancy import VERSION_KEY, check_shared_cache, engine, np
 
-# Create your tests here.
+
+class BookingQueryBudgetTests(TestCase):
+    """
+    Each endpoint must run a fixed number of queries no matter how many
+    rows it returns. A failure here usually means a new N+1.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user(username="manager", password="x", role="manager")
+        cls.customer = User.objects.create_user(username="customer", password="x")
+        cls.restaurant = create_restaurant(cls.manager, "Budget Bistro")
+        tomorrow = date.today() + timedelta(days=1)
+        cls.bookings = [
+            Booking.objects.create(
+                customer=cls.customer,
+                restaurant=cls.restaurant,
+                date=tomorrow,
+                time=time(hour=11 + i % 10),
+                party_size=2,
+            )
+            for i in range(15)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_list_as_customer(self):
+        self.client.force_authenticate(self.customer)
+        # page only; keyset pagination does not count
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/bookings/")
+        self.assertEqual(len(response.data["results"]), 10)
+
+    def test_list_as_manager(self):
+        self.client.force_authenticate(self.manager)
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/bookings/")
+        self.assertEqual(len(response.data["results"]), 10)
+
+    def test_retrieve(self):
+        self.client.force_authenticate(self.customer)
+        with self.assertNumQueries(1):
+            self.client.get(f"/api/bookings/{self.bookings[0].id}/")
+
+    def test_availability_grid(self):
+        self.client.force_authenticate(self.customer)
+        # restaurant + slot ledger range
+        with self.assertNumQueries(2):
+            self.client.get(
+                "/api/bookings/availability_grid/",
+                {"restaurant": self.restaurant.id, "start": str(date.today()), "end": str(date.today() + timedelta(days=6))},
+            )
+
+
+@override_settings(BOOKING_OPENING_TIME="19:00", BOOKING_CLOSING_TIME="20:00", BOOKING_SLOT_MINUTES=30)
+class AvailabilityGridTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        manager = User.objects.create_user(username="manager", password="x", role="manager")
+        cls.customer = User.objects.create_user(username="customer", password="x")
+        cls.restaurant = create_restaurant(manager, "Grid Bistro", capacity=30)
+        cls.start = date.today() + timedelta(days=1)
+
+        def book(day, hour, minute, party_size, status="pending"):
+            return Booking.objects.create(
+                customer=cls.customer, restaurant=cls.restaurant, date=cls.start + timedelta(days=day),
+                time=time(hour, minute), party_size=party_size, status=status,
+            )
+
+        book(0, 19, 0, 8)
+        book(0, 19, 0, 4, status="confirmed")
+        book(0, 19, 30, 20)
+        book(0, 19, 30, 10)
+        cancelled = book(0, 20, 0, 6)
+        cancelled.status = "cancelled"
+        cancelled.save()
+        book(2, 20, 0, 5)
+        book(2, 20, 0, 20)
+        # Outside the grid's hours
+        book(1, 12, 0, 20)
+        SlotHold.place(cls.customer, cls.restaurant, cls.start + timedelta(days=1), time(19, 30), 3)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def grid(self, **params):
+        return self.client.get(
+            "/api/bookings/availability_grid/", {"restaurant": self.restaurant.id, "start": str(self.start), **params}
+        )
+
+    def test_remaining_seats_per_slot(self):
+        response = self.grid(end=str(self.start + timedelta(days=2)))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["times"], ["19:00", "19:30", "20:00"])
+        self.assertEqual(response.data["capacity"], 30)
+        self.assertEqual(
+            [(day["date"], day["remaining"], day["max_party_size"]) for day in response.data["days"]],
+            [
+                (self.start, [18, 0, 30], [18, 0, 20]),
+                (self.start + timedelta(days=1), [30, 27, 30], [20, 20, 20]),
+                (self.start + timedelta(days=2), [30, 30, 5], [20, 20, 5]),
+            ],
+        )
+        self.assertNotIn("available", response.data["days"][0])
+
+    def test_party_size_marks_slots_available(self):
+        response = self.grid(party_size=18)
+        self.assertEqual(response.data["party_size"], 18)
+        self.assertEqual([day["available"] for day in response.data["days"]], [[True, False, True]])
+
+    @skipIf(np is None, "NumPy is not installed")
+    def test_occupancy_engine_agrees(self):
+        params = {"end": str(self.start + timedelta(days=3)), "party_size": 5}
+        expected = self.grid(**params).data
+        engine.clear()
+        self.addCleanup(engine.clear)
+        with self.settings(BOOKING_OCCUPANCY_ENGINE=True):
+            self.assertEqual(self.grid(**params).data, expected)
+
+    def test_rejects_bad_parameters(self):
+        self.assertEqual(self.grid(start="tomorrow").status_code, 400)
+        self.assertEqual(self.grid(end=str(self.start - timedelta(days=1))).status_code, 400)
+        self.assertEqual(self.grid(end=str(self.start + timedelta(days=31))).status_code, 400)
+        self.assertEqual(self.grid(party_size=21).status_code, 400)
+        self.assertEqual(self.grid(restaurant=0).status_code, 404)
+
+
+@skipIf(np is None, "NumPy is not installed")
+@override_settings(BOOKING_OCCUPANCY_ENGINE=True)
+class OccupancyEngineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        manager = User.objects.create_user(username="manager", password="x", role="manager")
+        cls.customer = User.objects.create_user(username="customer", password="x")
+        cls.restaurant = create_restaurant(manager, "Engine Bistro", capacity=4)
+        cls.date = date.today() + timedelta(days=1)
+
+    def setUp(self):
+        engine.clear()
+        self.addCleanup(engine.clear)
+
+    def available(self, party_size=1):
+        return Booking.check_availability(self.restaurant, self.date, time(19), party_size)
+
+    def test_committed_booking_invalidates(self):
+        self.assertTrue(self.available(4))
+        with self.captureOnCommitCallbacks(execute=True):
+            Booking.objects.create(
+                customer=self.customer, restaurant=self.restaurant,
+                date=self.date, time=time(19), party_size=4,
+            )
+        self.assertFalse(self.available())
+
+    def test_bump_from_another_worker(self):
+        self.assertTrue(self.available())
+        # What another worker's booking leaves behind: the ledger row and
+        # a new version in the shared cache
+        BookingSlot.objects.create(restaurant=self.restaurant, date=self.date, time=time(19), booked=4)
+        cache.set(VERSION_KEY.format(self.restaurant.id), 0, None)
+        self.assertFalse(self.available())
+
+    def test_rows_expire_without_a_bump(self):
+        self.assertTrue(self.available())
+        BookingSlot.objects.create(restaurant=self.restaurant, date=self.date, time=time(19), booked=4)
+        self.assertTrue(self.available())
+        with self.settings(BOOKING_OCCUPANCY_TTL=0):
+            self.assertFalse(self.available())
+
+    def test_requires_shared_cache(self):
+        self.assertEqual([error.id for error in check_shared_cache(None)], ["bookings.E001"])
+        shared = {"default": {"BACKEND": "django.core.cache.backends.db.DatabaseCache", "LOCATION": "cache"}}
+        with self.settings(CACHES=shared):
+            self.assertEqual(check_shared_cache(None), [])
+        with self.settings(BOOKING_OCCUPANCY_ENGINE=False):
+            self.assertEqual(check_shared_cache(None), [])
+
+
+class BookingSlotLedgerTests(TestCase):
+    """
+    Two copies of one booking, as two concurrent requests would load it,
+    must never move its seats twice.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        manager = User.objects.create_user(username="manager", password="x", role="manager")
+        cls.customer = User.objects.create_user(username="customer", password="x")
+        cls.restaurant = create_restaurant(manager, "Ledger Bistro", capacity=4)
+        cls.date = date.today() + timedelta(days=1)
+
+    def setUp(self):
+        booking = Booking.objects.create(
+            customer=self.customer, restaurant=self.restaurant,
+            date=self.date, time=time(19), party_size=4,
+        )
+        self.first = Booking.objects.get(pk=booking.pk)
+        self.second = Booking.objects.get(pk=booking.pk)
+
+    def booked(self, hour=19):
+        return (
+            BookingSlot.objects.filter(restaurant=self.restaurant, date=self.date, time=time(hour))
+            .values_list("booked", flat=True)
+            .first()
+        )
+
+    def test_double_cancel(self):
+        for booking in (self.first, self.second):
+            booking.status = "cancelled"
+            booking.save()
+        self.assertEqual(self.booked(), 0)
+        Booking.objects.create(
+            customer=self.customer, restaurant=self.restaurant,
+            date=self.date, time=time(19), party_size=4,
+        )
+        self.assertEqual(self.booked(), 4)
+        self.assertFalse(Booking.check_availability(self.restaurant, self.date, time(19), 1))
+
+    def test_reschedule_from_stale_copy(self):
+        self.first.time = time(20)
+        self.first.save()
+        self.second.time = time(21)
+        self.second.save()
+        self.assertEqual([self.booked(19), self.booked(20), self.booked(21)], [0, 0, 4])
+
+    def test_cancel_then_reactivate_from_stale_copy(self):
+        self.first.status = "cancelled"
+        self.first.save()
+        self.second.status = "confirmed"
+        self.second.save()
+        self.assertEqual(self.booked(), 4)
+
+    def test_double_delete(self):
+        self.first.delete()
+        self.second.delete()
+        self.assertEqual(self.booked(), 0)
+
+    def test_delete_after_cancel_from_stale_copy(self):
+        self.first.status = "cancelled"
+        self.first.save()
+        self.second.delete()
+        self.assertEqual(self.booked(), 0)
+
+
+class BookingPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        manager = User.objects.create_user(username="manager", password="x", role="manager")
+        cls.customer = User.objects.create_user(username="customer", password="x")
+        restaurant = create_restaurant(manager, "Cursor Cafe")
+        tomorrow = date.today() + timedelta(days=1)
+        # Several bookings share each (date, time), so the id breaks ties
+        for i in range(23):
+            Booking.objects.create(
+                customer=cls.customer,
+                restaurant=restaurant,
+                date=tomorrow + timedelta(days=i % 2),
+                time=time(hour=11 + i % 4),
+                party_size=1,
+            )
+        cls.expected = list(
+            Booking.objects.order_by("-date", "-time", "-id").values_list("id", flat=True)
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def test_walks_every_page_in_both_directions(self):
+        pages = []
+        url = "/api/bookings/?page_size=5"
+        while url:
+            response = self.client.get(url)
+            pages.append([booking["id"] for booking in response.data["results"]])
+            url = response.data["next"]
+        self.assertEqual([pk for page in pages for pk in page], self.expected)
+
+        backwards = []
+        url = response.data["previous"]
+        while url:
+            response = self.client.get(url)
+            backwards.insert(0, [booking["id"] for booking in response.data["results"]])
+            url = response.data["previous"]
+        self.assertEqual(backwards, pages[:-1])
+
+    def test_total_only_on_request(self):
+        self.assertNotIn("count", self.client.get("/api/bookings/").data)
+        response = self.client.get("/api/bookings/", {"total": "exact"})
+        self.assertEqual(response.data["count"], 23)
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/api/bookings/", {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 404)
+
+
+class BookingConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        manager = User.objects.create_user(username="manager", password="x", role="manager")
+        cls.customer = User.objects.create_user(username="customer", password="x")
+        restaurant = create_restaurant(manager, "Etag Eatery")
+        cls.booking = Booking.objects.create(
+            customer=cls.customer,
+            restaurant=restaurant,
+            date=date.today() + timedelta(days=1),
+            time=time(hour=19),
+            party_size=2,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def test_matching_etag_returns_304(self):
+        for url in ["/api/bookings/", f"/api/bookings/{self.booking.id}/"]:
+            etag = self.client.get(url)["ETag"]
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response["ETag"], etag)
+            self.assertFalse(response.content)
+
+    def test_change_moves_etag(self):
+        url = f"/api/bookings/{self.booking.id}/"
+        etag = self.client.get(url)["ETag"]
+        self.booking.party_size = 3
+        self.booking.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_if_modified_since(self):
+        url = f"/api/bookings/{self.booking.id}/"
+        last_modified = self.client.get(url)["Last-Modified"]
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_lists_validate_by_etag_only(self):
+        other = Booking.objects.create(
+            customer=self.customer, restaurant=self.booking.restaurant,
+            date=self.booking.date, time=time(hour=20), party_size=2,
+        )
+        response = self.client.get("/api/bookings/")
+        self.assertFalse(response.has_header("Last-Modified"))
+        etag = response["ETag"]
+        # Removing a row moves no change time, but does move the ETag
+        other.delete()
+        response = self.client.get(
+            "/api/bookings/", HTTP_IF_MODIFIED_SINCE="Fri, 01 Jan 2100 00:00:00 GMT"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(self.client.get("/api/bookings/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class BookingExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user(username="manager", password="x", role="manager")
+        cls.customer = User.objects.create_user(username="customer", password="x")
+        other = User.objects.create_user(username="other", password="x")
+        restaurant = create_restaurant(cls.manager, "Export Eatery")
+        tomorrow = date.today() + timedelta(days=1)
+        for i, customer in enumerate([cls.customer] * 3 + [other]):
+            Booking.objects.create(
+                customer=customer,
+                restaurant=restaurant,
+                date=tomorrow,
+                time=time(hour=11 + i),
+                party_size=2,
+                email="=HYPERLINK(\"x\")" if i == 0 else None,
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def export(self, **params):
+        response = self.client.get("/api/bookings/export/", params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv_scoped_by_role(self):
+        self.client.force_authenticate(self.customer)
+        lines = self.export().splitlines()
+        self.assertTrue(lines[0].startswith("id,restaurant,restaurant_name,customer,customer_username,"))
+        self.assertEqual(len(lines), 4)
+        # Formula-like values are escaped for spreadsheets
+        self.assertIn("'=HYPERLINK", lines[-1])
+
+        self.client.force_authenticate(self.manager)
+        self.assertEqual(len(self.export().splitlines()), 5)
+
+    def test_ndjson_with_filters(self):
+        self.client.force_authenticate(self.manager)
+        rows = [
+            json.loads(line)
+            for line in self.export(format="ndjson", customer_name="other").splitlines()
+        ]
+        self.assertEqual([row["customer_username"] for row in rows], ["other"])
+        self.assertEqual(rows[0]["party_size"], 2)
+
+    def test_requires_authentication(self):
+        response = self.client.get("/api/bookings/export/")
+        self.assertEqual(response.status_code, 401)
+
+
+class BookingBulkTransitionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user(username="manager", password="x", role="manager")
+        cls.customer = User.objects.create_user(username="customer", password="x")
+        cls.restaurant = create_restaurant(cls.manager, "Bulk Bistro")
+        other = create_restaurant(
+            User.objects.create_user(username="other", password="x", role="manager"), "Elsewhere"
+        )
+        cls.date = date.today() + timedelta(days=1)
+        cls.bookings = [
+            Booking.objects.create(
+                customer=cls.customer, restaurant=cls.restaurant,
+                date=cls.date, time=time(hour=19), party_size=2,
+            )
+            for _ in range(3)
+        ]
+        cls.elsewhere = Booking.objects.create(
+            customer=cls.customer, restaurant=other, date=cls.date, time=time(hour=19), party_size=2,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def booked(self):
+        return BookingSlot.objects.get(restaurant=self.restaurant, date=self.date, time=time(hour=19)).booked
+
+    def test_confirm_by_ids(self):
+        first, second, _ = self.bookings
+        second.status = "cancelled"
+        second.save()
+        ids = [first.id, second.id, self.elsewhere.id]
+        # read and lock the scoped rows, then one UPDATE, in a savepoint
+        with self.assertNumQueries(4):
+            response = self.client.post("/api/bookings/bulk_confirm/", {"ids": ids}, format="json")
+        self.assertEqual(response.data["updated"], 1)
+        self.assertEqual(
+            [result["outcome"] for result in response.data["results"]],
+            ["updated", "skipped", "not_found"],
+        )
+        self.assertEqual(Booking.objects.get(pk=first.id).status, "confirmed")
+        self.assertEqual(self.booked(), 4)
+
+    def test_cancel_by_filter_releases_seats(self):
+        response = self.client.post(f"/api/bookings/bulk_cancel/?date={self.date}&status=pending")
+        self.assertEqual(response.data["updated"], 3)
+        self.assertEqual(self.booked(), 0)
+        self.assertEqual(Booking.objects.get(pk=self.elsewhere.id).status, "pending")
+
+    def test_complete_past_bookings(self):
+        Booking.objects.filter(pk=self.bookings[0].pk).update(
+            status="confirmed", date=date.today() - timedelta(days=1)
+        )
+        response = self.client.post(
+            "/api/bookings/bulk_complete/", {"ids": [self.bookings[0].id]}, format="json"
+        )
+        self.assertEqual(response.data["updated"], 1)
+
+    def test_permissions_and_validation(self):
+        self.assertEqual(self.client.post("/api/bookings/bulk_cancel/").status_code, 400)
+        self.client.force_authenticate(self.customer)
+        response = self.client.post(
+            "/api/bookings/bulk_confirm/", {"ids": [self.bookings[0].id]}, format="json"
+        )
+        self.assertEqual(response.status_code, 403)
+        response = self.client.post(
+            "/api/bookings/bulk_cancel/", {"ids": [self.elsewhere.id]}, format="json"
+        )
+        self.assertEqual(response.data["results"][0]["outcome"], "updated")
+
+
+class SlotHoldTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user(username="manager", password="x", role="manager")
+        cls.customer = User.objects.create_user(username="customer", password="x")
+        cls.restaurant = create_restaurant(cls.manager, "Hold Bistro", capacity=6)
+        cls.date = date.today() + timedelta(days=1)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def hold(self, party_size=4):
+        return self.client.post(
+            "/api/holds/",
+            {"restaurant": self.restaurant.id, "date": str(self.date), "time": "19:00", "party_size": party_size},
+            format="json",
+        )
+
+    def booked(self):
+        return BookingSlot.objects.get(restaurant=self.restaurant, date=self.date, time=time(19)).booked
+
+    def expire(self, hold_id):
+        SlotHold.objects.filter(pk=hold_id).update(expires_at=timezone.now() - timedelta(seconds=1))
+
+    def test_hold_counts_toward_availability(self):
+        response = self.hold()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.booked(), 4)
+        self.assertFalse(Booking.check_availability(self.restaurant, self.date, time(19), 3))
+        self.assertEqual(self.hold(party_size=3).status_code, 400)
+        self.assertEqual(self.booked(), 4)
+
+    def test_booking_converts_hold(self):
+        hold_id = self.hold(party_size=6).data["id"]
+        response = self.client.post(
+            "/api/bookings/",
+            {"restaurant": self.restaurant.id, "date": str(self.date), "time": "19:00", "party_size": 6, "hold": hold_id},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.booked(), 6)
+        self.assertFalse(SlotHold.objects.exists())
+
+    def test_hold_must_match_and_belong_to_customer(self):
+        hold_id = self.hold().data["id"]
+        data = {"restaurant": self.restaurant.id, "date": str(self.date), "time": "20:00", "party_size": 2, "hold": hold_id}
+        self.assertEqual(self.client.post("/api/bookings/", data, format="json").status_code, 400)
+        self.client.force_authenticate(self.manager)
+        data["time"] = "19:00"
+        self.assertEqual(self.client.post("/api/bookings/", data, format="json").status_code, 400)
+        self.assertEqual(self.client.get(f"/api/holds/{hold_id}/").status_code, 404)
+
+    def test_expired_holds_are_swept(self):
+        first, second = self.hold(party_size=2).data["id"], self.hold(party_size=2).data["id"]
+        self.expire(first)
+        data = {"restaurant": self.restaurant.id, "date": str(self.date), "time": "19:00", "party_size": 2, "hold": first}
+        self.assertEqual(self.client.post("/api/bookings/", data, format="json").status_code, 400)
+        self.assertEqual([hold["id"] for hold in self.client.get("/api/holds/").data], [second])
+
+        # lock the expired range, then re-read, delete and release each
+        # hold, in a savepoint
+        with self.assertNumQueries(6):
+            call_command("expire_slot_holds", stdout=StringIO())
+        self.assertEqual(self.booked(), 2)
+        # nothing left to sweep is one empty index range read
+        with self.assertNumQueries(3):
+            call_command("expire_slot_holds", stdout=StringIO())
+
+    def test_release_and_rebuild(self):
+        hold_id = self.hold().data["id"]
+        Booking.objects.create(
+            customer=self.customer, restaurant=self.restaurant, date=self.date, time=time(19), party_size=1
+        )
+        BookingSlot.objects.update(booked=0)
+        call_command("rebuild_booking_slots", stdout=StringIO())
+        self.assertEqual(self.booked(), 5)
+        self.assertEqual(self.client.delete(f"/api/holds/{hold_id}/").status_code, 204)
+        self.assertEqual(self.booked(), 1)
+        # a second release finds nothing to give back
+        self.assertFalse(SlotHold(pk=hold_id, restaurant=self.restaurant, date=self.date, time=time(19), party_size=4).release())
+        self.assertEqual(self.booked(), 1)
+
+    def test_deletes_by_any_route_release_seats(self):
+        other = User.objects.create_user(username="other", password="x")
+        SlotHold.place(other, self.restaurant, self.date, time(19), 2)
+        self.hold(party_size=3)
+        self.assertEqual(self.booked(), 5)
+        # a cascade from the customer
+        other.delete()
+        self.assertEqual(self.booked(), 3)
+        # a queryset delete, twice
+        SlotHold.objects.filter(customer=self.customer).delete()
+        SlotHold.objects.filter(customer=self.customer).delete()
+        self.assertEqual(self.booked(), 0)
+
+    def test_deleting_restaurant_with_live_hold(self):
+        other = create_restaurant(self.manager, "Other Bistro", capacity=6)
+        hold = SlotHold.place(self.customer, self.restaurant, self.date, time(19), 4)
+        SlotHold.place(self.customer, other, self.date, time(19), 2)
+        self.restaurant.delete()
+        self.assertFalse(SlotHold.objects.filter(pk=hold.pk).exists())
+        self.assertFalse(BookingSlot.objects.filter(restaurant_id=hold.restaurant_id).exists())
+        self.assertEqual(BookingSlot.objects.get(restaurant=other).booked, 2)
+
+    def test_party_size_limit_matches_bookings(self):
+        with mock.patch.object(Booking, "MAX_PARTY_SIZE", 3):
+            response = self.hold(party_size=4)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("between 1 and 3", str(response.data))
+            booking = Booking(customer=self.customer, restaurant=self.restaurant, date=self.date, time=time(19), party_size=4)
+            with self.assertRaisesMessage(ValidationError, "cannot exceed 3"):
+                booking.clean()
+            self.assertEqual(self.hold(party_size=3).status_code, 201)
+
+    def test_hold_limit(self):
+        with self.settings(BOOKING_MAX_HOLDS=1):
+            self.assertEqual(self.hold(party_size=1).status_code, 201)
+            self.assertEqual(self.hold(party_size=1).status_code, 400)
+
+
+class FailingSmsSender:
+    def send(self, to, body):
+        raise ConnectionError("provider unavailable")
+
+
+@override_settings(
+    EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+    BOOKING_SMS_SENDER="bookings.notifications.FakeSmsSender",
+)
+class NotificationOutboxTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        manager = User.objects.create_user(username="manager", password="x", role="manager")
+        cls.customer = User.objects.create_user(username="customer", password="x")
+        cls.restaurant = create_restaurant(manager, "Outbox Bistro")
+
+    def setUp(self):
+        FakeSmsSender.outbox.clear()
+        self.addCleanup(FakeSmsSender.outbox.clear)
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def book(self):
+        response = self.client.post(
+            "/api/bookings/",
+            {
+                "restaurant": self.restaurant.id, "date": str(date.today() + timedelta(days=1)),
+                "time": "19:00", "party_size": 2, "email": "guest@example.com", "phone_number": "14085550100",
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+
+    def send(self, *args):
+        call_command("send_notifications", *args, stdout=StringIO())
+
+    def test_booking_queues_and_delivers(self):
+        self.book()
+        self.assertEqual(Notification.objects.filter(status="pending").count(), 2)
+        self.assertEqual(mail.outbox, [])
+        self.send()
+        self.assertEqual([message.to for message in mail.outbox], [["guest@example.com"]])
+        self.assertEqual(FakeSmsSender.outbox[0]["to"], "+14085550100")
+        self.assertEqual(
+            list(Notification.objects.values_list("status", "attempts")), [("sent", 1), ("sent", 1)]
+        )
+        # Nothing is sent twice
+        self.send()
+        self.assertEqual((len(mail.outbox), len(FakeSmsSender.outbox)), (1, 1))
+
+    def test_failures_back_off_then_fail(self):
+        self.book()
+        with self.settings(BOOKING_SMS_SENDER="bookings.tests.FailingSmsSender"):
+            self.send("--max-attempts=2")
+            sms = Notification.objects.get(channel="sms")
+            self.assertEqual((sms.status, sms.attempts), ("pending", 1))
+            self.assertGreater(sms.next_attempt_at, timezone.now())
+            self.assertIn("provider unavailable", sms.last_error)
+
+            Notification.objects.filter(pk=sms.pk).update(next_attempt_at=timezone.now())
+            self.send("--max-attempts=2")
+            sms.refresh_from_db()
+            self.assertEqual((sms.status, sms.attempts), ("failed", 2))
+
+    def test_expired_lease_is_taken_over(self):
+        self.book()
+        email, sms = Notification.objects.order_by("channel")
+        # Claimed by a worker that died, and by one still sending
+        Notification.objects.filter(pk=email.pk).update(
+            status="sending", next_attempt_at=timezone.now() - timedelta(seconds=1)
+        )
+        Notification.objects.filter(pk=sms.pk).update(
+            status="sending", next_attempt_at=timezone.now() + timedelta(minutes=5)
+        )
+        self.send()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(FakeSmsSender.outbox, [])
+        self.assertEqual(Notification.objects.get(pk=sms.pk).status, "sending")
+
+
+class NotificationDeliveryTests(TestCase):
+    """Delivery through the fake SMTP and Twilio servers in bookings.fakes."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.smtp = FakeSmtpServer(("127.0.0.1", 0))
+        cls.twilio = FakeTwilioServer(("127.0.0.1", 0))
+        for server in (cls.smtp, cls.twilio):
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            cls.addClassCleanup(server.server_close)
+            cls.addClassCleanup(server.shutdown)
+
+    def setUp(self):
+        for server in (self.smtp, self.twilio):
+            server.messages = server.connections = 0
+        # A client per test, so each one opens its own connections
+        notifications._twilio_client = None
+        self.addCleanup(setattr, notifications, "_twilio_client", None)
+        overrides = self.settings(
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST="127.0.0.1",
+            EMAIL_PORT=self.smtp.server_address[1],
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER="",
+            EMAIL_HOST_PASSWORD="",
+            BOOKING_SMS_SENDER="bookings.notifications.TwilioSmsSender",
+            TWILIO_ACCOUNT_SID="AC" + "0" * 32,
+            TWILIO_AUTH_TOKEN="token",
+            TWILIO_PHONE_NUMBER="+14085550000",
+            TWILIO_API_BASE_URL="http://127.0.0.1:{}".format(self.twilio.server_address[1]),
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def queue(self, channel, *recipients):
+        return [
+            Notification.objects.create(channel=channel, recipient=recipient, subject="Booked", body="See you soon")
+            for recipient in recipients
+        ]
+
+    def send(self):
+        call_command("send_notifications", "--max-attempts=1", stdout=StringIO())
+
+    def statuses(self):
+        return list(Notification.objects.order_by("pk").values_list("status", flat=True))
+
+    def test_emails_share_one_connection(self):
+        self.queue("email", *(f"guest{i}@example.com" for i in range(5)))
+        self.send()
+        self.assertEqual((self.smtp.messages, self.smtp.connections), (5, 1))
+        self.assertEqual(self.statuses(), ["sent"] * 5)
+
+    def test_failed_email_fails_alone(self):
+        self.queue("email", "first@example.com", "bad\naddress@example.com", "last@example.com")
+        self.send()
+        self.assertEqual((self.smtp.messages, self.smtp.connections), (2, 1))
+        self.assertEqual(self.statuses(), ["sent", "failed", "sent"])
+        self.assertIn("newlines", Notification.objects.get(status="failed").last_error)
+
+    def test_unreachable_smtp_fails_the_batch(self):
+        self.queue("email", "first@example.com", "last@example.com")
+        self.queue("sms", "+14085550100")
+        with socket.socket() as closed:
+            closed.bind(("127.0.0.1", 0))
+            port = closed.getsockname()[1]
+        with self.settings(EMAIL_PORT=port):
+            self.send()
+        self.assertEqual(self.statuses(), ["failed", "failed", "sent"])
+        self.assertEqual(self.twilio.messages, 1)
+
+    @skipIf(notifications.TwilioClient is None, "Twilio is not installed")
+    def test_sms_through_pooled_client(self):
+        self.queue("sms", "+14085550100", "+14085550101", "+14085550102")
+        self.send()
+        # Sent to TWILIO_API_BASE_URL, all over one keep-alive connection
+        self.assertEqual((self.twilio.messages, self.twilio.connections), (3, 1))
+        self.assertEqual(self.statuses(), ["sent"] * 3)
+        self.send()
+        self.assertEqual(self.twilio.messages, 3)
@@ -1,10 +1,11 @@
 # backend/bookings/urls.py
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import BookingViewSet
+from .views import BookingViewSet, SlotHoldViewSet
 
 router = DefaultRouter()
 router.register(r"bookings", BookingViewSet, basename="booking")
+router.register(r"holds", SlotHoldViewSet, basename="slothold")
 
 urlpatterns = [
     path("", include(router.urls)),
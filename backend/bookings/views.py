@@ -1,38 +1,47 @@
 # backend/bookings/views.py
-from rest_framework import viewsets, status
+from rest_framework import mixins, viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.exceptions import PermissionDenied
-from .models import Booking
-from .serializers import BookingSerializer
+from .models import Booking, SlotHold, SlotUnavailable
+from .serializers import BookingSerializer, SlotHoldSerializer
 from .filters import BookingFilter
+from .availability import MAX_GRID_DAYS, availability_grid
+from .notifications import enqueue_booking_confirmation
+from restaurants.models import Restaurant
+from booktable.conditional import ConditionalGetMixin
+from booktable.export import ExportMixin
+from booktable.pagination import KeysetPagination
+from django.db import transaction
 from django.utils import timezone
-from django.core.mail import send_mail
-from django.conf import settings
+from django.utils.dateparse import parse_date
 import logging
 
 logger = logging.getLogger(__name__)
 
-try:
-    from twilio.rest import Client as TwilioClient
-    from twilio.base.exceptions import TwilioRestException
-except ImportError:
-    TwilioClient = None
-    logger.warning("Twilio package not installed. SMS notifications will be disabled.")
+# Most bookings one bulk_* action may change
+MAX_BULK_BOOKINGS = 500
 
 
-class BookingViewSet(viewsets.ModelViewSet):
+class BookingViewSet(ConditionalGetMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = Booking.objects.all()
     serializer_class = BookingSerializer
     permission_classes = [IsAuthenticated]
     filterset_class = BookingFilter
+    pagination_class = KeysetPagination
     search_fields = ["restaurant__name", "customer__username"]
     ordering_fields = ["date", "time", "party_size", "status", "created_at"]
     ordering = ["-date", "-time"]
+    export_fields = [
+        "id", "restaurant", "restaurant__name", "customer", "customer__username",
+        "date", "time", "party_size", "status", "email", "phone_number",
+        "created_at", "updated_at",
+    ]
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        # Serializer validation and permission checks read the restaurant
+        queryset = super().get_queryset().select_related("restaurant")
         if self.request.user.role == "admin":
             return queryset
         elif self.request.user.role == "manager":
@@ -46,69 +55,25 @@ class BookingViewSet(viewsets.ModelViewSet):
         return context
 
     def perform_create(self, serializer):
-        booking = serializer.save(customer=self.request.user)
-        logger.info("perform_create called for booking")
-        print("perform_create called for booking")
-        logger.info(f"Booking phone number: {booking.phone_number}")
-        print(f"Booking phone number: {booking.phone_number}")
-        logger.info(f"TwilioClient: {TwilioClient}")
-        print(f"TwilioClient: {TwilioClient}")
-
-        # Send confirmation email if email is provided
-        if booking.email:
-            try:
-                send_mail(
-                    subject="Your Table Booking Confirmation",
-                    message=f"Thank you for booking at {booking.restaurant.name} on {booking.date} at {booking.time}.",
-                    from_email=getattr(
-                        settings, "DEFAULT_FROM_EMAIL", "noreply@example.com"
-                    ),
-                    recipient_list=[booking.email],
-                    fail_silently=True,
-                )
-            except Exception as e:
-                logger.error(f"Failed to send email notification: {str(e)}")
-                print(f"Failed to send email notification: {str(e)}")
-
-        # Send SMS if phone_number is provided and Twilio is available
-        if booking.phone_number and TwilioClient:
-            logger.info("Attempting to send SMS via Twilio...")
-            print("Attempting to send SMS via Twilio...")
-            try:
-                # Ensure phone number is in E.164 format
-                phone_number = booking.phone_number
-                if not phone_number.startswith("+"):
-                    phone_number = "+" + phone_number
-
-                twilio_client = TwilioClient(
-                    settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN
-                )
-                logger.info(f"Twilio client created. Sending SMS to {phone_number}")
-                print(f"Twilio client created. Sending SMS to {phone_number}")
-                message = twilio_client.messages.create(
-                    body=f"Your booking at {booking.restaurant.name} on {booking.date} at {booking.time} is confirmed.",
-                    from_=settings.TWILIO_PHONE_NUMBER,
-                    to=phone_number,
-                )
-                logger.info(f"SMS sent successfully. SID: {message.sid}")
-                print(f"SMS sent successfully. SID: {message.sid}")
-            except TwilioRestException as e:
-                logger.error(f"Twilio error: {str(e)}")
-                print(f"Twilio error: {str(e)}")
-            except Exception as e:
-                logger.error(f"Failed to send SMS notification: {str(e)}")
-                print(f"Failed to send SMS notification: {str(e)}")
+        # Notifications go to the outbox in the booking's transaction and
+        # are delivered by the send_notifications command
+        with transaction.atomic():
+            booking = serializer.save(customer=self.request.user)
+            queued = enqueue_booking_confirmation(booking)
+        logger.info(
+            "Booking %s created, %d notifications queued", booking.pk, len(queued)
+        )
 
     def perform_update(self, serializer):
         if (
-            self.request.user != serializer.instance.customer
+            self.request.user.pk != serializer.instance.customer_id
             and self.request.user.role not in ["admin", "manager"]
         ):
             raise PermissionDenied("You do not have permission to modify this booking.")
         serializer.save()
 
     def perform_destroy(self, instance):
-        if self.request.user != instance.customer and self.request.user.role not in [
+        if self.request.user.pk != instance.customer_id and self.request.user.role not in [
             "admin",
             "manager",
         ]:
@@ -130,9 +95,9 @@ class BookingViewSet(viewsets.ModelViewSet):
 
         try:
             party_size = int(party_size)
-            if party_size < 1 or party_size > 20:
+            if party_size < 1 or party_size > Booking.MAX_PARTY_SIZE:
                 return Response(
-                    {"error": "Party size must be between 1 and 20"},
+                    {"error": f"Party size must be between 1 and {Booking.MAX_PARTY_SIZE}"},
                     status=status.HTTP_400_BAD_REQUEST,
                 )
         except ValueError:
@@ -155,6 +120,59 @@ class BookingViewSet(viewsets.ModelViewSet):
 
         return Response({"available": is_available})
 
+    @action(detail=False, methods=["get"])
+    def availability_grid(self, request):
+        restaurant_id = request.query_params.get("restaurant")
+        start = request.query_params.get("start")
+        end = request.query_params.get("end", start)
+        party_size = request.query_params.get("party_size")
+
+        if not all([restaurant_id, start]):
+            return Response(
+                {"error": "Missing required parameters"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            start = parse_date(start)
+            end = parse_date(end)
+        except ValueError:
+            start = end = None
+        if start is None or end is None:
+            return Response(
+                {"error": "Dates must be in YYYY-MM-DD format"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if end < start or (end - start).days >= MAX_GRID_DAYS:
+            return Response(
+                {
+                    "error": f"end must be on or after start, spanning at most {MAX_GRID_DAYS} days"
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if party_size is not None:
+            try:
+                party_size = int(party_size)
+                if party_size < 1 or party_size > Booking.MAX_PARTY_SIZE:
+                    return Response(
+                        {"error": f"Party size must be between 1 and {Booking.MAX_PARTY_SIZE}"},
+                        status=status.HTTP_400_BAD_REQUEST,
+                    )
+            except ValueError:
+                return Response(
+                    {"error": "Invalid party size"}, status=status.HTTP_400_BAD_REQUEST
+                )
+
+        try:
+            restaurant = Restaurant.objects.get(id=restaurant_id)
+        except (Restaurant.DoesNotExist, ValueError):
+            return Response(
+                {"error": "Restaurant not found"}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        return Response(availability_grid(restaurant, start, end, party_size))
+
     @action(detail=True, methods=["post"])
     def confirm(self, request, pk=None):
         booking = self.get_object()
@@ -165,7 +183,12 @@ class BookingViewSet(viewsets.ModelViewSet):
             )
 
         booking.status = "confirmed"
-        booking.save()
+        try:
+            booking.save()
+        except SlotUnavailable as e:
+            return Response(
+                {"detail": e.messages[0]}, status=status.HTTP_400_BAD_REQUEST
+            )
         return Response(self.get_serializer(booking).data)
 
     @action(detail=True, methods=["post"])
@@ -173,7 +196,7 @@ class BookingViewSet(viewsets.ModelViewSet):
         booking = self.get_object()
         if (
             request.user.role not in ["admin", "manager"]
-            and request.user != booking.customer
+            and request.user.pk != booking.customer_id
         ):
             return Response(
                 {
@@ -199,45 +222,128 @@ class BookingViewSet(viewsets.ModelViewSet):
         booking.save()
         return Response(self.get_serializer(booking).data)
 
+    @action(detail=True, methods=["post"])
+    def reschedule(self, request, pk=None):
+        booking = self.get_object()
+        if request.user.pk != booking.customer_id and request.user.role not in [
+            "admin",
+            "manager",
+        ]:
+            return Response(
+                {
+                    "detail": "Only the customer, admins, and managers can reschedule bookings."
+                },
+                status=status.HTTP_403_FORBIDDEN,
+            )
 
-@action(detail=True, methods=["post"])
-def reschedule(self, request, pk=None):
-    booking = self.get_object()
-    if request.user != booking.customer and request.user.role not in [
-        "admin",
-        "manager",
-    ]:
-        return Response(
-            {
-                "detail": "Only the customer, admins, and managers can reschedule bookings."
-            },
-            status=status.HTTP_403_FORBIDDEN,
-        )
+        new_date = request.data.get("date")
+        new_time = request.data.get("time")
 
-    new_date = request.data.get("date")
-    new_time = request.data.get("time")
+        if not new_date or not new_time:
+            return Response(
+                {"error": "New date and time must be provided."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-    if not new_date or not new_time:
-        return Response(
-            {"error": "New date and time must be provided."},
-            status=status.HTTP_400_BAD_REQUEST,
+        # The serializer checks availability and moves the booking's seats
+        # to the new slot in one transaction
+        serializer = self.get_serializer(
+            booking, data={"date": new_date, "time": new_time}, partial=True
         )
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        serializer.save()
+        return Response(serializer.data)
+
+    def bulk_transition(self, request, status_to, roles):
+        """
+        Apply a status change to many bookings at once: those listed in
+        an `ids` body field, or else those matching the list filters in
+        the query string. Answers with each booking's outcome.
+        """
+        if request.user.role not in roles:
+            return Response(
+                {"detail": "You do not have permission to change these bookings."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
 
-    # Check availability for the new date and time
-    is_available = self.queryset.model.check_availability(
-        restaurant=booking.restaurant,
-        date=new_date,
-        time=new_time,
-        party_size=booking.party_size,
-    )
-
-    if not is_available:
-        return Response(
-            {"error": "The new date and time are not available."},
-            status=status.HTTP_400_BAD_REQUEST,
+        queryset = self.get_queryset()
+        ids = request.data.get("ids")
+        if ids is not None:
+            if not isinstance(ids, list) or not all(
+                isinstance(pk, int) and not isinstance(pk, bool) for pk in ids
+            ):
+                return Response(
+                    {"error": "ids must be a list of booking ids"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        else:
+            params = set(request.query_params) & set(self.filterset_class.base_filters)
+            if not params:
+                return Response(
+                    {"error": "Provide ids or at least one filter"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            ids = list(
+                self.filter_queryset(queryset).values_list("pk", flat=True)[:MAX_BULK_BOOKINGS + 1]
+            )
+        if len(ids) > MAX_BULK_BOOKINGS:
+            return Response(
+                {"error": f"At most {MAX_BULK_BOOKINGS} bookings can be changed at once"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        previous = Booking.bulk_transition(queryset.filter(pk__in=ids), status_to)
+        allowed = Booking.TRANSITIONS[status_to]
+        results = []
+        for pk in dict.fromkeys(ids):
+            if pk not in previous:
+                results.append({"id": pk, "outcome": "not_found"})
+            elif previous[pk] in allowed:
+                results.append({"id": pk, "outcome": "updated", "status": status_to})
+            else:
+                results.append({"id": pk, "outcome": "skipped", "status": previous[pk]})
+        updated = sum(result["outcome"] == "updated" for result in results)
+        logger.info(
+            "Bulk %s by user %s: %d of %d bookings", status_to, request.user.pk, updated, len(results)
         )
+        return Response({"status": status_to, "updated": updated, "results": results})
 
-    booking.date = new_date
-    booking.time = new_time
-    booking.save()
-    return Response(self.get_serializer(booking).data)
+    @action(detail=False, methods=["post"])
+    def bulk_confirm(self, request):
+        return self.bulk_transition(request, "confirmed", ["admin", "manager"])
+
+    @action(detail=False, methods=["post"])
+    def bulk_cancel(self, request):
+        return self.bulk_transition(request, "cancelled", ["admin", "manager", "customer"])
+
+    @action(detail=False, methods=["post"])
+    def bulk_complete(self, request):
+        return self.bulk_transition(request, "completed", ["admin", "manager"])
+
+
+class SlotHoldViewSet(
+    mixins.CreateModelMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    Seats set aside while a booking is filled in. POST one, then pass its
+    id as `hold` when creating the booking; DELETE gives the seats back.
+    """
+
+    serializer_class = SlotHoldSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = None
+
+    def get_queryset(self):
+        # Expired holds are gone as far as their owner is concerned, even
+        # before a sweep deletes them
+        return SlotHold.objects.filter(
+            customer=self.request.user, expires_at__gt=timezone.now()
+        ).order_by("expires_at")
+
+    def perform_destroy(self, instance):
+        instance.release()
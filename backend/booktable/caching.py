@@ -0,0 +1,8 @@
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def cache_is_shared(alias='default'):
+    """Whether what one process writes to the cache is seen by the others."""
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
@@ -0,0 +1,101 @@
+"""
+Conditional GET support for DRF views.
+
+ETags are built from what determines a response rather than from its
+body: the request path and query, each row's primary key and change
+timestamps, and the pagination envelope (count and links). A matching
+If-None-Match or If-Modified-Since therefore gets its 304 before any
+serialization runs.
+
+Only single objects get a Last-Modified. The newest change time on a
+list page does not move when a row leaves it, e.g. when one is deleted,
+so lists are validated by ETag alone; theirs covers every row's id.
+"""
+import hashlib
+import json
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
+
+
+class ConditionalGetMixin:
+    """
+    Adds strong ETags to list and retrieve, and Last-Modified to retrieve.
+
+    conditional_fields are the change timestamps (or version columns) of
+    each object, and may follow relations loaded alongside it, e.g.
+    restaurant__updated_at for a serializer that shows the restaurant's
+    name.
+    """
+    conditional_fields = ['updated_at']
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_list(request, self.filter_queryset(self.get_queryset()))
+
+    def conditional_list(self, request, queryset):
+        page = self.paginate_queryset(queryset)
+        objects = page if page is not None else list(queryset)
+        envelope = None
+        if page is not None:
+            # Counts and links, without the results
+            envelope = self.paginator.get_paginated_response([]).data
+
+        etag = self.get_etag(request, objects, envelope)
+        not_modified = self.not_modified(request, etag, None)
+        if not_modified is not None:
+            return not_modified
+
+        serializer = self.get_serializer(objects, many=True)
+        if page is not None:
+            response = self.get_paginated_response(serializer.data)
+        else:
+            response = Response(serializer.data)
+        return set_validators(response, etag, None)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        etag = self.get_etag(request, [instance])
+        last_modified = self.get_last_modified(instance)
+        not_modified = self.not_modified(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+        serializer = self.get_serializer(instance)
+        return set_validators(Response(serializer.data), etag, last_modified)
+
+    def get_etag(self, request, objects, extra=None):
+        """Strong ETag for a response showing objects."""
+        stamps = [
+            [obj.pk, *(self.get_stamp(obj, field) for field in self.conditional_fields)]
+            for obj in objects
+        ]
+        payload = json.dumps(
+            [self.get_serializer_class().__qualname__, request.get_full_path(), stamps, extra],
+            default=str,
+        )
+        return '"{}"'.format(hashlib.sha256(payload.encode()).hexdigest()[:32])
+
+    def get_last_modified(self, obj):
+        """Latest change time among obj's conditional_fields, or None."""
+        stamps = [self.get_stamp(obj, field) for field in self.conditional_fields]
+        return max((stamp for stamp in stamps if hasattr(stamp, 'timestamp')), default=None)
+
+    def get_stamp(self, obj, field):
+        value = obj
+        for attr in field.split('__'):
+            value = getattr(value, attr, None)
+        return value
+
+    def not_modified(self, request, etag, last_modified):
+        """A 304 response if the request's preconditions match, else None."""
+        timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is not None:
+            set_validators(response, etag, last_modified)
+        return response
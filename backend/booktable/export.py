@@ -0,0 +1,103 @@
+"""
+Streaming CSV and NDJSON exports for viewsets.
+
+Rows are read with QuerySet.iterator() and written out as they arrive,
+so a worker holds one chunk of rows at a time however large the export
+is.
+"""
+import csv
+import json
+from datetime import datetime
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.decorators import action
+from rest_framework.renderers import BaseRenderer
+
+# Rows fetched per database round trip, and per chunk sent to the client
+CHUNK_SIZE = 2000
+# Spreadsheets run cells starting with these as formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class ExportRenderer(BaseRenderer):
+    """
+    Lets ?format= and Accept pick an export format. Exports stream past
+    the renderer; only error responses are rendered, as JSON.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, cls=DjangoJSONEncoder).encode()
+
+
+class CSVRenderer(ExportRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONRenderer(ExportRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class Echo:
+    """File-like object for csv.writer that hands back each line."""
+
+    def write(self, value):
+        return value
+
+
+def csv_cell(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_chunks(headers, rows):
+    writer = csv.writer(Echo())
+    lines = [writer.writerow(headers)]
+    for row in rows:
+        lines.append(writer.writerow([csv_cell(value) for value in row]))
+        if len(lines) >= CHUNK_SIZE:
+            yield ''.join(lines)
+            lines = []
+    yield ''.join(lines)
+
+
+def ndjson_chunks(headers, rows):
+    encoder = DjangoJSONEncoder()
+    lines = []
+    for row in rows:
+        lines.append(encoder.encode(dict(zip(headers, row))) + '\n')
+        if len(lines) >= CHUNK_SIZE:
+            yield ''.join(lines)
+            lines = []
+    yield ''.join(lines)
+
+
+class ExportMixin:
+    """
+    Adds GET <list>/export/ to a viewset: its filtered queryset as CSV,
+    or NDJSON with ?format=ndjson or Accept: application/x-ndjson.
+    Columns are export_fields, which may follow relations, e.g.
+    restaurant__name (exported as restaurant_name).
+    """
+    export_fields = []
+
+    @action(detail=False, methods=['get'], renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request):
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = queryset.values_list(*self.export_fields).iterator(chunk_size=CHUNK_SIZE)
+        headers = [field.replace('__', '_') for field in self.export_fields]
+
+        renderer = request.accepted_renderer
+        chunks = ndjson_chunks if renderer.format == 'ndjson' else csv_chunks
+        response = StreamingHttpResponse(
+            chunks(headers, rows), content_type=f'{renderer.media_type}; charset=utf-8'
+        )
+        filename = f'{self.basename}-{timezone.localdate():%Y%m%d}.{renderer.format}'
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
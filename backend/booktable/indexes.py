@@ -0,0 +1,39 @@
+"""
+Migration operations that build indexes without locking out writes.
+
+django.contrib.postgres has AddIndexConcurrently, but importing it needs
+a Postgres driver and it refuses to run on other databases. These work
+everywhere: CREATE/DROP INDEX CONCURRENTLY on Postgres, a plain index
+elsewhere. Migrations using them must set atomic = False.
+"""
+from django.db import migrations
+
+
+class ConcurrentIndexMixin:
+    def _check_not_atomic(self, schema_editor):
+        if schema_editor.connection.in_atomic_block:
+            raise ValueError(
+                f'{self.__class__.__name__} cannot run inside a transaction; '
+                'set atomic = False on the migration.'
+            )
+
+
+class AddIndexConcurrently(ConcurrentIndexMixin, migrations.AddIndex):
+    def describe(self):
+        return f'Concurrently create index {self.index.name} on model {self.model_name}'
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        self._check_not_atomic(schema_editor)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.execute(self.index.create_sql(model, schema_editor, concurrently=True))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        self._check_not_atomic(schema_editor)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.execute(self.index.remove_sql(model, schema_editor, concurrently=True))
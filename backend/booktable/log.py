@@ -0,0 +1,128 @@
+"""
+Logging pieces used by the LOGGING setting.
+
+Records are handed to a background thread through an in-memory queue,
+so request threads never wait on file writes. Messages are built on the
+logging thread, while the objects they mention are still as logged and
+may touch the database; the listener thread only formats and writes.
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+RESERVED_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any `extra` fields."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "process": record.process,
+            "thread": record.thread,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of the records below WARNING from chatty
+    loggers. `rates` maps a logger name to the fraction kept for it and
+    its children; the most specific name wins.
+    """
+
+    def __init__(self, rates=None, default=1.0):
+        super().__init__()
+        self.rates = rates or {}
+        self.default = default
+
+    def rate_for(self, name):
+        while name:
+            if name in self.rates:
+                return self.rates[name]
+            name = name.rpartition(".")[0]
+        return self.default
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        # Decide once per record so every handler keeps the same sample
+        if not hasattr(record, "_sampled"):
+            rate = self.rate_for(record.name)
+            record._sampled = rate >= 1 or random.random() < rate
+        return record._sampled
+
+
+class QueuedRotatingFileHandler(QueueHandler):
+    """
+    Size-rotated log file written by a background listener thread.
+
+    Takes the same arguments as RotatingFileHandler. The formatter set
+    through LOGGING is applied on the listener thread.
+
+    Rotation is only safe with one process writing the file. Under a
+    server with several worker processes, pass per_process=True to give
+    each process its own file, named with its pid (debug.1234.log).
+    """
+
+    def __init__(self, filename, maxBytes=0, backupCount=0, encoding=None, per_process=False):
+        super().__init__(queue.SimpleQueue())
+        if per_process:
+            root, ext = os.path.splitext(filename)
+            filename = f"{root}.{os.getpid()}{ext}"
+        self.target = RotatingFileHandler(
+            filename,
+            maxBytes=maxBytes,
+            backupCount=backupCount,
+            encoding=encoding,
+            delay=True,
+        )
+        self.listener = QueueListener(self.queue, self.target)
+        self.listener.start()
+        atexit.register(self.close)
+
+    def setFormatter(self, fmt):
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Like the base class, merge args into the message here: by the
+        # time the listener formats it, the args may have changed, and
+        # their __str__ (e.g. Booking's) may query the database off the
+        # request's thread and connection. `extra` values are frozen for
+        # the same reason, to what JsonFormatter would write for them.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        for key, value in vars(record).items():
+            if key not in RESERVED_ATTRS and not key.startswith("_") and not isinstance(
+                value, (str, int, float, bool, type(None))
+            ):
+                setattr(record, key, json.loads(json.dumps(value, default=str)))
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def close(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
+            self.target.close()
+        super().close()
@@ -0,0 +1,202 @@
+"""
+Keyset (cursor) pagination.
+
+PageNumberPagination runs a COUNT(*) and an OFFSET that grows with the
+page number. KeysetPagination instead asks for the rows that sort after
+the last row of the previous page, which costs the same on page 1000 as
+on page 1 when an index matches the ordering, and only counts when the
+client asks for a total.
+"""
+import base64
+import binascii
+import json
+from datetime import date, datetime, time
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def estimate_count(queryset):
+    """
+    The planner's row estimate for queryset on Postgres, which needs no
+    scan; an exact COUNT(*) elsewhere.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().values('pk').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class KeysetPagination(BasePagination):
+    """
+    Pages through the queryset's ordering (including ?ordering=), with the
+    primary key appended so every row has a unique position.
+
+    ?cursor= is opaque to clients: follow the next/previous links.
+    ?total=exact adds a COUNT(*) as `count`, ?total=approx the planner's
+    estimate on Postgres. Ordering fields must not be nullable.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    total_query_param = 'total'
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position, self.reverse = self.decode_cursor(request)
+        self.total = self.get_total(queryset, request)
+
+        self.ordering = self.get_ordering(queryset)
+        ordering = self.ordering
+        if self.reverse:
+            # Walk backwards from the cursor, then put the page back in order
+            ordering = [self.flip(field) for field in ordering]
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            if len(position) != len(ordering):
+                # The cursor came from a page with another ?ordering=
+                raise NotFound('Invalid cursor')
+            try:
+                queryset = queryset.filter(self.after(ordering, position))
+            except (ValidationError, ValueError, TypeError):
+                raise NotFound('Invalid cursor')
+
+        # One extra row tells whether there is another page
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        response = {}
+        if self.total is not None:
+            response['count'] = self.total
+        response['next'] = self.get_next_link()
+        response['previous'] = self.get_previous_link()
+        response['results'] = data
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'count': {'type': 'integer', 'description': 'Only with ?total=exact or ?total=approx'},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(page_size, 1), self.max_page_size)
+
+    def get_total(self, queryset, request):
+        total = request.query_params.get(self.total_query_param)
+        if total == 'exact':
+            return queryset.count()
+        if total == 'approx':
+            return estimate_count(queryset)
+        return None
+
+    def get_ordering(self, queryset):
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+        if any(not isinstance(field, str) for field in ordering):
+            raise TypeError('KeysetPagination only supports ordering by field names')
+        names = {field.lstrip('-') for field in ordering}
+        if not names & {'pk', queryset.model._meta.pk.name}:
+            descending = ordering[0].startswith('-') if ordering else True
+            ordering.append('-pk' if descending else 'pk')
+        return ordering
+
+    @staticmethod
+    def flip(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def after(ordering, position):
+        """
+        Rows sorting after `position` under `ordering`:
+        (a > x) OR (a = x AND b > y) OR ..., with < for descending fields.
+        The leading a >= x lets the database seek on an index over a.
+        """
+        clauses = Q()
+        for index, field in enumerate(ordering):
+            name = field.lstrip('-')
+            op = 'lt' if field.startswith('-') else 'gt'
+            equal = {
+                earlier.lstrip('-'): value
+                for earlier, value in zip(ordering[:index], position)
+            }
+            clauses |= Q(**equal, **{f'{name}__{op}': position[index]})
+        first = ordering[0]
+        leading = Q(**{f'{first.lstrip("-")}__{"lte" if first.startswith("-") else "gte"}': position[0]})
+        return leading & clauses
+
+    def position_of(self, obj):
+        position = []
+        for field in self.ordering:
+            value = obj
+            for attr in field.lstrip('-').split('__'):
+                value = getattr(value, attr)
+            position.append(value)
+        return position
+
+    def encode_cursor(self, position, reverse):
+        values = [
+            value.isoformat() if isinstance(value, (date, datetime, time)) else
+            str(value) if isinstance(value, Decimal) else value
+            for value in position
+        ]
+        payload = json.dumps({'p': values, 'r': reverse}, separators=(',', ':'))
+        cursor = base64.urlsafe_b64encode(payload.encode()).decode()
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            position, reverse = payload['p'], bool(payload['r'])
+        except (binascii.Error, ValueError, KeyError, TypeError):
+            raise NotFound('Invalid cursor')
+        if not isinstance(position, list) or not position:
+            raise NotFound('Invalid cursor')
+        return position, reverse
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.position_of(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.position_of(self.page[0]), reverse=True)
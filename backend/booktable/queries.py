@@ -0,0 +1,123 @@
+"""
+Per-request database query instrumentation.
+
+QueryInstrumentationMiddleware wraps every connection with an execute
+wrapper, so it works with DEBUG off, and reports each request's query
+count, DB time and repeated statements in X-DB-* response headers.
+Statements slower than SLOW_QUERY_MS go to the booktable.slow_queries
+logger, and a rolling window of requests backs the summary endpoint.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import ExitStack
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger("booktable.slow_queries")
+
+# A ^ opening a joined route segment, or the $ ending the route
+ANCHORS = re.compile(r"(?:^|(?<=/))\^|\$$")
+
+
+class QueryRecorder:
+    def __init__(self, slow_query_ms):
+        self.slow_query_ms = slow_query_ms
+        self.count = 0
+        self.duration = 0.0
+        self.statements = Counter()
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.count += 1
+            self.duration += elapsed
+            # Parameters are kept apart from the SQL, so identical
+            # statements here are the same query run with other values
+            self.statements[sql] += 1
+            if elapsed >= self.slow_query_ms:
+                self.slow.append((elapsed, sql))
+
+    @property
+    def duplicates(self):
+        return {sql: count for sql, count in self.statements.items() if count > 1}
+
+
+class QueryStats:
+    """Rolling window of per-request query numbers, grouped by route."""
+
+    def __init__(self, size=1000):
+        self.requests = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, route, recorder):
+        with self._lock:
+            self.requests.append(
+                (route, recorder.count, recorder.duration, sum(recorder.duplicates.values()))
+            )
+
+    def summary(self):
+        with self._lock:
+            requests = list(self.requests)
+        routes = {}
+        for route, count, duration, duplicates in requests:
+            routes.setdefault(route, []).append((count, duration, duplicates))
+
+        summary = []
+        for route, samples in routes.items():
+            counts = [sample[0] for sample in samples]
+            durations = [sample[1] for sample in samples]
+            summary.append({
+                "route": route,
+                "requests": len(samples),
+                "avg_queries": round(sum(counts) / len(samples), 1),
+                "max_queries": max(counts),
+                "avg_db_ms": round(sum(durations) / len(samples), 2),
+                "max_db_ms": round(max(durations), 2),
+                "requests_with_duplicates": sum(1 for sample in samples if sample[2]),
+            })
+        summary.sort(key=lambda row: row["avg_db_ms"] * row["requests"], reverse=True)
+        return {"window": len(requests), "routes": summary}
+
+
+stats = QueryStats()
+
+
+class QueryInstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder(settings.SLOW_QUERY_MS)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        duplicates = recorder.duplicates
+        response["X-DB-Query-Count"] = str(recorder.count)
+        response["X-DB-Time-Ms"] = f"{recorder.duration:.2f}"
+        response["X-DB-Duplicate-Queries"] = str(sum(duplicates.values()))
+
+        match = getattr(request, "resolver_match", None)
+        if match:
+            # Router patterns are regexes; drop their anchors, but not the
+            # carets of character classes such as [^/.]
+            route = f"{request.method} /{ANCHORS.sub('', match.route)}"
+        else:
+            route = f"{request.method} {request.path}"
+        stats.record(route, recorder)
+
+        for elapsed, sql in recorder.slow:
+            slow_query_logger.warning("Slow query (%.1f ms) on %s: %s", elapsed, route, sql)
+        for sql, count in duplicates.items():
+            if count >= settings.N_PLUS_ONE_THRESHOLD:
+                logger.warning("Possible N+1 on %s: %d x %s", route, count, sql)
+        return response
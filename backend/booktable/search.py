@@ -0,0 +1,297 @@
+"""
+Text indexes: full-text search behind DRF's ?search= parameter, and
+trigram indexes behind the icontains filters.
+
+On Postgres each full-text table gets a stored, generated `search_vector`
+tsvector column with a GIN index, and each substring-filtered column a
+pg_trgm GIN index. On SQLite both are FTS5 shadow tables kept in sync by
+triggers, tokenized into words or trigrams. They are installed by
+migrations (and re-checked after every migrate on SQLite, since table
+rebuilds there drop triggers). Other backends fall back to plain
+icontains lookups.
+"""
+import re
+import django_filters
+from django.db import connections
+from django.db.models.expressions import RawSQL
+from django_filters.constants import EMPTY_VALUES
+from rest_framework import filters
+
+# Relative weight of Postgres weight classes when ranking with SQLite's bm25
+BM25_WEIGHTS = {'A': 10.0, 'B': 4.0, 'C': 2.0, 'D': 1.0}
+
+
+def create_fts5_table(connection, table, fts_table, columns, tokenize):
+    """
+    Create an external-content FTS5 table over table's columns, with the
+    triggers that keep it in sync. Safe to call again: missing triggers
+    are recreated and the index is then rebuilt from the table.
+    """
+    column_list = ', '.join(columns)
+    new_values = ', '.join(f'new.{column}' for column in columns)
+    old_values = ', '.join(f'old.{column}' for column in columns)
+    insert = f'INSERT INTO {fts_table}(rowid, {column_list}) VALUES (new.id, {new_values});'
+    delete = (
+        f"INSERT INTO {fts_table}({fts_table}, rowid, {column_list}) "
+        f"VALUES ('delete', old.id, {old_values});"
+    )
+    triggers = {
+        'insert': f'AFTER INSERT ON {table} BEGIN {insert} END',
+        'update': f'AFTER UPDATE ON {table} BEGIN {delete} {insert} END',
+        'delete': f'AFTER DELETE ON {table} BEGIN {delete} END',
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_table} USING fts5("
+            f"{column_list}, content='{table}', content_rowid='id', tokenize='{tokenize}')"
+        )
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s",
+            [table],
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        missing = {
+            event: body for event, body in triggers.items()
+            if f'{fts_table}_{event}' not in existing
+        }
+        for event, body in missing.items():
+            cursor.execute(f'CREATE TRIGGER {fts_table}_{event} {body}')
+        if missing:
+            # Rows written while the triggers were missing are not indexed
+            cursor.execute(f"INSERT INTO {fts_table}({fts_table}) VALUES ('rebuild')")
+
+
+def drop_fts5_table(connection, table, fts_table):
+    with connection.cursor() as cursor:
+        for event in ('insert', 'update', 'delete'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {fts_table}_{event}')
+        cursor.execute(f'DROP TABLE IF EXISTS {fts_table}')
+
+
+class FullTextIndex:
+    def __init__(self, table, weights, config='english'):
+        self.table = table
+        # Column name -> weight class, 'A' (highest) to 'D'
+        self.weights = weights
+        self.config = config
+
+    @property
+    def columns(self):
+        return list(self.weights)
+
+    @property
+    def fts_table(self):
+        return f'{self.table}_fts'
+
+    def install(self, connection):
+        if connection.vendor == 'postgresql':
+            self._install_postgres(connection)
+        elif connection.vendor == 'sqlite':
+            self._install_sqlite(connection)
+
+    def uninstall(self, connection):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'ALTER TABLE {self.table} DROP COLUMN IF EXISTS search_vector')
+        elif connection.vendor == 'sqlite':
+            drop_fts5_table(connection, self.table, self.fts_table)
+
+    def _install_postgres(self, connection):
+        vector = ' || '.join(
+            f"setweight(to_tsvector('{self.config}', coalesce({column}, '')), '{weight}')"
+            for column, weight in self.weights.items()
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'ALTER TABLE {self.table} ADD COLUMN IF NOT EXISTS search_vector tsvector '
+                f'GENERATED ALWAYS AS ({vector}) STORED'
+            )
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {self.table}_search_vector '
+                f'ON {self.table} USING GIN (search_vector)'
+            )
+
+    def _install_sqlite(self, connection):
+        create_fts5_table(
+            connection, self.table, self.fts_table, self.columns, 'porter unicode61'
+        )
+
+    def search(self, queryset, terms):
+        """
+        Filter queryset to rows matching every term (as a prefix) and
+        annotate it with search_rank, higher being more relevant. Returns
+        None when the database has no full-text support here.
+        """
+        words = [word for term in terms for word in re.findall(r'\w+', term)]
+        if not words:
+            return queryset
+        vendor = connections[queryset.db].vendor
+
+        if vendor == 'postgresql':
+            tsquery = ' & '.join(f'{word}:*' for word in words)
+            column = f'"{self.table}"."search_vector"'
+            return queryset.extra(
+                where=[f"{column} @@ to_tsquery(%s, %s)"],
+                params=[self.config, tsquery],
+            ).annotate(search_rank=RawSQL(
+                f'ts_rank({column}, to_tsquery(%s, %s))', [self.config, tsquery]
+            ))
+
+        if vendor == 'sqlite':
+            match = ' '.join('"{}"*'.format(word.replace('"', '')) for word in words)
+            weights = ', '.join(str(BM25_WEIGHTS[weight]) for weight in self.weights.values())
+            return queryset.filter(id__in=RawSQL(
+                f'SELECT rowid FROM {self.fts_table} WHERE {self.fts_table} MATCH %s', [match]
+            )).annotate(search_rank=RawSQL(
+                f'(SELECT -bm25({self.fts_table}, {weights}) FROM {self.fts_table} '
+                f'WHERE {self.fts_table} MATCH %s AND rowid = "{self.table}"."id")',
+                [match],
+            ))
+
+        return None
+
+
+RESTAURANT_INDEX = FullTextIndex('restaurants_restaurant', {
+    'name': 'A',
+    'cuisine': 'B',
+    'city': 'B',
+    'state': 'C',
+    'description': 'D',
+})
+REVIEW_INDEX = FullTextIndex('reviews_review', {'comment': 'A'})
+
+INDEXES = {
+    'restaurants.Restaurant': RESTAURANT_INDEX,
+    'reviews.Review': REVIEW_INDEX,
+}
+
+
+class TrigramIndex:
+    """
+    Serves case-insensitive substring lookups on a table's columns.
+
+    Django compiles icontains on Postgres to UPPER(column::text) LIKE ...,
+    so each column gets a pg_trgm GIN index on exactly that expression and
+    the planner uses it for the unmodified lookup. SQLite has no such
+    index; there the lookup is rewritten by filter_contains into a phrase
+    query on an FTS5 trigram table.
+    """
+
+    def __init__(self, table, columns):
+        self.table = table
+        self.columns = columns
+
+    @property
+    def fts_table(self):
+        return f'{self.table}_trigram'
+
+    def index_name(self, column):
+        return f'{self.table}_{column}_trgm'
+
+    def install(self, connection):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+                for column in self.columns:
+                    # CONCURRENTLY keeps the table writable while the index
+                    # builds; it cannot run inside a transaction
+                    cursor.execute(
+                        f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {self.index_name(column)} '
+                        f'ON {self.table} USING GIN (UPPER({column}::text) gin_trgm_ops)'
+                    )
+        elif connection.vendor == 'sqlite':
+            create_fts5_table(connection, self.table, self.fts_table, self.columns, 'trigram')
+
+    def uninstall(self, connection):
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                for column in self.columns:
+                    cursor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {self.index_name(column)}')
+        elif connection.vendor == 'sqlite':
+            drop_fts5_table(connection, self.table, self.fts_table)
+
+    def match(self, column, value):
+        """Subquery of the ids whose column contains value, ignoring case."""
+        phrase = '"{}"'.format(value.replace('"', '""'))
+        return RawSQL(
+            f'SELECT rowid FROM {self.fts_table} WHERE {self.fts_table} MATCH %s',
+            [f'{column} : {phrase}'],
+        )
+
+
+RESTAURANT_TRIGRAM_INDEX = TrigramIndex(
+    'restaurants_restaurant', ['name', 'city', 'state', 'zip_code', 'cuisine']
+)
+USER_TRIGRAM_INDEX = TrigramIndex('users_user', ['username'])
+
+TRIGRAM_INDEXES = {
+    'restaurants.Restaurant': RESTAURANT_TRIGRAM_INDEX,
+    'users.User': USER_TRIGRAM_INDEX,
+}
+
+
+def filter_contains(queryset, field_name, value):
+    """
+    queryset.filter(<field_name>__icontains=value), served by a trigram
+    index when the target column has one. field_name may span relations,
+    e.g. restaurant__name.
+    """
+    # A trigram table cannot match fewer than three characters
+    if connections[queryset.db].vendor == 'sqlite' and len(value) >= 3:
+        *path, column = field_name.split('__')
+        model = queryset.model
+        for name in path:
+            model = model._meta.get_field(name).related_model
+        index = TRIGRAM_INDEXES.get(model._meta.label)
+        if index is not None and column in index.columns:
+            lookup = '__'.join(path + ['pk', 'in'])
+            return queryset.filter(**{lookup: index.match(column, value)})
+    return queryset.filter(**{f'{field_name}__icontains': value})
+
+
+class TrigramFilter(django_filters.CharFilter):
+    """CharFilter doing an icontains lookup through filter_contains."""
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        return filter_contains(qs, self.field_name, value)
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter that uses the model's full-text index when it has one,
+    and DRF's icontains search over search_fields otherwise.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        index = INDEXES.get(queryset.model._meta.label)
+        if terms and index is not None:
+            results = index.search(queryset, terms)
+            if results is not None:
+                return results
+        return super().filter_queryset(request, queryset, view)
+
+
+class RelevanceOrderingFilter(filters.OrderingFilter):
+    """OrderingFilter that keeps search results in relevance order unless ?ordering= is given."""
+
+    def filter_queryset(self, request, queryset, view):
+        if 'search_rank' in queryset.query.annotations and not request.query_params.get(
+            self.ordering_param
+        ):
+            return queryset.order_by('-search_rank', 'pk')
+        return super().filter_queryset(request, queryset, view)
+
+
+def install_indexes(sender, using, **kwargs):
+    """post_migrate receiver that (re)installs the app's text indexes."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    tables = connection.introspection.table_names()
+    for indexes in (INDEXES, TRIGRAM_INDEXES):
+        for label, index in indexes.items():
+            if label.split('.')[0] == sender.label and index.table in tables:
+                index.install(connection)
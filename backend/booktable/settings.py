@@ -25,6 +25,38 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 TWILIO_ACCOUNT_SID = env('TWILIO_ACCOUNT_SID', default='')
 TWILIO_AUTH_TOKEN = env('TWILIO_AUTH_TOKEN', default='')
 TWILIO_PHONE_NUMBER = env('TWILIO_PHONE_NUMBER', default='')
+# Override to send SMS somewhere other than api.twilio.com, e.g. the fake endpoint
+TWILIO_API_BASE_URL = env('TWILIO_API_BASE_URL', default='')
+
+# Email delivery
+EMAIL_BACKEND = env('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
+EMAIL_HOST = env('EMAIL_HOST', default='localhost')
+EMAIL_PORT = env.int('EMAIL_PORT', default=25)
+
+# Class that delivers queued SMS notifications. Use
+# bookings.notifications.FakeSmsSender to keep messages in memory.
+BOOKING_SMS_SENDER = env('BOOKING_SMS_SENDER', default='bookings.notifications.TwilioSmsSender')
+
+# Bookable time slots offered each day
+BOOKING_OPENING_TIME = env('BOOKING_OPENING_TIME', default='11:00')
+BOOKING_CLOSING_TIME = env('BOOKING_CLOSING_TIME', default='22:00')
+BOOKING_SLOT_MINUTES = env.int('BOOKING_SLOT_MINUTES', default=30)
+
+# Seconds a slot hold keeps its seats before expire_slot_holds frees
+# them, and how many unexpired holds one user may have at a time
+BOOKING_HOLD_SECONDS = env.int('BOOKING_HOLD_SECONDS', default=300)
+BOOKING_MAX_HOLDS = env.int('BOOKING_MAX_HOLDS', default=3)
+
+# Answer availability checks from per-worker NumPy occupancy arrays.
+# Workers learn of each other's bookings through CACHES, so the engine
+# requires a shared cache backend. Arrays are reloaded at least every
+# BOOKING_OCCUPANCY_TTL seconds regardless.
+BOOKING_OCCUPANCY_ENGINE = env.bool('BOOKING_OCCUPANCY_ENGINE', default=False)
+BOOKING_OCCUPANCY_TTL = env.int('BOOKING_OCCUPANCY_TTL', default=60)
+
+# Seconds restaurant list, detail and search responses stay cached.
+# Restaurant changes invalidate them sooner.
+RESTAURANT_CACHE_TIMEOUT = env.int('RESTAURANT_CACHE_TIMEOUT', default=300)
 
 
 # Quick-start development settings - unsuitable for production
@@ -58,9 +90,11 @@ INSTALLED_APPS = [
     'restaurants',
     'bookings',
     'reviews',
+    'analytics',
 ]
 
 MIDDLEWARE = [
+    'booktable.queries.QueryInstrumentationMiddleware',  # Per-request DB query stats
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Add whitenoise for static files
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -109,6 +143,11 @@ DATABASES = {
     }
 }
 
+# Cache shared by every worker, e.g. CACHE_URL=rediscache://localhost:6379/1.
+# The default keeps a separate cache in each process, which only suits a
+# single worker: invalidations made by one worker never reach the others.
+CACHES = {'default': env.cache('CACHE_URL', default='locmemcache://')}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -158,18 +197,31 @@ AUTH_USER_MODEL = 'users.User'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
-        'rest_framework.filters.SearchFilter',
-        'rest_framework.filters.OrderingFilter',
+        'booktable.search.FullTextSearchFilter',
+        'booktable.search.RelevanceOrderingFilter',
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
     'DEFAULT_SCHEMA_CLASS': 'rest_framework.schemas.coreapi.AutoSchema',
 }
 
+SIMPLE_JWT = {
+    # Adds the role claim CachedJWTAuthentication checks cached users against
+    'TOKEN_OBTAIN_SERIALIZER': 'users.authentication.RoleTokenObtainPairSerializer',
+}
+
+# Users resolved by CachedJWTAuthentication: seconds a row stays in the
+# shared cache and in each worker's LRU, and rows per LRU. A user change
+# reaches other workers within AUTH_USER_LOCAL_TTL seconds. Without a
+# shared CACHE_URL, rows stay AUTH_USER_LOCAL_TTL seconds in both.
+AUTH_USER_CACHE_TIMEOUT = env.int('AUTH_USER_CACHE_TIMEOUT', default=300)
+AUTH_USER_LOCAL_TTL = env.int('AUTH_USER_LOCAL_TTL', default=30)
+AUTH_USER_LOCAL_SIZE = env.int('AUTH_USER_LOCAL_SIZE', default=2048)
+
 # Swagger settings
 SWAGGER_SETTINGS = {
     'SECURITY_DEFINITIONS': {
@@ -182,7 +234,21 @@ SWAGGER_SETTINGS = {
     'USE_SESSION_AUTH': False,
 }
 
+# Query instrumentation
+SLOW_QUERY_MS = env.float('SLOW_QUERY_MS', default=100)
+# Repeats of one statement in a request that get logged as a likely N+1
+N_PLUS_ONE_THRESHOLD = env.int('N_PLUS_ONE_THRESHOLD', default=5)
+
 # Logging configuration
+# File output is written by a background thread and rotated by size.
+# LOG_SAMPLE_RATES keeps a fraction of sub-WARNING records per logger,
+# e.g. LOG_SAMPLE_RATES=django.server=0.1,bookings=0.5
+LOG_SAMPLE_RATES = env.dict('LOG_SAMPLE_RATES', cast={'value': float}, default={})
+# Rotation is only safe with one process per file. Set LOG_FILE_PER_PROCESS
+# when running several worker processes to give each its own files,
+# e.g. debug.1234.log.
+LOG_FILE_PER_PROCESS = env.bool('LOG_FILE_PER_PROCESS', default=False)
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -191,16 +257,38 @@ LOGGING = {
             'format': '{levelname} {asctime} {module} {process:d} {thread:d} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'booktable.log.JsonFormatter',
+        },
+    },
+    'filters': {
+        'sampling': {
+            '()': 'booktable.log.SamplingFilter',
+            'rates': LOG_SAMPLE_RATES,
+        },
     },
     'handlers': {
         'console': {
             'class': 'logging.StreamHandler',
             'formatter': 'verbose',
+            'filters': ['sampling'],
         },
         'file': {
-            'class': 'logging.FileHandler',
+            'class': 'booktable.log.QueuedRotatingFileHandler',
             'filename': os.path.join(BASE_DIR, 'debug.log'),
-            'formatter': 'verbose',
+            'maxBytes': env.int('LOG_FILE_MAX_BYTES', default=10 * 1024 * 1024),
+            'backupCount': env.int('LOG_FILE_BACKUP_COUNT', default=5),
+            'per_process': LOG_FILE_PER_PROCESS,
+            'formatter': 'json',
+            'filters': ['sampling'],
+        },
+        'slow_queries': {
+            'class': 'booktable.log.QueuedRotatingFileHandler',
+            'filename': os.path.join(BASE_DIR, 'slow_queries.log'),
+            'maxBytes': env.int('LOG_FILE_MAX_BYTES', default=10 * 1024 * 1024),
+            'backupCount': env.int('LOG_FILE_BACKUP_COUNT', default=5),
+            'per_process': LOG_FILE_PER_PROCESS,
+            'formatter': 'json',
         },
     },
     'loggers': {
@@ -214,5 +302,18 @@ LOGGING = {
             'level': 'DEBUG',
             'propagate': True,
         },
+        'booktable.slow_queries': {
+            'handlers': ['slow_queries'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+        **{
+            app: {
+                'handlers': ['console', 'file'],
+                'level': env('LOG_LEVEL', default='INFO'),
+                'propagate': True,
+            }
+            for app in ['users', 'restaurants', 'bookings', 'reviews', 'analytics']
+        },
     },
 }
@@ -0,0 +1,147 @@
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+from unittest import mock
+from django.test import SimpleTestCase
+from .log import JsonFormatter, QueuedRotatingFileHandler, SamplingFilter
+
+
+def make_record(name="booktable.test", level=logging.INFO, msg="Booking %s", args=(7,), exc_info=None, **extra):
+    return logging.getLogger(name).makeRecord(name, level, __file__, 1, msg, args, exc_info, extra=extra)
+
+
+class JsonFormatterTests(SimpleTestCase):
+    def test_fields_and_extras(self):
+        record = make_record(booking_id=7, restaurant={"id": 3}, when=object)
+        record._sampled = True
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual(entry["message"], "Booking 7")
+        self.assertEqual((entry["level"], entry["logger"]), ("INFO", "booktable.test"))
+        self.assertEqual((entry["process"], entry["thread"]), (os.getpid(), threading.get_ident()))
+        self.assertTrue(entry["time"].endswith("+00:00"))
+        self.assertEqual((entry["booking_id"], entry["restaurant"]), (7, {"id": 3}))
+        self.assertEqual(entry["when"], str(object))
+        self.assertNotIn("_sampled", entry)
+        self.assertNotIn("exception", entry)
+
+    def test_exception(self):
+        try:
+            raise ValueError("no table")
+        except ValueError:
+            record = make_record(level=logging.ERROR, exc_info=sys.exc_info())
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertTrue(entry["exception"].startswith("Traceback"))
+        self.assertTrue(entry["exception"].endswith("ValueError: no table"))
+
+
+class SamplingFilterTests(SimpleTestCase):
+    def setUp(self):
+        self.filter = SamplingFilter({"django.db": 0.0, "django.db.backends.schema": 1.0, "booktable": 0.5})
+
+    def test_most_specific_prefix_wins(self):
+        self.assertEqual(self.filter.rate_for("django.db"), 0.0)
+        self.assertEqual(self.filter.rate_for("django.db.backends"), 0.0)
+        self.assertEqual(self.filter.rate_for("django.db.backends.schema"), 1.0)
+        self.assertEqual(self.filter.rate_for("booktable.queries"), 0.5)
+        # prefixes end at dots
+        self.assertEqual(self.filter.rate_for("django.dbx"), 1.0)
+        self.assertEqual(self.filter.rate_for("django"), 1.0)
+
+    def test_warnings_always_pass(self):
+        for level in (logging.WARNING, logging.ERROR, logging.CRITICAL):
+            self.assertTrue(self.filter.filter(make_record("django.db.backends", level)))
+        self.assertFalse(self.filter.filter(make_record("django.db.backends", logging.DEBUG)))
+        self.assertTrue(self.filter.filter(make_record("django.request", logging.DEBUG)))
+
+    def test_one_decision_per_record(self):
+        with mock.patch("booktable.log.random.random", return_value=0.4):
+            kept = make_record("booktable.queries", logging.DEBUG)
+            self.assertTrue(self.filter.filter(kept))
+        with mock.patch("booktable.log.random.random", return_value=0.6):
+            dropped = make_record("booktable.queries", logging.DEBUG)
+            self.assertFalse(self.filter.filter(dropped))
+            # a second handler's filter keeps the same sample
+            self.assertTrue(self.filter.filter(kept))
+
+
+class CountingFormatter(JsonFormatter):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def format(self, record):
+        self.calls += 1
+        return super().format(record)
+
+
+class Described:
+    def __init__(self, name):
+        self.name = name
+        self.threads = []
+
+    def __str__(self):
+        self.threads.append(threading.get_ident())
+        return self.name
+
+
+class QueuedRotatingFileHandlerTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.filename = os.path.join(directory.name, "debug.log")
+
+    def handler(self, **kwargs):
+        handler = QueuedRotatingFileHandler(self.filename, **kwargs)
+        self.addCleanup(handler.close)
+        self.formatter = CountingFormatter()
+        handler.setFormatter(self.formatter)
+        return handler
+
+    def lines(self, filename=None):
+        with open(filename or self.filename) as f:
+            return [json.loads(line) for line in f]
+
+    def test_record_is_formatted_once(self):
+        handler = self.handler()
+        restaurant = Described("Corner Bistro")
+        handler.handle(make_record(msg="Booked %s", args=(restaurant,), tags=["a"]))
+        # changed after logging, as a request may go on to do
+        restaurant.name = "Renamed"
+        handler.close()
+
+        self.assertEqual(self.formatter.calls, 1)
+        self.assertEqual(restaurant.threads, [threading.get_ident()])
+        [entry] = self.lines()
+        self.assertEqual((entry["message"], entry["tags"]), ("Booked Corner Bistro", ["a"]))
+
+    def test_exception_is_formatted_on_the_logging_thread(self):
+        handler = self.handler()
+        try:
+            raise ValueError("no table")
+        except ValueError:
+            handler.handle(make_record(level=logging.ERROR, exc_info=sys.exc_info()))
+        handler.close()
+        [entry] = self.lines()
+        self.assertTrue(entry["exception"].endswith("ValueError: no table"))
+
+    def test_per_process_file(self):
+        handler = self.handler(per_process=True)
+        handler.handle(make_record())
+        handler.close()
+        self.assertFalse(os.path.exists(self.filename))
+        root, ext = os.path.splitext(self.filename)
+        self.assertEqual(len(self.lines(f"{root}.{os.getpid()}{ext}")), 1)
+
+
+class LoggingSettingsTests(SimpleTestCase):
+    def test_every_app_logs_to_the_configured_handlers(self):
+        for app in ["users", "restaurants", "bookings", "reviews", "analytics"]:
+            handlers = logging.getLogger(app).handlers
+            self.assertEqual(
+                sorted(type(handler).__name__ for handler in handlers),
+                ["QueuedRotatingFileHandler", "StreamHandler"],
+                app,
+            )
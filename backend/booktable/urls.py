@@ -24,6 +24,7 @@ from rest_framework_simplejwt.views import (
 from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
+from .views import QueryStatsView
 
 def index(request):
     return JsonResponse({"message": "Welcome to the BookTable API!"})
@@ -48,6 +49,8 @@ urlpatterns = [
     path('api/', include('restaurants.urls')),
     path('api/', include('bookings.urls')),
     path('api/', include('reviews.urls')),
+    path('api/', include('analytics.urls')),
+    path('api/debug/queries/', QueryStatsView.as_view(), name='query-stats'),
 
     # JWT Auth endpoints
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),  # login
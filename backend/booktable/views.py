@@ -1,6 +1,18 @@
-# backend/restaurants/views.py
+# backend/booktable/views.py
 from django.http import JsonResponse
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .queries import stats
 
 def ping(request):
     return JsonResponse({'message': 'pong from restaurants'})
 
+class QueryStatsView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if request.user.role != 'admin':
+            raise PermissionDenied("Only admins can view query statistics.")
+        return Response(stats.summary())
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class RestaurantsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'restaurants'
+
+    def ready(self):
+        from booktable.search import install_indexes
+        from . import signals  # noqa: F401
+
+        # SQLite drops the text index triggers whenever a migration rebuilds the table
+        post_migrate.connect(install_indexes, sender=self)
@@ -0,0 +1,111 @@
+"""
+Response cache for the restaurant catalog endpoints.
+
+Entries hold the serialized response data and its ETag/Last-Modified,
+so a hit skips both the database and serialization. Instead of deleting
+keys, which not every cache backend can do by pattern, each key embeds a
+version number: lists use the catalog version and detail views the
+restaurant's own version. Any restaurant change bumps both, and entries under old
+versions are left to expire.
+"""
+import hashlib
+import time
+from urllib.parse import urlencode
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+CATALOG_VERSION_KEY = 'restaurant-catalog-version'
+RESTAURANT_VERSION_KEY = 'restaurant-version:{}'
+# Stored with the data so cache hits keep answering conditional GETs
+VALIDATOR_HEADERS = ('ETag', 'Last-Modified')
+
+
+def _version(key):
+    version = cache.get(key)
+    if version is None:
+        # First reader after a cache flush picks the version everyone shares
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def catalog_version(restaurant_id=None):
+    if restaurant_id is None:
+        return _version(CATALOG_VERSION_KEY)
+    return _version(RESTAURANT_VERSION_KEY.format(restaurant_id))
+
+
+def invalidate(*restaurant_ids):
+    """Drop cached lists and these restaurants' detail entries."""
+
+    def bump():
+        version = time.time_ns()
+        keys = [CATALOG_VERSION_KEY]
+        keys += [RESTAURANT_VERSION_KEY.format(restaurant_id) for restaurant_id in restaurant_ids]
+        cache.set_many(dict.fromkeys(keys, version), None)
+
+    # Once now, so other workers stop serving the old data, and once after
+    # commit, so nothing they cached from before the commit survives
+    bump()
+    transaction.on_commit(bump)
+
+
+def cache_scope(user):
+    """Users in the same scope see the same restaurants."""
+    if user.role == 'admin':
+        return 'admin'
+    if user.role == 'manager':
+        return f'manager:{user.pk}'
+    return 'public'
+
+
+def cache_key(request, name, scope, version):
+    # Sorted, without empty values, so equivalent URLs share an entry
+    params = urlencode(sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+        if value != ''
+    ))
+    # Pagination links embed the host and path
+    target = f'{request.get_host()}{request.path}?{params}'
+    digest = hashlib.sha256(target.encode()).hexdigest()
+    return f'restaurant-catalog:{name}:{scope}:{version}:{digest}'
+
+
+def cached_response(request, name, scope, build, restaurant_id=None):
+    """
+    Return the cached response for this request, or call build() and
+    cache its data and validators when it succeeds. Hits still answer
+    If-None-Match/If-Modified-Since with a 304.
+    """
+    # Read the version before building, so data built while an update
+    # commits is stored under the version that update replaces
+    key = cache_key(request, name, scope, catalog_version(restaurant_id))
+    entry = cache.get(key)
+    if entry is not None:
+        data, headers = entry
+        response = get_conditional_response(
+            request,
+            etag=headers.get('ETag'),
+            last_modified=parse_http_date_safe(headers.get('Last-Modified')),
+        ) or Response(data)
+        for header, value in headers.items():
+            response[header] = value
+        response['X-Cache'] = 'HIT'
+        return response
+
+    response = build()
+    if response.status_code == 200:
+        headers = {
+            header: response[header]
+            for header in VALIDATOR_HEADERS
+            if response.has_header(header)
+        }
+        cache.set(key, (response.data, headers), settings.RESTAURANT_CACHE_TIMEOUT)
+    response['X-Cache'] = 'MISS'
+    return response
@@ -1,14 +1,18 @@
 import django_filters
+from booktable.search import TrigramFilter
 from .models import Restaurant
 
 class RestaurantFilter(django_filters.FilterSet):
-    name = django_filters.CharFilter(lookup_expr='icontains')
-    city = django_filters.CharFilter(lookup_expr='icontains')
-    state = django_filters.CharFilter(lookup_expr='icontains')
-    cuisine = django_filters.CharFilter(lookup_expr='icontains')
+    name = TrigramFilter()
+    city = TrigramFilter()
+    state = TrigramFilter()
+    cuisine = TrigramFilter()
     min_cost = django_filters.NumberFilter(field_name='cost_rating', lookup_expr='gte')
     max_cost = django_filters.NumberFilter(field_name='cost_rating', lookup_expr='lte')
     is_approved = django_filters.BooleanFilter()
+    min_rating = django_filters.NumberFilter(field_name='avg_rating', lookup_expr='gte')
+    max_rating = django_filters.NumberFilter(field_name='avg_rating', lookup_expr='lte')
+    min_reviews = django_filters.NumberFilter(field_name='review_count', lookup_expr='gte')
 
     class Meta:
         model = Restaurant
@@ -0,0 +1,139 @@
+"""
+Offline geocoding and proximity search for restaurants.
+
+Coordinates come from data/zip_centroids.csv.gz, one centroid per US zip
+code (taken from the MIT-licensed `zipcodes` package data), so no
+geocoding service is needed. Each located restaurant also stores its
+geohash; a radius search covers the query's bounding box with a few
+geohash cells, reads the candidates through the geohash index, and only
+computes exact great-circle distances for those.
+"""
+import csv
+import gzip
+import math
+from functools import lru_cache
+from pathlib import Path
+from django.db.models import Q
+
+ZIP_CENTROIDS_PATH = Path(__file__).resolve().parent / 'data' / 'zip_centroids.csv.gz'
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+# 9 characters is a cell of roughly 5m x 5m
+GEOHASH_PRECISION = 9
+# Most cells a radius search will OR together before using coarser ones
+MAX_COVER_CELLS = 16
+
+
+@lru_cache(maxsize=1)
+def zip_centroids():
+    with gzip.open(ZIP_CENTROIDS_PATH, 'rt', newline='') as f:
+        return {
+            row['zip_code']: (float(row['latitude']), float(row['longitude']))
+            for row in csv.DictReader(f)
+        }
+
+
+def centroid_for(zip_code):
+    """(latitude, longitude) for a zip code such as '95112' or '95112-1234', or None."""
+    return zip_centroids().get((zip_code or '').strip()[:5])
+
+
+def geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = value = 0
+    even = True  # bits alternate between longitude and latitude, longitude first
+    while len(chars) < precision:
+        coordinate, bounds = (longitude, lng_range) if even else (latitude, lat_range)
+        middle = (bounds[0] + bounds[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(height, width) in degrees of a geohash cell."""
+    bits = 5 * precision
+    return 180 / 2 ** (bits // 2), 360 / 2 ** (bits - bits // 2)
+
+
+def distance_km(lat1, lng1, lat2, lng2):
+    """Great-circle (haversine) distance."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """(min_lat, max_lat, min_lng, max_lng) containing every point within radius_km."""
+    d_lat = radius_km / KM_PER_DEGREE
+    min_lat, max_lat = max(latitude - d_lat, -90.0), min(latitude + d_lat, 90.0)
+    cos_lat = min(math.cos(math.radians(min_lat)), math.cos(math.radians(max_lat)))
+    if cos_lat <= 0 or radius_km / (KM_PER_DEGREE * cos_lat) >= 180:
+        # Reaches a pole: every longitude is in range
+        return min_lat, max_lat, -180.0, 180.0
+    d_lng = radius_km / (KM_PER_DEGREE * cos_lat)
+    min_lng, max_lng = longitude - d_lng, longitude + d_lng
+    if min_lng < -180 or max_lng > 180:
+        # Crosses the antimeridian; keep it simple and drop the bound
+        return min_lat, max_lat, -180.0, 180.0
+    return min_lat, max_lat, min_lng, max_lng
+
+
+def covering_cells(min_lat, max_lat, min_lng, max_lng):
+    """The geohash prefixes of the finest precision covering the box in MAX_COVER_CELLS or fewer."""
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        rows = int((max_lat - min_lat) / height) + 2
+        columns = int((max_lng - min_lng) / width) + 2
+        if rows * columns <= MAX_COVER_CELLS:
+            break
+    else:
+        return None  # the box is too large for a prefix filter to help
+
+    # Sample every row and column of cells the box touches, edges included
+    lats = [min(min_lat + i * height, max_lat) for i in range(rows)]
+    lngs = [min(min_lng + i * width, max_lng) for i in range(columns)]
+    return sorted({geohash(lat, lng, precision) for lat in lats for lng in lngs})
+
+
+def within_radius(queryset, latitude, longitude, radius_km):
+    """
+    [(distance_km, pk)] for the located rows of queryset within radius_km
+    of the point, nearest first. Runs one query over the geohash cells and
+    bounding box, fetching only ids and coordinates.
+    """
+    min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius_km)
+    queryset = queryset.filter(
+        latitude__range=(min_lat, max_lat), longitude__range=(min_lng, max_lng)
+    )
+    cells = covering_cells(min_lat, max_lat, min_lng, max_lng)
+    if cells:
+        # Ranges rather than startswith, so every database can use the index
+        cell_filter = Q()
+        for cell in cells:
+            cell_filter |= Q(geohash__gte=cell, geohash__lt=cell + '~')
+        queryset = queryset.filter(cell_filter)
+
+    results = []
+    for pk, lat, lng in queryset.values_list('pk', 'latitude', 'longitude'):
+        distance = distance_km(latitude, longitude, lat, lng)
+        if distance <= radius_km:
+            results.append((distance, pk))
+    results.sort()
+    return results
@@ -0,0 +1,138 @@
+import random
+import time
+from datetime import date, time as slot_time, timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from booktable.search import filter_contains
+from bookings.models import Booking
+from restaurants.models import Restaurant
+from users.models import User
+
+ADJECTIVES = ['Golden', 'Blue', 'Little', 'Royal', 'Happy', 'Spicy', 'Old', 'Green', 'Lucky', 'Silver']
+NOUNS = ['Dragon', 'Garden', 'Kitchen', 'Table', 'Bistro', 'Grill', 'House', 'Palace', 'Corner', 'Oven']
+CUISINES = ['Italian', 'Chinese', 'Mexican', 'Thai', 'Indian', 'French', 'Japanese', 'Greek']
+CITIES = [
+    ('San Jose', 'CA'), ('San Francisco', 'CA'), ('Oakland', 'CA'), ('Seattle', 'WA'),
+    ('Portland', 'OR'), ('Austin', 'TX'), ('Boston', 'MA'), ('Chicago', 'IL'),
+]
+
+# (label, queryset, field, value) for each filter the API exposes
+CASES = [
+    ('restaurant name', Restaurant.objects.order_by('name'), 'name', 'Dragon 12'),
+    ('restaurant city', Restaurant.objects.order_by('name'), 'city', 'francisco'),
+    ('restaurant zip', Restaurant.objects.order_by('name'), 'zip_code', '9511'),
+    ('booking restaurant_name', Booking.objects.order_by('-date'), 'restaurant__name', 'Palace 77'),
+    ('booking customer_name', Booking.objects.order_by('-date'), 'customer__username', 'diner4242'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Times the icontains filters with and without their trigram indexes '
+        'over generated restaurants and bookings. Runs in a transaction that '
+        'is rolled back, so it leaves no data behind.'
+    )
+
+    def add_arguments(self, parser):
+        # Enough rows for the scans to dominate in a few minutes; raise them
+        # to see how the gap grows with the tables
+        parser.add_argument('--restaurants', type=int, default=20_000)
+        parser.add_argument('--bookings', type=int, default=500_000)
+        parser.add_argument('--customers', type=int, default=5_000)
+        parser.add_argument('--iterations', type=int, default=5)
+        parser.add_argument('--chunk-size', type=int, default=10_000)
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        with transaction.atomic():
+            started = time.perf_counter()
+            self.create_fixture(options)
+            self.stdout.write(f'Generated data in {time.perf_counter() - started:.1f}s')
+
+            results = []
+            for label, queryset, field, value in CASES:
+                def indexed():
+                    return self.fetch_page(filter_contains(queryset, field, value))
+
+                def scan():
+                    return self.fetch_page(queryset.filter(**{f'{field}__icontains': value}))
+
+                results.append((label, self.measure(indexed, options['iterations']),
+                                self.measure_scan(scan, options['iterations'])))
+            transaction.set_rollback(True)
+
+        self.stdout.write(f'{"filter":>24} {"indexed ms":>12} {"scan ms":>12}')
+        for label, indexed, scan in results:
+            self.stdout.write(f'{label:>24} {indexed * 1000:12.2f} {scan * 1000:12.2f}')
+
+    def create_fixture(self, options):
+        chunk_size = options['chunk_size']
+        owner = User.objects.create(username='benchmark-owner', role='manager')
+        first_customer = User.objects.create(username='diner0').pk
+        self.insert(User, (
+            User(username=f'diner{i}') for i in range(1, options['customers'])
+        ), chunk_size)
+
+        def restaurants():
+            for i in range(options['restaurants']):
+                city, state = random.choice(CITIES)
+                yield Restaurant(
+                    owner=owner,
+                    name=f'{random.choice(ADJECTIVES)} {random.choice(NOUNS)} {i}',
+                    address='-', city=city, state=state,
+                    zip_code=f'{random.randint(10000, 99999)}',
+                    cuisine=random.choice(CUISINES), cost_rating=random.randint(1, 5),
+                    description='-', is_approved=True,
+                )
+        first_restaurant = Restaurant.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        self.insert(Restaurant, restaurants(), chunk_size)
+
+        start = date.today()
+        restaurant_ids = (first_restaurant + 1, first_restaurant + options['restaurants'])
+        customer_ids = (first_customer, first_customer + options['customers'] - 1)
+
+        def bookings():
+            for _ in range(options['bookings']):
+                yield Booking(
+                    customer_id=random.randint(*customer_ids),
+                    restaurant_id=random.randint(*restaurant_ids),
+                    date=start + timedelta(days=random.randint(0, 365)),
+                    time=slot_time(random.randint(11, 21)),
+                    party_size=random.randint(1, 8), status='confirmed',
+                )
+        # bulk_create bypasses Booking.save(), so the slot ledger is not touched
+        self.insert(Booking, bookings(), chunk_size)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def insert(self, model, objects, chunk_size):
+        chunk = []
+        for obj in objects:
+            chunk.append(obj)
+            if len(chunk) == chunk_size:
+                model.objects.bulk_create(chunk)
+                chunk = []
+        model.objects.bulk_create(chunk)
+
+    def fetch_page(self, queryset):
+        # What a paginated list request runs: a count and the first page
+        return queryset.count(), list(queryset[:10])
+
+    def measure(self, query, iterations):
+        query()  # warm up caches
+        started = time.perf_counter()
+        for _ in range(iterations):
+            query()
+        return (time.perf_counter() - started) / iterations
+
+    def measure_scan(self, query, iterations):
+        if connection.vendor == 'postgresql':
+            # Postgres would otherwise use the trigram index for plain icontains too
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_bitmapscan = off')
+            try:
+                return self.measure(query, iterations)
+            finally:
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_bitmapscan = on')
+        return self.measure(query, iterations)
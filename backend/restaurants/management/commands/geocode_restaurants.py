@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from restaurants.models import Restaurant
+
+
+class Command(BaseCommand):
+    help = (
+        'Fills restaurant coordinates and geohashes from the bundled zip '
+        'centroid table, for rows written without Restaurant.save()'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Re-locate every restaurant from its zip code, replacing existing coordinates',
+        )
+
+    def handle(self, *args, **options):
+        restaurants = Restaurant.objects.all()
+        if not options['all']:
+            restaurants = restaurants.filter(geohash='')
+
+        fields = ['latitude', 'longitude', 'geohash']
+        located = missing = 0
+        with transaction.atomic():
+            batch = []
+            for restaurant in restaurants.select_for_update().only('id', 'zip_code', *fields):
+                if options['all']:
+                    restaurant.latitude = restaurant.longitude = None
+                restaurant.locate()
+                if restaurant.geohash:
+                    located += 1
+                else:
+                    missing += 1
+                batch.append(restaurant)
+            Restaurant.objects.bulk_update(batch, fields, batch_size=1000)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Restaurants located: {located}, unknown zip code: {missing}'
+        ))
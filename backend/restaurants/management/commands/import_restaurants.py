@@ -0,0 +1,258 @@
+import csv
+import json
+import time
+from contextlib import nullcontext
+from itertools import islice
+from pathlib import Path
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connection, connections, models, transaction
+from restaurants.cache import invalidate
+from restaurants.models import Restaurant
+from users.models import User
+
+IMPORT_FIELDS = [
+    'name', 'address', 'city', 'state', 'zip_code', 'cuisine', 'cost_rating',
+    'description', 'capacity', 'is_approved', 'latitude', 'longitude',
+]
+# Fields the model falls back to a default or null for when a row leaves them empty
+OPTIONAL_FIELDS = {'capacity', 'is_approved', 'latitude', 'longitude'}
+# Columns an import with --on-duplicate update overwrites
+UPDATE_FIELDS = ['owner', *IMPORT_FIELDS, 'geohash', 'updated_at']
+# Spellings of booleans in CSV files beyond Django's t/f/True/False/1/0
+BOOLEANS = {'true': True, 'yes': True, 'y': True, 'false': False, 'no': False, 'n': False}
+# A restaurant is the same restaurant if these match
+NATURAL_KEY = ('name', 'address', 'zip_code')
+# Errors printed before the rest are only counted
+MAX_REPORTED_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = (
+        'Imports restaurants from a CSV, JSON array or JSON lines file, '
+        'validating and inserting them in batches. Rows name their manager '
+        'in an owner column (username) unless --owner is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'json', 'jsonl'],
+                            help='File format; guessed from the extension by default')
+        parser.add_argument('--owner', help='Username of the manager who owns every row')
+        parser.add_argument('--create-managers', action='store_true',
+                            help='Create missing owners as managers, with owner_email as their email')
+        parser.add_argument('--on-duplicate', choices=['skip', 'update'], default='skip',
+                            help='What to do with rows whose name, address and zip code already exist')
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Rows validated and written per transaction')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Validate and report without saving anything')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        self.options = options
+        self.fields = {name: Restaurant._meta.get_field(name) for name in IMPORT_FIELDS}
+        self.owners = {}
+        self.seen = set()
+        self.counts = dict.fromkeys(['created', 'updated', 'skipped', 'invalid'], 0)
+        if options['owner']:
+            owner = User.objects.filter(username=options['owner']).values_list('pk', 'role').first()
+            if owner is None or owner[1] != 'manager':
+                raise CommandError(f'{options["owner"]} is not a manager')
+            self.owners[options['owner']] = owner[0]
+
+        started = time.perf_counter()
+        rows = enumerate(self.read_rows(options['path'], options['format']), start=1)
+        # One transaction per batch; a dry run rolls them all back at the end
+        with transaction.atomic() if options['dry_run'] else nullcontext():
+            while batch := list(islice(rows, options['batch_size'])):
+                with transaction.atomic():
+                    self.import_batch(batch)
+            if options['dry_run']:
+                transaction.set_rollback(True)
+        elapsed = time.perf_counter() - started
+
+        total = sum(self.counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            '{}Restaurants: {created} created, {updated} updated, {skipped} skipped, '
+            '{invalid} invalid'.format('Dry run. ' if options['dry_run'] else '', **self.counts)
+        ))
+        self.stdout.write(f'{total} rows in {elapsed:.2f}s ({total / max(elapsed, 1e-9):,.0f} rows/s)')
+
+    def read_rows(self, path, format):
+        path = Path(path)
+        if not path.exists():
+            raise CommandError(f'{path} does not exist')
+        format = format or {'.csv': 'csv', '.json': 'json'}.get(path.suffix.lower(), 'jsonl')
+        with path.open(newline='', encoding='utf-8-sig') as file:
+            if format == 'csv':
+                yield from csv.DictReader(file)
+            elif format == 'json':
+                yield from json.load(file)
+            else:
+                for line in file:
+                    if line.strip():
+                        yield json.loads(line)
+
+    def clean(self, row):
+        """(field values, errors) for one input row."""
+        values, errors = {}, {}
+        for name in ('owner', 'owner_email'):
+            # JSON rows may hold numbers or objects here
+            if row.get(name) is not None and not isinstance(row[name], str):
+                errors[name] = 'Must be a string.'
+        for name, field in self.fields.items():
+            raw = row.get(name)
+            if isinstance(raw, str):
+                raw = raw.strip()
+            if raw is None or raw == '':
+                if name not in OPTIONAL_FIELDS:
+                    errors[name] = 'This field is required.'
+                continue
+            if isinstance(field, models.BooleanField) and isinstance(raw, str):
+                raw = BOOLEANS.get(raw.lower(), raw)
+            try:
+                values[name] = field.clean(raw, None)
+            except ValidationError as e:
+                errors[name] = ' '.join(e.messages)
+        if not errors.get('cost_rating') and not 1 <= values.get('cost_rating', 1) <= 5:
+            errors['cost_rating'] = 'Must be between 1 and 5.'
+        if not errors.get('capacity') and values.get('capacity', 1) < 1:
+            errors['capacity'] = 'Must be at least 1.'
+        if not self.options['owner'] and 'owner' not in errors and not (row.get('owner') or '').strip():
+            errors['owner'] = 'This field is required.'
+        return values, errors
+
+    def import_batch(self, batch):
+        valid = []
+        for line, row in batch:
+            values, errors = self.clean(row)
+            if errors:
+                self.report(line, errors)
+            else:
+                valid.append((line, row, values))
+
+        owners = self.resolve_owners(valid)
+        # Existing restaurants sharing a key with this batch, in one query.
+        # Chains repeat names and zip codes, so all three narrow it down
+        existing = {
+            tuple(getattr(restaurant, name) for name in NATURAL_KEY): restaurant
+            for restaurant in Restaurant.objects.filter(**{
+                f'{name}__in': {values[name] for _, _, values in valid} for name in NATURAL_KEY
+            })
+        }
+
+        created, updated = [], {}
+        for line, row, values in valid:
+            owner_id = owners.get(self.options['owner'] or row['owner'].strip())
+            if owner_id is None:
+                self.report(line, {'owner': f'{row["owner"].strip()} is not a manager'})
+                continue
+            key = tuple(values[name] for name in NATURAL_KEY)
+            restaurant = existing.get(key)
+            if key in self.seen or (restaurant and self.options['on_duplicate'] == 'skip'):
+                # Already imported from an earlier row, or kept as it is
+                self.counts['skipped'] += 1
+                continue
+            self.seen.add(key)
+            if restaurant is None:
+                restaurant = Restaurant(owner_id=owner_id, **values)
+                created.append(restaurant)
+            else:
+                restaurant.owner_id = owner_id
+                for name, value in values.items():
+                    setattr(restaurant, name, value)
+                updated[restaurant.pk] = restaurant
+            # The writes below skip save(), which would do this
+            restaurant.locate()
+
+        self.insert(created)
+        self.update(updated.values())
+        # Neither sends post_save, so drop cached responses here
+        if created or updated:
+            invalidate(*updated)
+        self.counts['created'] += len(created)
+        self.counts['updated'] += len(updated)
+
+    # Rows go to executemany with one prepared statement per batch, which
+    # ran about twice as fast as bulk_create and bulk_update. Each value is
+    # still prepared as save() would: pre_save() for auto_now and similar
+    # fields, then get_db_prep_save() for the database's types.
+
+    def insert(self, restaurants):
+        fields = [field for field in Restaurant._meta.concrete_fields if not field.primary_key]
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            self.quote(Restaurant._meta.db_table),
+            ', '.join(self.quote(field.column) for field in fields),
+            ', '.join(['%s'] * len(fields)),
+        )
+        self.execute_many(sql, fields, restaurants, add=True)
+
+    def update(self, restaurants):
+        fields = [Restaurant._meta.get_field(name) for name in UPDATE_FIELDS]
+        sql = 'UPDATE {} SET {} WHERE {} = %s'.format(
+            self.quote(Restaurant._meta.db_table),
+            ', '.join(f'{self.quote(field.column)} = %s' for field in fields),
+            self.quote(Restaurant._meta.pk.column),
+        )
+        self.execute_many(sql, [*fields, Restaurant._meta.pk], restaurants, add=False)
+
+    def execute_many(self, sql, fields, restaurants, add):
+        if not restaurants:
+            return
+        # The connection proxy costs a lookup per use, far too many here
+        db = connections[DEFAULT_DB_ALIAS]
+        prepare = [
+            (
+                field.attname,
+                # Only fields such as auto_now ones change the value in pre_save
+                field.pre_save if type(field).pre_save is not models.Field.pre_save else None,
+                field.get_db_prep_save,
+            )
+            for field in fields
+        ]
+        rows = [
+            [
+                prep(pre_save(restaurant, add) if pre_save else getattr(restaurant, attname), db)
+                for attname, pre_save, prep in prepare
+            ]
+            for restaurant in restaurants
+        ]
+        with db.cursor() as cursor:
+            cursor.executemany(sql, rows)
+
+    def quote(self, name):
+        return connection.ops.quote_name(name)
+
+    def resolve_owners(self, valid):
+        """Manager ids by username, creating missing ones with --create-managers."""
+        usernames = {row['owner'].strip() for _, row, _ in valid if not self.options['owner']}
+        missing = usernames - self.owners.keys()
+        if missing:
+            found = User.objects.filter(username__in=missing).values_list('username', 'pk', 'role')
+            for username, pk, role in found:
+                self.owners[username] = pk if role == 'manager' else None
+                missing.discard(username)
+        if missing and self.options['create_managers']:
+            emails = {row['owner'].strip(): (row.get('owner_email') or '').strip() for _, row, _ in valid}
+            managers = [
+                User(username=username, email=emails.get(username, ''), role='manager')
+                for username in missing
+            ]
+            for manager in managers:
+                # They sign in after a password reset
+                manager.set_unusable_password()
+            User.objects.bulk_create(managers)
+            self.owners.update(
+                User.objects.filter(username__in=missing).values_list('username', 'pk')
+            )
+        return self.owners
+
+    def report(self, line, errors):
+        self.counts['invalid'] += 1
+        if self.counts['invalid'] <= MAX_REPORTED_ERRORS:
+            details = '; '.join(f'{name}: {message}' for name, message in errors.items())
+            self.stderr.write(f'Row {line}: {details}')
+        elif self.counts['invalid'] == MAX_REPORTED_ERRORS + 1:
+            self.stderr.write('Further invalid rows are counted but not shown')
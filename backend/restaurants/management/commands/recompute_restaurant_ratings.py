@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from restaurants.models import RATING_COUNT_FIELDS, Restaurant
+from reviews.models import Review
+
+
+class Command(BaseCommand):
+    help = 'Recomputes restaurant rating summaries from Review rows to repair drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--restaurant',
+            type=int,
+            help='Only recompute this restaurant id',
+        )
+
+    def handle(self, *args, **options):
+        restaurants = Restaurant.objects.all()
+        reviews = Review.objects.all()
+        if options['restaurant']:
+            restaurants = restaurants.filter(pk=options['restaurant'])
+            reviews = reviews.filter(restaurant_id=options['restaurant'])
+
+        counts = {}
+        for row in reviews.values('restaurant_id', 'rating').annotate(count=Count('id')):
+            if row['rating'] in RATING_COUNT_FIELDS:
+                counts.setdefault(row['restaurant_id'], {})[row['rating']] = row['count']
+
+        fields = ['avg_rating', 'review_count', *RATING_COUNT_FIELDS.values()]
+        corrected = []
+        with transaction.atomic():
+            for restaurant in restaurants.select_for_update().only('id', *fields):
+                by_rating = counts.get(restaurant.id, {})
+                review_count = sum(by_rating.values())
+                expected = {
+                    'review_count': review_count,
+                    'avg_rating': (
+                        sum(rating * count for rating, count in by_rating.items()) / review_count
+                        if review_count else 0
+                    ),
+                    **{
+                        field: by_rating.get(rating, 0)
+                        for rating, field in RATING_COUNT_FIELDS.items()
+                    },
+                }
+                if any(self.differs(restaurant, field, value) for field, value in expected.items()):
+                    for field, value in expected.items():
+                        setattr(restaurant, field, value)
+                    corrected.append(restaurant)
+            Restaurant.objects.bulk_update(corrected, fields, batch_size=1000)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Restaurant ratings recomputed: {len(corrected)} corrected'
+        ))
+
+    def differs(self, restaurant, field, value):
+        current = getattr(restaurant, field)
+        if field == 'avg_rating':
+            # SQL and Python division may disagree in the last bits
+            return abs(current - value) > 1e-9
+        return current != value
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 11:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='capacity',
+            field=models.IntegerField(default=100),
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.0.2 on 2026-10-18 11:40
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_rating_summary(apps, schema_editor):
+    Restaurant = apps.get_model('restaurants', 'Restaurant')
+    Review = apps.get_model('reviews', 'Review')
+    summaries = {}
+    counts = Review.objects.values('restaurant_id', 'rating').annotate(count=Count('id'))
+    for row in counts:
+        if 1 <= row['rating'] <= 5:
+            summaries.setdefault(row['restaurant_id'], {})[row['rating']] = row['count']
+    for restaurant_id, by_rating in summaries.items():
+        review_count = sum(by_rating.values())
+        Restaurant.objects.filter(pk=restaurant_id).update(
+            review_count=review_count,
+            avg_rating=sum(rating * count for rating, count in by_rating.items()) / review_count,
+            **{f'rating_{rating}_count': by_rating.get(rating, 0) for rating in range(1, 6)},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0003_restaurant_capacity'),
+        ('reviews', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='avg_rating',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='rating_1_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='rating_2_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='rating_3_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='rating_4_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='rating_5_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='review_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(populate_rating_summary, migrations.RunPython.noop),
+    ]
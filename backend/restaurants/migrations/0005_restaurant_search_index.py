@@ -0,0 +1,31 @@
+from django.db import migrations
+from booktable.search import FullTextIndex
+
+# Postgres: generated search_vector column with a GIN index.
+# SQLite: FTS5 shadow table kept in sync by triggers.
+INDEX = FullTextIndex('restaurants_restaurant', {
+    'name': 'A',
+    'cuisine': 'B',
+    'city': 'B',
+    'state': 'C',
+    'description': 'D',
+})
+
+
+def install(apps, schema_editor):
+    INDEX.install(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    INDEX.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0004_restaurant_rating_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.2 on 2026-10-18 11:58
+
+from django.db import migrations, models
+from restaurants.geo import centroid_for, geohash
+
+
+def locate_restaurants(apps, schema_editor):
+    Restaurant = apps.get_model('restaurants', 'Restaurant')
+    located = []
+    for restaurant in Restaurant.objects.only('zip_code'):
+        centroid = centroid_for(restaurant.zip_code)
+        if centroid:
+            restaurant.latitude, restaurant.longitude = centroid
+            restaurant.geohash = geohash(*centroid)
+            located.append(restaurant)
+    Restaurant.objects.bulk_update(located, ['latitude', 'longitude', 'geohash'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0006_restaurant_trigram_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=12),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.RunPython(locate_restaurants, migrations.RunPython.noop),
+    ]
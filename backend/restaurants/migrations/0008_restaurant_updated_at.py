@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 12:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurants', '0007_restaurant_location'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -1,5 +1,19 @@
 from django.db import models
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Cast
+from django.utils import timezone
 from users.models import User
+from .cache import invalidate
+from .geo import centroid_for, geohash
+
+# Per-star review counters on Restaurant
+RATING_COUNT_FIELDS = {
+    1: 'rating_1_count',
+    2: 'rating_2_count',
+    3: 'rating_3_count',
+    4: 'rating_4_count',
+    5: 'rating_5_count',
+}
 
 class Restaurant(models.Model):
     owner = models.ForeignKey(User, on_delete=models.CASCADE, limit_choices_to={'role': 'manager'})
@@ -11,7 +25,97 @@ class Restaurant(models.Model):
     cuisine = models.CharField(max_length=50)
     cost_rating = models.IntegerField()  # 1-5 scale
     description = models.TextField()
+    capacity = models.IntegerField(default=100)  # seats available per time slot
     is_approved = models.BooleanField(default=False)
+    # Review summary, maintained by ReviewViewSet through update_rating_counts
+    avg_rating = models.FloatField(default=0)
+    review_count = models.IntegerField(default=0)
+    rating_1_count = models.IntegerField(default=0)
+    rating_2_count = models.IntegerField(default=0)
+    rating_3_count = models.IntegerField(default=0)
+    rating_4_count = models.IntegerField(default=0)
+    rating_5_count = models.IntegerField(default=0)
+    # Filled from the zip code's centroid unless given; see locate()
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, default='', db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    LOCATION_FIELDS = ('zip_code', 'latitude', 'longitude')
 
     def __str__(self):
         return self.name
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if all(name in instance.__dict__ for name in cls.LOCATION_FIELDS):
+            instance._loaded_location = instance.location()
+        return instance
+
+    def location(self):
+        return self.zip_code, self.latitude, self.longitude
+
+    def locate(self):
+        """
+        Take latitude/longitude from the zip code's centroid when they are
+        missing, or when the zip code changed without them being edited
+        too, and bring geohash in line with them.
+        """
+        loaded = getattr(self, '_loaded_location', None)
+        coordinates = (self.latitude, self.longitude)
+        zip_moved = loaded is not None and self.zip_code != loaded[0] and coordinates == loaded[1:]
+        if None in coordinates or zip_moved:
+            self.latitude, self.longitude = centroid_for(self.zip_code) or (None, None)
+        if self.latitude is None or self.longitude is None:
+            self.geohash = ''
+        else:
+            self.geohash = geohash(self.latitude, self.longitude)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self.locate()
+        else:
+            # Partial saves still count as changes for conditional GETs
+            update_fields = {*update_fields, 'updated_at'}
+            if update_fields & set(self.LOCATION_FIELDS):
+                self.locate()
+                update_fields |= {'latitude', 'longitude', 'geohash'}
+            kwargs['update_fields'] = update_fields
+        super().save(*args, **kwargs)
+        self._loaded_location = self.location()
+
+    @classmethod
+    def update_rating_counts(cls, restaurant_id, added=None, removed=None):
+        """
+        Count one review with rating `added` and/or uncount one with rating
+        `removed`, then refresh avg_rating from the per-star counters.
+        Both are single-row UPDATEs, so concurrent reviews don't lose counts.
+        """
+        deltas = {}
+        for rating, delta in ((added, 1), (removed, -1)):
+            if rating is not None:
+                field = RATING_COUNT_FIELDS[rating]
+                deltas[field] = deltas.get(field, 0) + delta
+                deltas['review_count'] = deltas.get('review_count', 0) + delta
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        restaurant = cls.objects.filter(pk=restaurant_id)
+        restaurant.update(
+            updated_at=timezone.now(),
+            **{field: F(field) + delta for field, delta in deltas.items()},
+        )
+        total = sum(
+            (F(field) * rating for rating, field in RATING_COUNT_FIELDS.items()),
+            Value(0),
+        )
+        restaurant.update(avg_rating=Case(
+            When(review_count=0, then=Value(0.0)),
+            default=Cast(total, FloatField()) / F('review_count'),
+            output_field=FloatField(),
+        ))
+        # update() sends no post_save, so drop cached responses here
+        invalidate(restaurant_id)
@@ -5,4 +5,29 @@ class RestaurantSerializer(serializers.ModelSerializer):
     class Meta:
         model = Restaurant
         fields = '__all__'
-        read_only_fields = ['owner']
+        read_only_fields = [
+            'owner', 'avg_rating', 'review_count', 'rating_1_count',
+            'rating_2_count', 'rating_3_count', 'rating_4_count', 'rating_5_count',
+            'geohash',
+        ]
+
+
+class RestaurantAvailabilitySerializer(RestaurantSerializer):
+    open_slots = serializers.SerializerMethodField()
+
+    def get_open_slots(self, obj):
+        return self.context.get('open_slots', {}).get(obj.id, [])
+
+
+class RestaurantDistanceSerializer(RestaurantSerializer):
+    distance_km = serializers.SerializerMethodField()
+
+    def get_distance_km(self, obj):
+        distance = self.context.get('distances', {}).get(obj.id)
+        return None if distance is None else round(distance, 2)
+
+
+class RestaurantDistanceAvailabilitySerializer(
+    RestaurantDistanceSerializer, RestaurantAvailabilitySerializer
+):
+    pass
@@ -0,0 +1,10 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .cache import invalidate
+from .models import Restaurant
+
+
+@receiver(post_save, sender=Restaurant)
+@receiver(post_delete, sender=Restaurant)
+def invalidate_cached_responses(sender, instance, **kwargs):
+    invalidate(instance.pk)
@@ -1,3 +1,516 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from datetime import date, time, timedelta
+from io import StringIO
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from booktable.queries import QueryInstrumentationMiddleware, stats
+from booktable.search import filter_contains
+from bookings.models import Booking
+from users.models import User
+from .models import Restaurant
 
-# Create your tests here.
+
+def create_restaurant(owner, name, **fields):
+    defaults = {
+        'address': '1 Main St',
+        'city': 'San Jose',
+        'state': 'CA',
+        'zip_code': '95112',
+        'cuisine': 'Italian',
+        'cost_rating': 2,
+        'description': 'A test restaurant',
+        'is_approved': True,
+    }
+    defaults.update(fields)
+    return Restaurant.objects.create(owner=owner, name=name, **defaults)
+
+
+class RestaurantQueryBudgetTests(TestCase):
+    """
+    Each endpoint must run a fixed number of queries no matter how many
+    rows it returns. A failure here usually means a new N+1.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user(username='manager', password='x', role='manager')
+        cls.customer = User.objects.create_user(username='customer', password='x')
+        cls.restaurants = [
+            create_restaurant(cls.manager, f'Restaurant {i}') for i in range(15)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def test_list(self):
+        # count + page
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/restaurants/')
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_retrieve(self):
+        with self.assertNumQueries(1):
+            self.client.get(f'/api/restaurants/{self.restaurants[0].id}/')
+
+    def test_search(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/restaurants/search/', {'city': 'san'})
+        self.assertEqual(response.data['count'], 15)
+
+    def test_search_with_availability(self):
+        # count + page + open slots for the page
+        with self.assertNumQueries(3):
+            self.client.get('/api/restaurants/search/', {
+                'city': 'san', 'date': '2099-01-01', 'time': '19:00', 'party_size': 4,
+            })
+
+    def test_search_near(self):
+        # candidate ids and coordinates + page
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/restaurants/search/', {
+                'near': '37.3382,-121.8863', 'radius_km': 5,
+            })
+        self.assertEqual(response.data['count'], 15)
+
+
+class QueryInstrumentationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user(username='manager', password='x', role='manager')
+        cls.admin = User.objects.create_user(username='admin', password='x', role='admin')
+        cls.restaurant = create_restaurant(cls.manager, 'Counted Bistro')
+
+    def setUp(self):
+        cache.clear()
+        stats.requests.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.manager)
+
+    def run_middleware(self, repeat):
+        def get_response(request):
+            for _ in range(repeat):
+                list(Restaurant.objects.filter(pk=self.restaurant.pk))
+            User.objects.count()
+            return HttpResponse()
+
+        request = RequestFactory().get('/anything/')
+        return QueryInstrumentationMiddleware(get_response)(request)
+
+    def test_headers_count_this_requests_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/restaurants/{self.restaurant.id}/')
+        self.assertEqual(response['X-DB-Query-Count'], str(len(queries)))
+        self.assertGreater(float(response['X-DB-Time-Ms']), 0)
+        self.assertEqual(response['X-DB-Duplicate-Queries'], '0')
+
+    def test_repeated_statements(self):
+        with self.assertNoLogs('booktable.queries', 'WARNING'):
+            response = self.run_middleware(repeat=2)
+        self.assertEqual(response['X-DB-Query-Count'], '3')
+        self.assertEqual(response['X-DB-Duplicate-Queries'], '2')
+
+        with self.settings(N_PLUS_ONE_THRESHOLD=5), self.assertLogs('booktable.queries', 'WARNING') as logs:
+            self.run_middleware(repeat=5)
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('Possible N+1 on GET /anything/: 5 x SELECT', logs.output[0])
+
+    def test_slow_queries_are_logged(self):
+        with self.settings(SLOW_QUERY_MS=0), self.assertLogs('booktable.slow_queries', 'WARNING') as logs:
+            self.run_middleware(repeat=1)
+        self.assertEqual(len(logs.records), 2)
+
+    def test_summary_is_admin_only(self):
+        for _ in range(3):
+            self.client.get(f'/api/restaurants/{self.restaurant.id}/')
+        self.assertEqual(self.client.get('/api/debug/queries/').status_code, 403)
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get('/api/debug/queries/').status_code, 401)
+
+        self.client.force_authenticate(self.admin)
+        response = self.client.get('/api/debug/queries/')
+        self.assertEqual(response.status_code, 200)
+        routes = {row['route']: row for row in response.data['routes']}
+        detail = routes['GET /api/restaurants/(?P<pk>[^/.]+)/']
+        self.assertEqual(detail['requests'], 3)
+        self.assertEqual(detail['requests_with_duplicates'], 0)
+        self.assertGreaterEqual(detail['max_queries'], detail['avg_queries'])
+        self.assertEqual(response.data['window'], 5)
+
+
+class RestaurantFullTextSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        manager = User.objects.create_user(username='manager', password='x', role='manager')
+        cls.customer = User.objects.create_user(username='customer', password='x')
+        cls.palace = create_restaurant(manager, 'Sushi Palace', cuisine='Japanese')
+        cls.diner = create_restaurant(
+            manager, 'Corner Diner', cuisine='American', description='Burgers, and sushi on Fridays'
+        )
+        cls.trattoria = create_restaurant(manager, 'Trattoria Roma', description='Hand made pasta')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def search(self, terms, **params):
+        response = self.client.get('/api/restaurants/', {'search': terms, **params})
+        return [row['id'] for row in response.data['results']]
+
+    def test_name_matches_outrank_description_matches(self):
+        self.assertEqual(self.search('sushi'), [self.palace.id, self.diner.id])
+
+    def test_prefixes_and_every_term(self):
+        self.assertEqual(self.search('tratt'), [self.trattoria.id])
+        self.assertEqual(self.search('sushi burgers'), [self.diner.id])
+        self.assertEqual(self.search('sushi pasta'), [])
+
+    def test_explicit_ordering_wins(self):
+        self.assertEqual(self.search('sushi', ordering='name'), [self.diner.id, self.palace.id])
+
+    def test_index_follows_writes(self):
+        self.trattoria.name = 'Sushi Trattoria'
+        self.trattoria.save()
+        self.palace.delete()
+        self.assertEqual(self.search('sushi'), [self.trattoria.id, self.diner.id])
+        self.assertEqual(self.search('palace'), [])
+
+
+class RestaurantNearSearchTests(TestCase):
+    # Due north of the center, where a degree of latitude is exactly
+    # KM_PER_DEGREE along the great circle
+    CENTER = (37.0, -122.0)
+
+    @classmethod
+    def setUpTestData(cls):
+        manager = User.objects.create_user(username='manager', password='x', role='manager')
+        cls.customer = User.objects.create_user(username='customer', password='x')
+        lat, lng = cls.CENTER
+
+        def at(name, d_lat, d_lng=0.0, **fields):
+            return create_restaurant(manager, name, latitude=lat + d_lat, longitude=lng + d_lng, **fields)
+
+        cls.here = at('Here', 0.0)
+        cls.near = at('Near', 0.05, city='Gilroy')
+        cls.far = at('Far', 0.1)
+        cls.south = at('South', -0.2)
+        # Inside the bounding box of a 10 km search, but not the circle
+        cls.corner = at('Corner', 0.07, 0.09)
+        at('Hidden', 0.01, is_approved=False)
+        create_restaurant(manager, 'Nowhere', zip_code='00000')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def near_search(self, radius_km, **params):
+        response = self.client.get('/api/restaurants/search/', {
+            'near': '{},{}'.format(*self.CENTER), 'radius_km': radius_km, **params,
+        })
+        self.assertEqual(response.status_code, 200)
+        return [(row['id'], row['distance_km']) for row in response.data['results']]
+
+    def test_only_restaurants_inside_radius_nearest_first(self):
+        self.assertEqual(self.near_search(10), [(self.here.id, 0.0), (self.near.id, 5.56)])
+        self.assertEqual(self.near_search(11.13), [
+            (self.here.id, 0.0), (self.near.id, 5.56), (self.far.id, 11.12),
+        ])
+        results = dict(self.near_search(25))
+        self.assertEqual(results[self.south.id], 22.24)
+        self.assertEqual(set(results), {self.here.id, self.near.id, self.far.id, self.south.id, self.corner.id})
+        self.assertEqual(results[self.corner.id], 11.15)
+
+    def test_combines_with_filters(self):
+        self.assertEqual(self.near_search(25, city='gilroy'), [(self.near.id, 5.56)])
+
+    def test_located_from_zip_code(self):
+        restaurant = Restaurant.objects.get(name='Nowhere')
+        self.assertIsNone(restaurant.latitude)
+        restaurant.zip_code = '95112'
+        restaurant.save()
+        response = self.client.get('/api/restaurants/search/', {
+            'near': f'{restaurant.latitude},{restaurant.longitude}', 'radius_km': 1,
+        })
+        self.assertEqual([row['id'] for row in response.data['results']], [restaurant.id])
+
+    def test_rejects_bad_parameters(self):
+        for params in [{'near': '37'}, {'near': '91,0'}, {'near': '37,-122', 'radius_km': 0},
+                       {'near': '37,-122', 'radius_km': 501}]:
+            response = self.client.get('/api/restaurants/search/', params)
+            self.assertEqual(response.status_code, 400, params)
+
+
+@override_settings(BOOKING_OPENING_TIME='19:00', BOOKING_CLOSING_TIME='20:00', BOOKING_SLOT_MINUTES=30)
+class RestaurantSlotSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        manager = User.objects.create_user(username='manager', password='x', role='manager')
+        cls.customer = User.objects.create_user(username='customer', password='x')
+        cls.date = date.today() + timedelta(days=1)
+
+        def book(restaurant, hour, minute, party_size, day=cls.date):
+            Booking.objects.create(
+                customer=cls.customer, restaurant=restaurant, date=day,
+                time=time(hour, minute), party_size=party_size,
+            )
+
+        cls.open = create_restaurant(manager, 'A Open', capacity=10)
+        cls.busy = create_restaurant(manager, 'B Busy', capacity=10)
+        book(cls.busy, 19, 30, 8)
+        cls.full = create_restaurant(manager, 'C Full', capacity=4)
+        for hour, minute in [(19, 0), (19, 30), (20, 0)]:
+            book(cls.full, hour, minute, 4)
+        cls.small = create_restaurant(manager, 'D Small', capacity=2)
+        cls.full_tomorrow = create_restaurant(manager, 'E Full Another Day', capacity=4)
+        for hour, minute in [(19, 0), (19, 30), (20, 0)]:
+            book(cls.full_tomorrow, hour, minute, 4, day=cls.date + timedelta(days=1))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def slot_search(self, party_size, **params):
+        response = self.client.get('/api/restaurants/search/', {
+            'date': str(self.date), 'time': '19:30', 'window': 30, 'party_size': party_size, **params,
+        })
+        self.assertEqual(response.status_code, 200)
+        return [(row['id'], row['open_slots']) for row in response.data['results']]
+
+    def test_only_restaurants_with_an_open_slot(self):
+        self.assertEqual(self.slot_search(4), [
+            (self.open.id, ['19:30', '19:00', '20:00']),
+            (self.busy.id, ['19:00', '20:00']),
+            (self.full_tomorrow.id, ['19:30', '19:00', '20:00']),
+        ])
+        self.assertEqual(self.slot_search(2), [
+            (self.open.id, ['19:30', '19:00', '20:00']),
+            (self.busy.id, ['19:30', '19:00', '20:00']),
+            (self.small.id, ['19:30', '19:00', '20:00']),
+            (self.full_tomorrow.id, ['19:30', '19:00', '20:00']),
+        ])
+        self.assertEqual(self.slot_search(10), [
+            (self.open.id, ['19:30', '19:00', '20:00']), (self.busy.id, ['19:00', '20:00']),
+        ])
+
+    def test_window_narrows_slots(self):
+        self.assertEqual(self.slot_search(4, window=0), [
+            (self.open.id, ['19:30']), (self.full_tomorrow.id, ['19:30']),
+        ])
+
+    def test_booking_fills_slot(self):
+        Booking.objects.create(
+            customer=self.customer, restaurant=self.busy, date=self.date, time=time(19), party_size=7,
+        )
+        self.assertEqual(dict(self.slot_search(4))[self.busy.id], ['20:00'])
+
+    def test_requires_date_and_time(self):
+        response = self.client.get('/api/restaurants/search/', {'party_size': 2})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/restaurants/search/', {'date': str(self.date), 'time': '19:00', 'party_size': 21})
+        self.assertEqual(response.status_code, 400)
+
+
+class SubstringFilterTests(TestCase):
+    """filter_contains must return exactly what a plain icontains does."""
+
+    @classmethod
+    def setUpTestData(cls):
+        manager = User.objects.create_user(username='manager', password='x', role='manager')
+        customers = [
+            User.objects.create_user(username=name, password='x')
+            for name in ['diner4242', 'Diner42', 'ada']
+        ]
+        names = ['Golden Dragon 12', 'Dragon 120', 'Little "Dragon"', 'Café Ümlaut', 'Oven']
+        places = [('San Francisco', 'CA', '94110'), ('South San Francisco', 'CA', '94080'), ('Seattle', 'WA', '98101')]
+        cls.restaurants = [
+            create_restaurant(manager, name, city=city, state=state, zip_code=zip_code)
+            for name, (city, state, zip_code) in zip(names, places * 2)
+        ]
+        for i, restaurant in enumerate(cls.restaurants):
+            Booking.objects.create(
+                customer=customers[i % len(customers)], restaurant=restaurant,
+                date=date.today() + timedelta(days=1), time=time(19), party_size=2,
+            )
+
+    def assertSameAsIcontains(self, queryset, field, value):
+        expected = queryset.filter(**{f'{field}__icontains': value})
+        self.assertQuerySetEqual(
+            filter_contains(queryset, field, value).order_by('pk'), expected.order_by('pk'),
+            transform=lambda obj: obj, msg=f'{field} contains {value!r}',
+        )
+        return expected.count()
+
+    def test_restaurant_columns(self):
+        restaurants = Restaurant.objects.all()
+        cases = [
+            ('name', 'dragon 12', 2), ('name', 'DRAGON', 3), ('name', '"Dragon"', 1),
+            ('name', 'Ümlaut', 1), ('name', 'ov', 1), ('name', 'pizza', 0),
+            ('city', 'francisco', 4), ('city', 'south san', 2), ('state', 'wa', 1),
+            ('zip_code', '941', 2), ('zip_code', '9', 5), ('cuisine', 'itali', 5),
+        ]
+        for field, value, count in cases:
+            self.assertEqual(self.assertSameAsIcontains(restaurants, field, value), count, value)
+
+    def test_related_columns(self):
+        bookings = Booking.objects.all()
+        self.assertEqual(self.assertSameAsIcontains(bookings, 'restaurant__name', 'dragon 12'), 2)
+        self.assertEqual(self.assertSameAsIcontains(bookings, 'customer__username', 'diner42'), 4)
+        self.assertEqual(self.assertSameAsIcontains(bookings, 'customer__username', 'diner4242'), 2)
+        # not trigram indexed
+        self.assertEqual(self.assertSameAsIcontains(bookings, 'restaurant__address', 'main'), 5)
+
+    def test_index_follows_writes(self):
+        restaurant = self.restaurants[-1]
+        restaurant.name = 'Dragon Oven'
+        restaurant.save()
+        self.restaurants[0].delete()
+        self.assertEqual(self.assertSameAsIcontains(Restaurant.objects.all(), 'name', 'dragon'), 3)
+        self.assertEqual(self.assertSameAsIcontains(Restaurant.objects.all(), 'name', 'golden'), 0)
+
+    def test_search_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.get(username='ada'))
+        response = client.get('/api/restaurants/search/', {'city': 'san fran', 'zip_code': '940'})
+        self.assertEqual(
+            sorted(row['id'] for row in response.data['results']),
+            [self.restaurants[1].id, self.restaurants[4].id],
+        )
+
+
+class RestaurantCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username='admin', password='x', role='admin')
+        cls.manager = User.objects.create_user(username='manager', password='x', role='manager')
+        cls.customer = User.objects.create_user(username='customer', password='x')
+        cls.restaurant = create_restaurant(cls.manager, 'Cached Cafe')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def test_repeat_request_skips_database(self):
+        self.client.get('/api/restaurants/', {'city': 'san', 'name': ''})
+        with self.assertNumQueries(0):
+            # Same parameters in another order, empty ones dropped
+            response = self.client.get('/api/restaurants/?name=&city=san')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.data['count'], 1)
+
+    def test_scopes_are_separate(self):
+        self.client.get('/api/restaurants/')
+        self.client.force_authenticate(self.manager)
+        self.assertEqual(self.client.get('/api/restaurants/')['X-Cache'], 'MISS')
+
+    def test_save_invalidates(self):
+        url = f'/api/restaurants/{self.restaurant.id}/'
+        self.client.get(url)
+        self.client.get('/api/restaurants/search/')
+        self.restaurant.name = 'Renamed Cafe'
+        self.restaurant.save()
+        self.assertEqual(self.client.get(url).data['name'], 'Renamed Cafe')
+        self.assertEqual(self.client.get('/api/restaurants/search/')['X-Cache'], 'MISS')
+
+    def test_approval_invalidates(self):
+        self.assertEqual(self.client.get('/api/restaurants/').data['count'], 1)
+        self.client.force_authenticate(self.admin)
+        self.client.patch(f'/api/restaurants/{self.restaurant.id}/approve/', {'is_approved': False}, format='json')
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get('/api/restaurants/').data['count'], 0)
+
+    def test_cache_hit_answers_conditional_get(self):
+        etag = self.client.get('/api/restaurants/')['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/restaurants/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class ImportRestaurantsTests(TestCase):
+    HEADER = 'name,address,city,state,zip_code,cuisine,cost_rating,description,is_approved,owner,owner_email\n'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.manager = User.objects.create_user(username='chain', password='x', role='manager')
+        cls.customer = User.objects.create_user(username='customer', password='x')
+
+    def run_import(self, rows, *args):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as file:
+            file.write(self.HEADER + ''.join(rows))
+        self.addCleanup(os.remove, file.name)
+        out, err = StringIO(), StringIO()
+        call_command('import_restaurants', file.name, *args, '--batch-size=2', stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_import(self):
+        out, err = self.run_import([
+            'Taco Co,1 First St,San Jose,CA,95112,Mexican,2,Tacos,yes,chain,\n',
+            'Taco Co,2 Second St,San Jose,CA,95113,Mexican,2,Tacos,no,newbie,new@example.com\n',
+            'Taco Co,1 First St,San Jose,CA,95112,Mexican,3,Repeated,yes,chain,\n',
+            'Bad Row,3 Third St,San Jose,CA,95112,Mexican,9,Tacos,yes,chain,\n',
+            'Not Ours,4 Fourth St,San Jose,CA,95112,Mexican,2,Tacos,yes,customer,\n',
+        ], '--create-managers')
+        self.assertIn('2 created, 0 updated, 1 skipped, 2 invalid', out)
+        self.assertIn('Row 4: cost_rating', err)
+        self.assertIn('Row 5: owner: customer is not a manager', err)
+
+        first = Restaurant.objects.get(address='1 First St')
+        self.assertEqual((first.owner, first.cost_rating, first.is_approved), (self.manager, 2, True))
+        self.assertTrue(first.geohash)
+        newbie = User.objects.get(username='newbie')
+        self.assertEqual((newbie.role, newbie.email), ('manager', 'new@example.com'))
+        self.assertFalse(newbie.has_usable_password())
+
+    def test_duplicates(self):
+        create_restaurant(self.manager, 'Taco Co', address='1 First St', zip_code='95112', cost_rating=1)
+        row = 'Taco Co,1 First St,San Jose,CA,95112,Mexican,4,Tacos,yes,chain,\n'
+        out, _ = self.run_import([row])
+        self.assertIn('0 created, 0 updated, 1 skipped', out)
+
+        cache.clear()
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        client.get('/api/restaurants/')
+        out, _ = self.run_import([row], '--on-duplicate=update')
+        self.assertIn('0 created, 1 updated, 0 skipped', out)
+        self.assertEqual(Restaurant.objects.get().cost_rating, 4)
+        # The write skipped post_save, but cached lists were still dropped
+        self.assertEqual(client.get('/api/restaurants/')['X-Cache'], 'MISS')
+
+    def test_json_rows(self):
+        rows = [
+            {'name': 'Taco Co', 'address': '1 First St', 'city': 'San Jose', 'state': 'CA',
+             'zip_code': '95112', 'cuisine': 'Mexican', 'cost_rating': 2, 'description': 'Tacos',
+             'is_approved': True, 'latitude': '37.3382', 'longitude': -121.8863, 'owner': 'chain'},
+            {'name': 'Odd Owner', 'owner': 42},
+            {'name': 'Odd Email', 'owner': 'chain', 'owner_email': {'to': 'x'}},
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as file:
+            file.write(''.join(json.dumps(row) + '\n' for row in rows))
+        self.addCleanup(os.remove, file.name)
+        out, err = StringIO(), StringIO()
+        call_command('import_restaurants', file.name, stdout=out, stderr=err)
+        self.assertIn('1 created, 0 updated, 0 skipped, 2 invalid', out.getvalue())
+        self.assertIn('Row 2: owner: Must be a string.', err.getvalue())
+        self.assertIn('owner_email: Must be a string.', err.getvalue())
+
+        restaurant = Restaurant.objects.get()
+        self.assertEqual((restaurant.latitude, restaurant.longitude), (37.3382, -121.8863))
+        self.assertIs(restaurant.is_approved, True)
+        self.assertIsNotNone(restaurant.updated_at)
+        self.assertEqual(restaurant.capacity, Restaurant._meta.get_field('capacity').default)
+
+    def test_dry_run(self):
+        out, _ = self.run_import(['Taco Co,1 First St,San Jose,CA,95112,Mexican,2,Tacos,yes,chain,\n'], '--dry-run')
+        self.assertIn('Dry run. Restaurants: 1 created', out)
+        self.assertFalse(Restaurant.objects.exists())
@@ -1,11 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import RestaurantViewSet, RestaurantApproveView, ping
+from .views import RestaurantViewSet, RestaurantApproveView, RestaurantSearchView, ping
 
 router = DefaultRouter()
 router.register(r'restaurants', RestaurantViewSet)
 
 urlpatterns = [
+    path('restaurants/search/', RestaurantSearchView.as_view(), name='restaurant-search'),
     path('', include(router.urls)),
     path('restaurants/<int:pk>/approve/', RestaurantApproveView.as_view(), name='restaurant-approve'),
     path('ping/', ping, name='restaurant-ping'),
@@ -2,28 +2,56 @@
 from django.http import JsonResponse
 from rest_framework import generics, viewsets
 from .models import Restaurant
-from .serializers import RestaurantSerializer
+from .serializers import (
+    RestaurantSerializer, RestaurantAvailabilitySerializer,
+    RestaurantDistanceSerializer, RestaurantDistanceAvailabilitySerializer,
+)
 from .filters import RestaurantFilter
+from .cache import cache_scope, cached_response
+from .geo import within_radius
+from booktable.conditional import ConditionalGetMixin, set_validators
+from booktable.search import filter_contains
+from bookings.models import Booking
+from bookings.availability import (
+    full_slot_filter, nearest_open_slots, parse_time, times_around
+)
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from django.db.models import Q
+from django.db.models import Count, Q
+from django.utils.dateparse import parse_date
 from datetime import datetime, timedelta
+import logging
+
+logger = logging.getLogger(__name__)
 
 def ping(request):
     return JsonResponse({'message': 'pong from restaurants'})
 
-class RestaurantViewSet(viewsets.ModelViewSet):
+class RestaurantViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Restaurant.objects.all()
     serializer_class = RestaurantSerializer
     permission_classes = [IsAuthenticated]
     filterset_class = RestaurantFilter
     search_fields = ['name', 'city', 'state', 'cuisine', 'description']
-    ordering_fields = ['name', 'city', 'cost_rating', 'is_approved']
+    ordering_fields = ['name', 'city', 'cost_rating', 'is_approved', 'avg_rating', 'review_count']
     ordering = ['name']
 
+    def list(self, request, *args, **kwargs):
+        return cached_response(
+            request, 'list', cache_scope(request.user),
+            lambda: super(RestaurantViewSet, self).list(request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return cached_response(
+            request, 'detail', cache_scope(request.user),
+            lambda: super(RestaurantViewSet, self).retrieve(request, *args, **kwargs),
+            restaurant_id=kwargs['pk'],
+        )
+
     def get_queryset(self):
         queryset = super().get_queryset()
         if self.request.user.role == 'admin':
@@ -39,12 +67,12 @@ class RestaurantViewSet(viewsets.ModelViewSet):
         serializer.save(owner=self.request.user)
 
     def perform_update(self, serializer):
-        if self.request.user != serializer.instance.owner and self.request.user.role != 'admin':
+        if self.request.user.pk != serializer.instance.owner_id and self.request.user.role != 'admin':
             raise PermissionDenied("You do not have permission to modify this restaurant.")
         serializer.save()
 
     def perform_destroy(self, instance):
-        if self.request.user != instance.owner and self.request.user.role != 'admin':
+        if self.request.user.pk != instance.owner_id and self.request.user.role != 'admin':
             raise PermissionDenied("You do not have permission to delete this restaurant.")
         instance.delete()
 
@@ -65,27 +93,144 @@ class RestaurantApproveView(APIView):
         restaurant.save()
         return Response(RestaurantSerializer(restaurant).data)
 
-class RestaurantSearchView(generics.ListAPIView):
+class RestaurantSearchView(ConditionalGetMixin, generics.ListAPIView):
+    """
+    Approved restaurants by location. Given near=lat,lng it only returns
+    restaurants within radius_km (default 10) of that point, nearest
+    first. Given date, time and party_size it only returns restaurants
+    with an open slot within `window` minutes (default 60) of time, along
+    with their nearest open slots.
+    """
     serializer_class = RestaurantSerializer
     permission_classes = [IsAuthenticated]
+    slot_search = None
+    near = None
+    max_radius_km = 500
+
+    def get_near(self):
+        params = self.request.query_params
+        if not params.get('near'):
+            return None
+        try:
+            latitude, longitude = (float(part) for part in params['near'].split(','))
+            radius_km = float(params.get('radius_km', 10))
+        except ValueError:
+            raise ValidationError({'detail': 'near must be lat,lng and radius_km a number'})
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValidationError({'detail': 'near is not a valid latitude,longitude'})
+        if not 0 < radius_km <= self.max_radius_km:
+            raise ValidationError({'detail': f'radius_km must be between 0 and {self.max_radius_km}'})
+        return latitude, longitude, radius_km
+
+    def get_slot_search(self):
+        params = self.request.query_params
+        if not any(params.get(key) for key in ('date', 'time', 'party_size')):
+            return None
+
+        date = parse_date(params.get('date') or '')
+        center = parse_time(params.get('time'))
+        if date is None or center is None:
+            raise ValidationError({'detail': 'date (YYYY-MM-DD) and time (HH:MM) are required'})
+        try:
+            party_size = int(params.get('party_size', 2))
+            window = int(params.get('window', 60))
+        except ValueError:
+            raise ValidationError({'detail': 'party_size and window must be integers'})
+        if party_size < 1 or party_size > Booking.MAX_PARTY_SIZE:
+            raise ValidationError({'detail': f'Party size must be between 1 and {Booking.MAX_PARTY_SIZE}'})
+
+        return {
+            'date': date,
+            'center': center,
+            'party_size': party_size,
+            'times': times_around(center, max(window, 0)),
+        }
+
+    def get_serializer_class(self):
+        if self.near and self.slot_search:
+            return RestaurantDistanceAvailabilitySerializer
+        if self.near:
+            return RestaurantDistanceSerializer
+        if self.slot_search:
+            return RestaurantAvailabilitySerializer
+        return super().get_serializer_class()
+
+    def list(self, request, *args, **kwargs):
+        self.slot_search = self.get_slot_search()
+        if self.slot_search:
+            # Availability changes with every booking; only the catalog is cached
+            return self.search(request)
+        # Every role searches the same approved restaurants
+        return cached_response(request, 'search', 'public', lambda: self.search(request))
+
+    def search(self, request):
+        self.near = self.get_near()
+        queryset = self.filter_queryset(self.get_queryset())
+        context = self.get_serializer_context()
+        if self.near:
+            # Rank (distance, id) pairs, then load only the page's restaurants
+            nearby = within_radius(queryset, *self.near)
+            page = self.paginate_queryset(nearby)
+            nearby = page if page is not None else nearby
+            by_id = queryset.in_bulk([pk for _, pk in nearby])
+            restaurants = [by_id[pk] for _, pk in nearby]
+            context['distances'] = {pk: distance for distance, pk in nearby}
+        else:
+            page = self.paginate_queryset(queryset)
+            restaurants = list(page if page is not None else queryset)
+
+        if self.slot_search:
+            context['open_slots'] = nearest_open_slots(
+                restaurants,
+                self.slot_search['date'],
+                self.slot_search['times'],
+                self.slot_search['party_size'],
+                self.slot_search['center'],
+            )
+            validators = None
+        else:
+            # Open slots move with bookings, so only catalog results get validators
+            envelope = self.paginator.get_paginated_response([]).data if page is not None else None
+            validators = (self.get_etag(request, restaurants, envelope), None)
+            not_modified = self.not_modified(request, *validators)
+            if not_modified is not None:
+                return not_modified
+
+        serializer = self.get_serializer(restaurants, many=True, context=context)
+        if page is not None:
+            response = self.get_paginated_response(serializer.data)
+        else:
+            response = Response(serializer.data)
+        if validators:
+            set_validators(response, *validators)
+        return response
 
     def get_queryset(self):
-        queryset = Restaurant.objects.filter(is_approved=True)
+        queryset = Restaurant.objects.filter(is_approved=True).order_by('name')
         city = self.request.query_params.get('city')
         state = self.request.query_params.get('state')
         zip_code = self.request.query_params.get('zip_code')
 
-        print(f"Search params: city={city}, state={state}, zip_code={zip_code}")
-        print(f"Initial queryset count: {queryset.count()}")
+        logger.debug("Search params: city=%s, state=%s, zip_code=%s", city, state, zip_code)
 
         if city:
-            queryset = queryset.filter(city__icontains=city)
-            print(f"After city filter: {queryset.count()}")
+            queryset = filter_contains(queryset, 'city', city)
         if state:
-            queryset = queryset.filter(state__icontains=state)
-            print(f"After state filter: {queryset.count()}")
+            queryset = filter_contains(queryset, 'state', state)
         if zip_code:
-            queryset = queryset.filter(zip_code__icontains=zip_code)
-            print(f"After zip_code filter: {queryset.count()}")
+            queryset = filter_contains(queryset, 'zip_code', zip_code)
+
+        if self.slot_search:
+            # Keep restaurants with at least one slot in the window that
+            # still fits the party, counting full slots in the same query
+            date = self.slot_search['date']
+            times = self.slot_search['times']
+            party_size = self.slot_search['party_size']
+            queryset = queryset.filter(capacity__gte=party_size).annotate(
+                full_slots=Count(
+                    'bookingslot',
+                    filter=full_slot_filter(date, times, party_size, prefix='bookingslot__'),
+                )
+            ).filter(full_slots__lt=len(times))
 
         return queryset
\ No newline at end of file
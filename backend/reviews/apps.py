@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class ReviewsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'reviews'
+
+    def ready(self):
+        from booktable.search import install_indexes
+
+        # SQLite drops the full-text triggers whenever a migration rebuilds the table
+        post_migrate.connect(install_indexes, sender=self)
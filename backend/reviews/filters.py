@@ -1,9 +1,10 @@
 import django_filters
+from booktable.search import TrigramFilter
 from .models import Review
 
 class ReviewFilter(django_filters.FilterSet):
-    restaurant_name = django_filters.CharFilter(field_name='restaurant__name', lookup_expr='icontains')
-    customer_name = django_filters.CharFilter(field_name='customer__username', lookup_expr='icontains')
+    restaurant_name = TrigramFilter(field_name='restaurant__name')
+    customer_name = TrigramFilter(field_name='customer__username')
     min_rating = django_filters.NumberFilter(field_name='rating', lookup_expr='gte')
     max_rating = django_filters.NumberFilter(field_name='rating', lookup_expr='lte')
     min_date = django_filters.DateTimeFilter(field_name='created_at', lookup_expr='gte')
@@ -0,0 +1,25 @@
+from django.db import migrations
+from booktable.search import FullTextIndex
+
+# Postgres: generated search_vector column with a GIN index.
+# SQLite: FTS5 shadow table kept in sync by triggers.
+INDEX = FullTextIndex('reviews_review', {'comment': 'A'})
+
+
+def install(apps, schema_editor):
+    INDEX.install(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    INDEX.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
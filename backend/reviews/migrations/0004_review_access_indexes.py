@@ -0,0 +1,27 @@
+# Generated by Django 5.0.2 on 2026-10-18 12:01
+
+from django.conf import settings
+from django.db import migrations, models
+from booktable.indexes import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('restaurants', '0007_restaurant_location'),
+        ('reviews', '0003_review_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='review',
+            index=models.Index(fields=['restaurant', '-created_at', '-id'], name='review_restaurant_created_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='review',
+            index=models.Index(fields=['customer', '-created_at', '-id'], name='review_customer_created_idx'),
+        ),
+    ]
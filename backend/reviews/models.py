@@ -8,3 +8,22 @@ class Review(models.Model):
     rating = models.IntegerField()
     comment = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # restaurant_reviews and manager lists, newest first
+            models.Index(
+                fields=["restaurant", "-created_at", "-id"],
+                name="review_restaurant_created_idx",
+            ),
+            # A customer's own reviews, newest first
+            models.Index(
+                fields=["customer", "-created_at", "-id"],
+                name="review_customer_created_idx",
+            ),
+            # Rows changed since the last update_rollups run, and the
+            # days it recounts
+            models.Index(fields=["updated_at"], name="review_updated_idx"),
+            models.Index(fields=["created_at"], name="review_created_idx"),
+        ]
@@ -10,8 +10,8 @@ class ReviewSerializer(serializers.ModelSerializer):
     class Meta:
         model = Review
         fields = ['id', 'customer', 'customer_name', 'restaurant', 'restaurant_name', 
-                 'rating', 'comment', 'created_at']
-        read_only_fields = ['customer', 'created_at']
+                 'rating', 'comment', 'created_at', 'updated_at']
+        read_only_fields = ['customer', 'created_at', 'updated_at']
 
     def get_customer_name(self, obj):
         return f"{obj.customer.first_name} {obj.customer.last_name}"
@@ -1,3 +1,122 @@
+from io import StringIO
+from django.core.management import call_command
 from django.test import TestCase
+from rest_framework.test import APIClient
+from restaurants.models import Restaurant
+from restaurants.tests import create_restaurant
+from users.models import User
+from .models import Review
 
-# Create your tests here.
+
+class ReviewQueryBudgetTests(TestCase):
+    """
+    Each endpoint must run a fixed number of queries no matter how many
+    rows it returns. A failure here usually means a new N+1.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user(username="admin", password="x", role="admin")
+        cls.manager = User.objects.create_user(username="manager", password="x", role="manager")
+        cls.restaurant = create_restaurant(cls.manager, "Budget Bistro")
+        cls.reviews = []
+        for i in range(15):
+            customer = User.objects.create_user(username=f"customer{i}", password="x")
+            cls.reviews.append(
+                Review.objects.create(
+                    customer=customer, restaurant=cls.restaurant, rating=4, comment="Good"
+                )
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_list(self):
+        # page only; keyset pagination does not count
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/reviews/")
+        self.assertEqual(len(response.data["results"]), 10)
+
+    def test_list_as_manager(self):
+        self.client.force_authenticate(self.manager)
+        with self.assertNumQueries(1):
+            self.client.get("/api/reviews/")
+
+    def test_retrieve(self):
+        with self.assertNumQueries(1):
+            self.client.get(f"/api/reviews/{self.reviews[0].id}/")
+
+    def test_restaurant_reviews(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                "/api/reviews/restaurant_reviews/", {"restaurant_id": self.restaurant.id}
+            )
+        self.assertEqual(len(response.data["results"]), 10)
+
+    def test_export(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/reviews/export/", {"format": "ndjson"})
+            lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(response["Content-Type"], "application/x-ndjson; charset=utf-8")
+        self.assertEqual(len(lines), 15)
+
+
+class ReviewRatingCounterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        manager = User.objects.create_user(username="manager", password="x", role="manager")
+        cls.alice = User.objects.create_user(username="alice", password="x")
+        cls.bob = User.objects.create_user(username="bob", password="x")
+        cls.restaurant = create_restaurant(manager, "Counter Cafe")
+        cls.other = create_restaurant(manager, "Other Cafe")
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def review(self, customer, rating, restaurant=None):
+        self.client.force_authenticate(customer)
+        response = self.client.post(
+            "/api/reviews/",
+            {"restaurant": (restaurant or self.restaurant).id, "rating": rating, "comment": "-"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.data["id"]
+
+    def summary(self, restaurant=None):
+        restaurant = Restaurant.objects.get(pk=(restaurant or self.restaurant).pk)
+        counts = [getattr(restaurant, f"rating_{star}_count") for star in range(1, 6)]
+        return restaurant.review_count, restaurant.avg_rating, counts
+
+    def test_create_update_delete(self):
+        self.review(self.alice, 5)
+        bob = self.review(self.bob, 2)
+        self.assertEqual(self.summary(), (2, 3.5, [0, 1, 0, 0, 1]))
+
+        self.client.patch(f"/api/reviews/{bob}/", {"rating": 4}, format="json")
+        self.assertEqual(self.summary(), (2, 4.5, [0, 0, 0, 1, 1]))
+
+        self.client.patch(f"/api/reviews/{bob}/", {"restaurant": self.other.id}, format="json")
+        self.assertEqual(self.summary(), (1, 5.0, [0, 0, 0, 0, 1]))
+        self.assertEqual(self.summary(self.other), (1, 4.0, [0, 0, 0, 1, 0]))
+
+        self.client.delete(f"/api/reviews/{bob}/")
+        self.assertEqual(self.summary(self.other), (0, 0.0, [0, 0, 0, 0, 0]))
+
+    def test_filters_and_ordering_use_the_summary(self):
+        self.review(self.alice, 5)
+        self.review(self.bob, 1, self.other)
+        self.client.force_authenticate(self.alice)
+        response = self.client.get("/api/restaurants/", {"min_rating": 4})
+        self.assertEqual([row["id"] for row in response.data["results"]], [self.restaurant.id])
+        response = self.client.get("/api/restaurants/", {"ordering": "avg_rating"})
+        self.assertEqual(
+            [row["id"] for row in response.data["results"]], [self.other.id, self.restaurant.id]
+        )
+
+    def test_recompute_repairs_drift(self):
+        self.review(self.alice, 3)
+        Restaurant.objects.filter(pk=self.restaurant.pk).update(review_count=7, avg_rating=1, rating_3_count=0)
+        call_command("recompute_restaurant_ratings", stdout=StringIO())
+        self.assertEqual(self.summary(), (1, 3.0, [0, 0, 1, 0, 0]))
@@ -8,23 +8,36 @@ from rest_framework.exceptions import PermissionDenied
 from .models import Review
 from .serializers import ReviewSerializer
 from .filters import ReviewFilter
+from restaurants.models import Restaurant
+from booktable.conditional import ConditionalGetMixin
+from booktable.export import ExportMixin
+from booktable.pagination import KeysetPagination
+from django.db import transaction
 
 
 def ping(request):
     return JsonResponse({"message": "pong from reviews"})
 
 
-class ReviewViewSet(viewsets.ModelViewSet):
+class ReviewViewSet(ConditionalGetMixin, ExportMixin, viewsets.ModelViewSet):
     queryset = Review.objects.all()
     serializer_class = ReviewSerializer
     permission_classes = [IsAuthenticated]
     filterset_class = ReviewFilter
+    pagination_class = KeysetPagination
+    # The serializer shows the restaurant's name
+    conditional_fields = ["updated_at", "restaurant__updated_at"]
     search_fields = ["restaurant__name", "customer__username", "comment"]
     ordering_fields = ["rating", "created_at"]
     ordering = ["-created_at"]
+    export_fields = [
+        "id", "restaurant", "restaurant__name", "customer", "customer__username",
+        "rating", "comment", "created_at", "updated_at",
+    ]
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        # ReviewSerializer shows the customer's and restaurant's names
+        queryset = super().get_queryset().select_related("customer", "restaurant")
         if self.request.user.role == "admin":
             return queryset
         elif self.request.user.role == "manager":
@@ -38,20 +51,38 @@ class ReviewViewSet(viewsets.ModelViewSet):
         return context
 
     def perform_create(self, serializer):
-        serializer.save(customer=self.request.user)
+        with transaction.atomic():
+            review = serializer.save(customer=self.request.user)
+            Restaurant.update_rating_counts(review.restaurant_id, added=review.rating)
 
     def perform_update(self, serializer):
         if (
-            self.request.user != serializer.instance.customer
+            self.request.user.pk != serializer.instance.customer_id
             and self.request.user.role != "admin"
         ):
             raise PermissionDenied("You do not have permission to modify this review.")
-        serializer.save()
+        with transaction.atomic():
+            # Lock the row so concurrent edits see each other's rating
+            previous_restaurant_id, previous_rating = (
+                Review.objects.select_for_update()
+                .values_list("restaurant_id", "rating")
+                .get(pk=serializer.instance.pk)
+            )
+            review = serializer.save()
+            if review.restaurant_id == previous_restaurant_id:
+                Restaurant.update_rating_counts(
+                    review.restaurant_id, added=review.rating, removed=previous_rating
+                )
+            else:
+                Restaurant.update_rating_counts(previous_restaurant_id, removed=previous_rating)
+                Restaurant.update_rating_counts(review.restaurant_id, added=review.rating)
 
     def perform_destroy(self, instance):
-        if self.request.user != instance.customer and self.request.user.role != "admin":
+        if self.request.user.pk != instance.customer_id and self.request.user.role != "admin":
             raise PermissionDenied("You do not have permission to delete this review.")
-        instance.delete()
+        with transaction.atomic():
+            instance.delete()
+            Restaurant.update_rating_counts(instance.restaurant_id, removed=instance.rating)
 
     @action(detail=False, methods=["get"])
     def restaurant_reviews(self, request):
@@ -62,6 +93,5 @@ class ReviewViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        reviews = self.get_queryset().filter(restaurant_id=restaurant_id)
-        serializer = self.get_serializer(reviews, many=True)
-        return Response(serializer.data)
+        reviews = self.filter_queryset(self.get_queryset().filter(restaurant_id=restaurant_id))
+        return self.conditional_list(request, reviews)
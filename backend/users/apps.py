@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from booktable.search import install_indexes
+        from . import signals  # noqa: F401
+
+        # SQLite drops the trigram triggers whenever a migration rebuilds the table
+        post_migrate.connect(install_indexes, sender=self)
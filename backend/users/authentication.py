@@ -0,0 +1,163 @@
+"""
+JWT authentication that resolves users without a database query.
+
+CachedJWTAuthentication looks the token's user up in a small LRU kept
+by each worker, then in the shared cache, and reads the database only
+when both miss. Entries hold every column but the password, which is
+left deferred, so the hash never reaches the shared cache and saving
+request.user cannot write back a stale one.
+
+Saving or deleting a user drops their entry from this worker's LRU and
+moves their version in the shared cache, which retires the shared entry.
+Other workers may serve their own LRU copy for up to AUTH_USER_LOCAL_TTL
+seconds more, unless a token's role claim shows it is out of date
+first. That bound needs CACHES to be shared by all workers; with the
+default per-process cache, entries there also live only
+AUTH_USER_LOCAL_TTL seconds.
+"""
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from booktable.caching import cache_is_shared
+from .models import User
+
+USER_KEY = 'auth-user:{}'
+USER_VERSION_KEY = 'auth-user-version:{}'
+ROLE_CLAIM = 'role'
+# Cached columns, in the order User.from_db expects them
+FIELDS = [field.attname for field in User._meta.concrete_fields if field.attname != 'password']
+ROLE = FIELDS.index('role')
+
+
+class LocalUserCache:
+    """Per-process LRU of user rows, each trusted for AUTH_USER_LOCAL_TTL seconds."""
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, values = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return values
+
+    def set(self, key, values):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + settings.AUTH_USER_LOCAL_TTL, values)
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.AUTH_USER_LOCAL_SIZE:
+                self.entries.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_users = LocalUserCache()
+
+
+def shared_timeout():
+    # A per-process cache is no more shared than the LRU, so it gets no
+    # longer to go stale than the LRU does
+    if cache_is_shared():
+        return settings.AUTH_USER_CACHE_TIMEOUT
+    return settings.AUTH_USER_LOCAL_TTL
+
+
+def user_values(user_id, role=None):
+    """
+    The cached columns of a user, or None if there is no such user.
+    A role that disagrees with the cached row means one of them predates
+    a role change, so the row is read again; the database wins.
+    """
+    key = USER_KEY.format(user_id)
+    values = local_users.get(key)
+    if values is not None and (role is None or values[ROLE] == role):
+        return values
+
+    version_key = USER_VERSION_KEY.format(user_id)
+    shared = cache.get_many([key, version_key])
+    version = shared.get(version_key)
+    if version is None:
+        # First reader after a cache flush picks the version everyone shares
+        cache.add(version_key, time.time_ns(), None)
+        version = cache.get(version_key)
+    entry = shared.get(key)
+    # Entries stored under an older version predate a change to the user
+    values = entry[1] if entry is not None and entry[0] == version else None
+    if values is None or (role is not None and values[ROLE] != role):
+        values = User.objects.filter(pk=user_id).values_list(*FIELDS).first()
+        if values is None:
+            return None
+        # Under the version read before the query, so a row read before a
+        # concurrent change commits is retired by that change's bump
+        cache.set(key, (version, values), shared_timeout())
+    local_users.set(key, values)
+    return values
+
+
+def forget_user(user_id):
+    """Drop a user's row from this worker's LRU and retire their shared entry."""
+    key = USER_KEY.format(user_id)
+
+    def drop():
+        local_users.discard(key)
+        cache.set(USER_VERSION_KEY.format(user_id), time.time_ns(), None)
+
+    # Once now, and once after commit, so a row read from before the
+    # commit is not what stays cached
+    drop()
+    transaction.on_commit(drop)
+
+
+def token_for(user):
+    """A refresh token for user whose access tokens carry their role."""
+    token = RefreshToken.for_user(user)
+    token[ROLE_CLAIM] = user.role
+    return token
+
+
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return token_for(user)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # Compares the password hash, which the cache leaves out
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        values = user_values(user_id, validated_token.get(ROLE_CLAIM))
+        if values is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        # A fresh instance per request, so requests never share state
+        user = User.from_db(User.objects.db, FIELDS, values)
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
@@ -0,0 +1,27 @@
+from django.db import migrations
+from booktable.search import TrigramIndex
+
+# Postgres: pg_trgm GIN indexes on UPPER(column::text), the expression
+# icontains compiles to. SQLite: FTS5 trigram table kept in sync by triggers.
+INDEX = TrigramIndex('users_user', ['username'])
+
+
+def install(apps, schema_editor):
+    INDEX.install(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    INDEX.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
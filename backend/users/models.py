@@ -8,3 +8,7 @@ class User(AbstractUser):
         ('admin', 'Admin'),
     )
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='customer')
+
+    class Meta(AbstractUser.Meta):
+        # Signups since the last update_rollups run, and the days it recounts
+        indexes = [models.Index(fields=['date_joined'], name='user_date_joined_idx')]
@@ -1,3 +1,115 @@
+from datetime import date, time, timedelta
+from django.core.cache import cache
 from django.test import TestCase
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+from bookings.models import Booking
+from restaurants.tests import create_restaurant
+from .authentication import (
+    USER_KEY, USER_VERSION_KEY, CachedJWTAuthentication, local_users, shared_timeout, token_for,
+)
+from .models import User
 
-# Create your tests here.
+
+class CachedJWTAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user(username='customer', password='secret-pass')
+        manager = User.objects.create_user(username='manager', password='x', role='manager')
+        Booking.objects.create(
+            customer=cls.customer, restaurant=create_restaurant(manager, 'Token Bistro'),
+            date=date.today() + timedelta(days=1), time=time(19), party_size=2,
+        )
+
+    def setUp(self):
+        cache.clear()
+        local_users.clear()
+        self.client = APIClient()
+
+    def authenticate(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token.access_token}')
+
+    def test_cached_user_saves_a_query(self):
+        self.authenticate(token_for(self.customer))
+        # user, then the page
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get('/api/bookings/').status_code, 200)
+        # page only
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/bookings/').status_code, 200)
+        # another worker, with only the shared cache warm
+        local_users.clear()
+        with self.assertNumQueries(1):
+            self.client.get('/api/bookings/')
+
+    def test_obtained_tokens_carry_role(self):
+        response = self.client.post(
+            '/api/token/', {'username': 'customer', 'password': 'secret-pass'}, format='json'
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.data["access"]}')
+        self.assertEqual(self.client.get('/api/profile/').data['role'], 'customer')
+
+    def test_save_invalidates(self):
+        self.authenticate(token_for(self.customer))
+        self.client.get('/api/profile/')
+        self.customer.role = 'manager'
+        self.customer.save()
+        self.assertEqual(self.client.get('/api/profile/').data['role'], 'manager')
+
+        self.customer.is_active = False
+        self.customer.save()
+        self.assertEqual(self.client.get('/api/profile/').status_code, 401)
+
+    def test_stale_role_claim_rereads_user(self):
+        self.authenticate(token_for(self.customer))
+        self.client.get('/api/profile/')
+        # Changed behind the signals' back, as by another worker's stale LRU
+        User.objects.filter(pk=self.customer.pk).update(role='admin')
+        self.assertEqual(self.client.get('/api/profile/').data['role'], 'customer')
+        self.customer.role = 'admin'
+        self.authenticate(token_for(self.customer))
+        self.assertEqual(self.client.get('/api/profile/').data['role'], 'admin')
+
+    def test_change_in_another_worker(self):
+        self.authenticate(RefreshToken.for_user(self.customer))
+        self.client.get('/api/profile/')
+        # What another worker's save leaves behind: the new row and a new
+        # version in the shared cache
+        User.objects.filter(pk=self.customer.pk).update(is_active=False)
+        cache.set(USER_VERSION_KEY.format(self.customer.pk), 0, None)
+        # This worker's LRU copy is trusted until AUTH_USER_LOCAL_TTL runs out
+        self.assertEqual(self.client.get('/api/profile/').status_code, 200)
+        local_users.clear()
+        self.assertEqual(self.client.get('/api/profile/').status_code, 401)
+
+    def test_row_read_before_a_change_is_not_served(self):
+        self.authenticate(RefreshToken.for_user(self.customer))
+        self.client.get('/api/profile/')
+        version, values = cache.get(USER_KEY.format(self.customer.pk))
+        self.customer.role = 'manager'
+        self.customer.save()
+        # A slow reader stores the row it read before the save committed
+        cache.set(USER_KEY.format(self.customer.pk), (version, values), None)
+        local_users.clear()
+        self.assertEqual(self.client.get('/api/profile/').data['role'], 'manager')
+
+    def test_per_process_cache_lives_as_long_as_the_lru(self):
+        with self.settings(AUTH_USER_LOCAL_TTL=30, AUTH_USER_CACHE_TIMEOUT=300):
+            self.assertEqual(shared_timeout(), 30)
+            shared = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'cache'}}
+            with self.settings(CACHES=shared):
+                self.assertEqual(shared_timeout(), 300)
+
+    def test_tokens_without_role_claim(self):
+        self.authenticate(RefreshToken.for_user(self.customer))
+        self.assertEqual(self.client.get('/api/profile/').data['username'], 'customer')
+
+    def test_saving_request_user_keeps_password(self):
+        token = token_for(self.customer).access_token
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        user, _ = CachedJWTAuthentication().authenticate(request)
+        user.first_name = 'Ada'
+        user.save()
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.first_name, 'Ada')
+        self.assertTrue(self.customer.check_password('secret-pass'))
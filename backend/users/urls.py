@@ -1,7 +1,7 @@
 # backend/users/urls.py
 from django.urls import path
 from . import views
-from .views import RegisterView, LoginView, ping
+from .views import RegisterView, LoginView, UserDashboardView, ping
 from django.http import JsonResponse
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from django.contrib.auth import get_user_model
@@ -26,6 +26,7 @@ urlpatterns = [
     path('users/register/', RegisterView.as_view(), name='register'),
     path('users/login/', LoginView.as_view(), name='login'),
     path('users/ping/', ping, name='users-ping'),
+    path('users/dashboard/', UserDashboardView.as_view(), name='user-dashboard'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('profile/', profile, name='profile'),
 ]
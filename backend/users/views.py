@@ -5,11 +5,15 @@ from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.contrib.auth import get_user_model, authenticate
-from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.serializers import ModelSerializer
-from rest_framework.exceptions import PermissionDenied
-from django.db.models import Count, Q
-from datetime import datetime, timedelta
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from django.db.models import Min, Sum
+from django.utils import timezone
+from datetime import timedelta
+from analytics.models import DailyRollup, RollupCheckpoint, RollupSeries
+from analytics.rollups import series_totals
+from bookings.models import Booking
+from .authentication import token_for
 
 User = get_user_model()
 
@@ -44,7 +48,7 @@ class LoginView(APIView):
         user = authenticate(username=username, password=password)
 
         if user:
-            refresh = RefreshToken.for_user(user)
+            refresh = token_for(user)
             return Response({
                 'access': str(refresh.access_token),
                 'refresh': str(refresh),
@@ -88,42 +92,89 @@ class UserProfileView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 class UserDashboardView(APIView):
+    """
+    Admin statistics for the last `days` days, read from the daily
+    rollups kept by the update_rollups command, so the cost does not
+    grow with the range or with the size of the user, booking and
+    review tables.
+    """
     permission_classes = [IsAuthenticated]
+    max_days = 3650
+    top_restaurants = 10
 
     def get(self, request):
         if request.user.role != 'admin':
             raise PermissionDenied("Only admins can access the user dashboard.")
 
-        # Get date range
-        days = int(request.query_params.get('days', 30))
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=days)
-
-        # Get user statistics
-        total_users = User.objects.count()
-        users_by_role = User.objects.values('role').annotate(count=Count('id'))
-        
-        # Get recent registrations
-        recent_registrations = User.objects.filter(
-            date_joined__gte=start_date
-        ).order_by('-date_joined')[:5]
-
-        # Get active users (users who have logged in recently)
-        active_users = User.objects.filter(
-            last_login__gte=start_date
-        ).count()
-
+        try:
+            days = int(request.query_params.get('days', 30))
+        except ValueError:
+            raise ValidationError({'detail': 'days must be an integer'})
+        if not 1 <= days <= self.max_days:
+            raise ValidationError({'detail': f'days must be between 1 and {self.max_days}'})
+        end_date = timezone.localdate()
+        start_date = end_date - timedelta(days=days - 1)
+
+        totals = {metric: {} for metric, _ in RollupSeries.METRIC_CHOICES}
+        all_time = {metric: {} for metric, _ in RollupSeries.METRIC_CHOICES}
+        rows = series_totals(
+            ['signups', 'last_login', 'booking_status', 'review_rating'], start_date, end_date
+        ).values_list('metric', 'key', 'total', 'all_time')
+        for metric, key, total, through_end in rows:
+            totals[metric][key] = total
+            all_time[metric][key] = through_end
+
+        top_restaurants = (
+            series_totals(['booking_restaurant'], start_date, end_date)
+            .filter(total__gt=0)
+            .order_by('-total', 'key')
+            .values_list('key', 'total')[:self.top_restaurants]
+        )
+        bookings_per_day = (
+            DailyRollup.objects.filter(
+                series__metric='booking_status', day__range=(start_date, end_date)
+            )
+            .values('day')
+            .annotate(bookings=Sum('count'))
+            .order_by('day')
+        )
+        updated_through = RollupCheckpoint.objects.aggregate(
+            updated_through=Min('processed_until')
+        )['updated_through']
+
+        roles = [role for role, _ in User.ROLE_CHOICES]
+        statuses = [status for status, _ in Booking.STATUS_CHOICES]
+        ratings = [str(rating) for rating in range(1, 6)]
         return Response({
-            'total_users': total_users,
-            'users_by_role': users_by_role,
-            'recent_registrations': [{
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'role': user.role,
-                'date_joined': user.date_joined
-            } for user in recent_registrations],
-            'active_users': active_users
+            'days': days,
+            'start_date': start_date,
+            'end_date': end_date,
+            'updated_through': updated_through,
+            'total_users': sum(all_time['signups'].values()),
+            'users_by_role': [
+                {'role': role, 'count': all_time['signups'].get(role, 0)} for role in roles
+            ],
+            'new_users': sum(totals['signups'].values()),
+            'signups_by_role': [
+                {'role': role, 'count': totals['signups'].get(role, 0)} for role in roles
+            ],
+            'active_users': sum(totals['last_login'].values()),
+            'total_bookings': sum(totals['booking_status'].values()),
+            'bookings_by_status': [
+                {'status': status, 'count': totals['booking_status'].get(status, 0)}
+                for status in statuses
+            ],
+            'bookings_per_day': [
+                {'date': row['day'], 'bookings': row['bookings']} for row in bookings_per_day
+            ],
+            'top_restaurants': [
+                {'restaurant_id': int(key), 'bookings': total} for key, total in top_restaurants
+            ],
+            'total_reviews': sum(totals['review_rating'].values()),
+            'reviews_by_rating': [
+                {'rating': int(rating), 'count': totals['review_rating'].get(rating, 0)}
+                for rating in ratings
+            ],
         })
 
 def ping(request):